@@ -0,0 +1,634 @@
+"""
+Video analysis pipeline.
+
+Kept free of FastAPI so it can run inside the job worker processes
+(see jobs.py) as well as in the API process.
+"""
+import os
+from typing import Callable, Optional
+import cv2
+import numpy as np
+
+from config import settings
+from detection import iter_motion, read_frames
+from detection_cache import detection_cache, file_sha256, iter_frame_detections
+from highlights import detect_highlight_moments, generate_highlight_reel, reel_duration_sec
+from model_manager import get_yolo_model, model_manager
+from pipeline import FramePipeline
+from render import AnnotationRecorder, annotated_video_url, tracks_path
+from sampling import create_sampler
+from tracing import NULL_TRACER, configure_logging, create_tracer, logger
+from progress import ProgressReporter
+from timeline import TimelineBuilder, timeline_path
+from tracker import PersonTracker
+
+def init_worker():
+    """Process pool initializer - load (and warm up) the model once per worker process"""
+    configure_logging()
+    if settings.yolo_warmup:
+        model_manager.warm_up()
+    else:
+        get_yolo_model()
+
+def analyze_video_file(path: str, content_hash: Optional[str] = None):
+    if content_hash is None and os.path.exists(path):
+        content_hash = file_sha256(path)
+
+    # Motion scores of an already analyzed video come from the detection cache
+    cached = detection_cache.load_any(content_hash) if content_hash else None
+    if cached is not None:
+        fps = cached.fps
+        motion_scores = cached.motion[1:].tolist()
+    else:
+        cap = cv2.VideoCapture(path)
+        if not cap.isOpened():
+            return None
+
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        motion_scores = []
+
+        prev_gray = None
+
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+            # Motion intensity via frame difference
+            if prev_gray is not None:
+                diff = cv2.absdiff(gray, prev_gray)
+                motion = np.mean(diff)
+                motion_scores.append(motion)
+
+            prev_gray = gray
+
+        cap.release()
+
+    if len(motion_scores) == 0:
+        avg_motion = 0.0
+    else:
+        avg_motion = float(np.mean(motion_scores))
+
+    # Fake frame time stats from video FPS (recording-based)
+    if fps and fps > 0:
+        frame_time = 1000.0 / fps
+        avg_frame_time = frame_time
+        frame_time_std = 0.0  # we can't get real per-frame time from encoded video easily
+    else:
+        avg_frame_time = 0.0
+        frame_time_std = 0.0
+
+    # Simple stutter score proxy: higher motion + lower fps = more stress
+    stutter_score = avg_motion / (fps + 1e-6)
+
+    return {
+        "video_fps": float(fps) if fps else 0.0,
+        "avg_frame_time_ms": avg_frame_time,
+        "frame_time_std_ms": frame_time_std,
+        "avg_motion_intensity": avg_motion,
+        "stutter_score": float(stutter_score),
+    }
+
+def generate_highlights_file(
+    file_path: str,
+    stored_name: str,
+    content_hash: Optional[str] = None,
+    sampling: Optional[str] = None,
+    strategy: Optional[str] = None
+):
+    """
+    Quick detection pass (no tracking or annotation) for /generate-highlights, then the
+    highlight moments (strategy, see highlights.py) and the reel.
+    Returns moments, highlight_video (None if the reel could not be written) and
+    total_duration_sec; moments is empty when nothing stood out.
+    """
+    cap = cv2.VideoCapture(file_path)
+    if not cap.isOpened():
+        return {"error": "Could not open video"}
+    
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    
+    frame_count = 0
+    timeline = TimelineBuilder()
+    enemy_encounters = []
+    reaction_times = []
+    motion_scores = []
+    prev_person_count = 0
+    prev_person_boxes = []
+    
+    # Quick analysis pass (no annotation, just detection)
+    # Uses the same detection settings as /api/analyze-video, so a video that
+    # was already analyzed is served from the detection cache without YOLO
+    sampler = create_sampler(sampling)
+    detections = iter_frame_detections(
+        iter_motion(read_frames(cap)),
+        fps,
+        width,
+        height,
+        content_hash,
+        sampler,
+        get_yolo_model,
+        settings.detection_batch_size
+    )
+    
+    for frame, person_boxes, motion in detections:
+        frame_count += 1
+        
+        # Calculate motion
+        if motion is not None:
+            motion_scores.append(motion)
+        
+        persons_in_frame = 0
+        current_person_boxes = []
+        
+        for box in person_boxes:
+            persons_in_frame += 1
+            x1, y1, x2, y2 = map(int, box[:4])
+            conf = float(box[4])
+            box_center_x = (x1 + x2) / 2
+            box_center_y = (y1 + y2) / 2
+            
+            current_person_boxes.append({
+                'center_x': box_center_x,
+                'center_y': box_center_y,
+                'conf': conf
+            })
+            
+            timeline.add_detection(int(box_center_x), int(box_center_y), conf)
+        
+        # Store timeline data
+        timeline.add_frame(
+            frame_count,
+            frame_count / fps if fps > 0 else 0,
+            persons_in_frame,
+            float(motion_scores[-1]) if motion_scores else 0
+        )
+        
+        # Detect enemy encounters
+        if persons_in_frame > prev_person_count:
+            new_boxes = []
+            for curr_box in current_person_boxes:
+                is_new = True
+                for prev_box in prev_person_boxes:
+                    dist = np.sqrt(
+                        (curr_box['center_x'] - prev_box['center_x'])**2 + 
+                        (curr_box['center_y'] - prev_box['center_y'])**2
+                    )
+                    if dist < 100:
+                        is_new = False
+                        break
+                if is_new:
+                    new_boxes.append(curr_box)
+            
+            if len(new_boxes) > 0:
+                enemy_encounters.append({
+                    'frame': frame_count,
+                    'time_sec': frame_count / fps if fps > 0 else 0,
+                    'new_persons': len(new_boxes),
+                    'boxes': new_boxes
+                })
+        
+        # Track eliminations
+        if persons_in_frame < prev_person_count and len(enemy_encounters) > 0:
+            last_encounter = enemy_encounters[-1]
+            frames_since = frame_count - last_encounter['frame']
+            if 0 < frames_since < (fps * 3):
+                reaction_time_ms = (frames_since / fps) * 1000 if fps > 0 else 0
+                reaction_times.append({
+                    'encounter_frame': last_encounter['frame'],
+                    'elimination_frame': frame_count,
+                    'reaction_time_ms': reaction_time_ms
+                })
+        
+        prev_person_count = persons_in_frame
+        prev_person_boxes = current_person_boxes
+    
+    cap.release()
+    
+    # Detect highlight moments
+    highlight_moments = detect_highlight_moments(
+        timeline.build(fps),
+        enemy_encounters,
+        reaction_times,
+        fps,
+        total_frames,
+        strategy
+    )
+    
+    if not highlight_moments:
+        return {"moments": [], "highlight_video": None, "total_duration_sec": 0}
+    
+    # Generate highlight reel
+    highlight_filename = generate_highlight_reel(
+        file_path,
+        highlight_moments,
+        fps,
+        stored_name
+    )
+    
+    return {
+        "moments": highlight_moments,
+        "highlight_video": highlight_filename,
+        "total_duration_sec": reel_duration_sec(highlight_moments, fps)
+    }
+
+def analyze_video_path(
+    file_path: str,
+    filename: str,
+    batch_size: Optional[int] = None,
+    sampling: Optional[str] = None,
+    content_hash: Optional[str] = None,
+    threaded: Optional[bool] = None,
+    trace: bool = False,
+    annotate: bool = True,
+    highlights: bool = False,
+    highlight_strategy: Optional[str] = None,
+    progress: Optional[Callable[[dict], None]] = None,
+    profile: Optional[str] = None
+):
+    """
+    Run the full person-detection analysis on a saved video file.
+    Returns the metrics dict. With annotate, the drawing instructions are stored and
+    annotated_video is a URL that renders the video on first request (see render.py).
+    highlights picks highlight moments from the full timeline with highlight_strategy and cuts the reel
+    (see highlights.py).
+    batch_size frames are sent to YOLO per predict call (defaults to the configured size).
+    sampling is "full" or "adaptive" (see sampling.py, defaults to the configured mode).
+    Detections are reused from the detection cache when content_hash was seen before.
+    threaded runs decode / motion / detect on their own threads (see pipeline.py).
+    trace writes the tracker decisions to a JSONL file in the trace directory (see tracing.py).
+    progress is called with progress events while the video is analyzed (see progress.py).
+    profile is the inference profile (see detection.INFERENCE_PROFILES, defaults to the configured one).
+    """
+    if batch_size is None:
+        batch_size = settings.detection_batch_size
+    if threaded is None:
+        threaded = settings.pipeline_threaded
+    sampler = create_sampler(sampling)
+    profile = profile or settings.inference_profile
+
+    cap = cv2.VideoCapture(file_path)
+    if not cap.isOpened():
+        return {"error": "Could not open video"}
+
+    # Get video properties for output
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    reporter = ProgressReporter(progress, int(cap.get(cv2.CAP_PROP_FRAME_COUNT)), fps) if progress else None
+
+    # The annotated video is rendered from the recorded annotations on first download (see render.py)
+    output_filename = f"annotated_{os.path.basename(file_path)}"
+    recorder = AnnotationRecorder() if annotate else None
+
+    frame_count = 0
+    total_persons = 0
+    max_persons_in_frame = 0
+    motion_scores = []
+    
+    # Enhanced tracking
+    person_positions = []
+    enemy_encounters = []
+    reaction_times = []
+    
+    # Heat map data - track where characters appear
+    heat_map_data = np.zeros((height // 10, width // 10))
+    
+    # Frame-by-frame timeline data (columnar, see timeline.py)
+    timeline = TimelineBuilder()
+    
+    # Advanced tracking - assign IDs to persons (player = locked track, see tracker.py)
+    tracer = create_tracer(os.path.basename(file_path)) if trace else NULL_TRACER
+    tracker = PersonTracker(trajectory_stride=settings.track_trajectory_stride, tracer=tracer)
+    
+    # Previous frame data
+    prev_person_count = 0
+    prev_person_boxes = []
+
+    # Run YOLO in batches of (sampled) frames, or reuse cached detections
+    if content_hash is None:
+        content_hash = file_sha256(file_path)
+
+    # decode -> motion -> detect -> track (this thread)
+    pipe = FramePipeline(settings.pipeline_queue_size, threaded)
+    decoded = pipe.source("decode", read_frames(cap))
+    moving = pipe.stage("motion", iter_motion, decoded)
+    detected = pipe.stage(
+        "detect",
+        lambda frames: iter_frame_detections(
+            frames, fps, width, height, content_hash, sampler, get_yolo_model, batch_size, profile
+        ),
+        moving
+    )
+    detections = pipe.consume("track", detected)
+
+    try:
+        for frame, person_boxes, motion in detections:
+            frame_count += 1
+
+            # Motion intensity (mean frame difference)
+            if motion is not None:
+                motion_scores.append(motion)
+
+            persons_in_frame = 0
+            current_person_boxes = []
+            temp_detections = []  # Store all detections first for two-pass processing
+        
+            # Center of frame (for player detection)
+            center_x = width / 2
+            center_y = height / 2
+        
+            # FIRST PASS: Collect all person detections
+            for box in person_boxes:
+                x1, y1, x2, y2 = map(int, box[:4])
+                conf = float(box[4])
+            
+                # Calculate box properties
+                box_center_x = (x1 + x2) / 2
+                box_center_y = (y1 + y2) / 2
+                box_width = x2 - x1
+                box_height = y2 - y1
+                box_area = box_width * box_height
+            
+                persons_in_frame += 1
+            
+                # Estimate distance from camera based on box size
+                estimated_distance = 1000 / (box_height + 1)
+            
+                temp_detections.append({
+                    'x1': x1, 'y1': y1, 'x2': x2, 'y2': y2,
+                    'box_center_x': box_center_x,
+                    'box_center_y': box_center_y,
+                    'box_width': box_width,
+                    'box_height': box_height,
+                    'box_area': box_area,
+                    'conf': conf,
+                    'estimated_distance': estimated_distance
+                })
+        
+            # SECOND PASS: Match detections to tracks in one assignment step
+            frame_tracks = tracker.update(person_boxes, frame_count)
+            player_id = tracker.player_id
+        
+            for det, track in zip(temp_detections, frame_tracks):
+                x1, y1, x2, y2 = det['x1'], det['y1'], det['x2'], det['y2']
+                box_center_x = det['box_center_x']
+                box_center_y = det['box_center_y']
+                box_width = det['box_width']
+                box_height = det['box_height']
+                box_area = det['box_area']
+                conf = det['conf']
+                estimated_distance = det['estimated_distance']
+                person_id = track.id
+            
+                # IMPROVED PLAYER DETECTION
+                # For third-person games, player is usually:
+                # 1. Largest box (closest to camera) - MOST IMPORTANT
+                # 2. In bottom-center of screen
+                # 3. Most consistent across frames
+            
+                # Calculate position score for player detection
+                # Higher score = more likely to be player
+                player_score = 0
+            
+                # Score 1: Size (larger = closer = likely player) - HIGHEST WEIGHT
+                size_score = box_area / (width * height) * 100  # Percentage of screen
+                player_score += size_score * 5  # Weight: 5x (increased from 3x)
+            
+                # Score 2: Bottom position (player usually in bottom half)
+                if box_center_y > height * 0.5:  # Bottom half
+                    bottom_score = (box_center_y / height) * 50  # 0-50 points
+                    player_score += bottom_score * 2  # Weight: 2x
+            
+                # Score 3: Horizontal center (player usually centered horizontally)
+                horizontal_center_dist = abs(box_center_x - center_x)
+                horizontal_score = max(0, 50 - (horizontal_center_dist / width * 100))
+                player_score += horizontal_score
+            
+                # Score 4: Consistency (if tracked for many frames)
+                frames_tracked = frame_count - track.first_seen
+                consistency_score = min(50, frames_tracked / 2)  # Up to 50 points over 100 frames
+                player_score += consistency_score
+            
+                # Store the score
+                track.player_score = player_score
+            
+                # Calculate velocity (if we have previous position)
+                velocity_x, velocity_y = 0, 0
+                prev_pos = track.position(1)
+                if prev_pos is not None:
+                    velocity_x = box_center_x - prev_pos[0]
+                    velocity_y = box_center_y - prev_pos[1]
+            
+                # CRITICAL: is_player is ONLY true if this person_id matches the locked player_id
+                # This prevents multiple people from being marked as player
+                is_player = (player_id is not None and person_id == player_id)
+            
+                # Update heat map (only for enemies)
+                if not is_player:
+                    heat_x = int(box_center_x / 10)
+                    heat_y = int(box_center_y / 10)
+                    if 0 <= heat_y < heat_map_data.shape[0] and 0 <= heat_x < heat_map_data.shape[1]:
+                        heat_map_data[heat_y, heat_x] += 1
+            
+                current_person_boxes.append({
+                    'id': person_id,
+                    'x1': x1, 'y1': y1, 'x2': x2, 'y2': y2,
+                    'center_x': box_center_x,
+                    'center_y': box_center_y,
+                    'area': box_area,
+                    'conf': float(conf),
+                    'is_player': is_player,
+                    'distance': estimated_distance,
+                    'velocity_x': velocity_x,
+                    'velocity_y': velocity_y
+                })
+            
+                timeline.add_detection(int(box_center_x), int(box_center_y), float(conf), person_id, is_player)
+            
+                if recorder is not None:
+                    recorder.add_person(x1, y1, x2, y2, conf, player_score, velocity_x, velocity_y, is_player)
+
+            # PLAYER SELECTION LOGIC - After all detections processed
+            # Lock the recently active track with the highest player score (should be largest box)
+            if player_id is None and frame_count > 5:
+                tracker.lock_player(frame_count)
+                player_id = tracker.player_id
+
+            if recorder is not None:
+                recorder.end_frame(player_id)
+
+            # Store timeline data for this frame
+            timeline.add_frame(
+                frame_count,
+                frame_count / fps if fps > 0 else 0,
+                persons_in_frame,
+                float(motion_scores[-1]) if motion_scores else 0
+            )
+
+            # Detect new enemy encounters
+            if persons_in_frame > prev_person_count:
+                new_persons = persons_in_frame - prev_person_count
+                new_boxes = []
+                for curr_box in current_person_boxes:
+                    if not curr_box['is_player']:  # Only count enemies
+                        is_new = True
+                        for prev_box in prev_person_boxes:
+                            if prev_box['id'] == curr_box['id']:
+                                is_new = False
+                                break
+                        if is_new:
+                            new_boxes.append(curr_box)
+            
+                if len(new_boxes) > 0:
+                    enemy_encounters.append({
+                        'frame': frame_count,
+                        'time_sec': frame_count / fps if fps > 0 else 0,
+                        'new_persons': len(new_boxes),
+                        'boxes': new_boxes
+                    })
+
+            # Track eliminations
+            if persons_in_frame < prev_person_count and len(enemy_encounters) > 0:
+                last_encounter = enemy_encounters[-1]
+                frames_since_encounter = frame_count - last_encounter['frame']
+            
+                if 0 < frames_since_encounter < (fps * 3):
+                    reaction_time_ms = (frames_since_encounter / fps) * 1000 if fps > 0 else 0
+                    reaction_times.append({
+                        'encounter_frame': last_encounter['frame'],
+                        'elimination_frame': frame_count,
+                        'reaction_time_ms': reaction_time_ms,
+                        'frames_elapsed': frames_since_encounter
+                    })
+
+            total_persons += persons_in_frame
+            max_persons_in_frame = max(max_persons_in_frame, persons_in_frame)
+
+            # Update previous frame data
+            prev_person_count = persons_in_frame
+            prev_person_boxes = current_person_boxes
+
+            if reporter is not None:
+                reporter.update(frame_count, timeline, len(enemy_encounters), len(reaction_times))
+    finally:
+        pipe.close()
+        cap.release()
+        tracer.close()
+    if recorder is not None:
+        recorder.save(tracks_path(output_filename), file_path, fps, width, height)
+
+    if reporter is not None:
+        reporter.finish(frame_count, timeline, len(enemy_encounters), len(reaction_times))
+    timeline = timeline.build(fps)
+    timeline_file = os.path.basename(timeline_path(os.path.basename(file_path)))
+    timeline.save(timeline_path(os.path.basename(file_path)))
+    # The response carries the whole video at reduced resolution
+    timeline_points = timeline.downsample(settings.timeline_points)
+
+    highlight_result = None
+    if highlights:
+        # Scored on the in-memory timeline; the reel decodes only the clip windows
+        highlight_strategy = highlight_strategy or settings.highlight_strategy
+        highlight_moments = detect_highlight_moments(
+            timeline, enemy_encounters, reaction_times, fps, frame_count, highlight_strategy
+        )
+        highlight_result = {
+            "highlight_video": generate_highlight_reel(file_path, highlight_moments, fps, os.path.basename(file_path)),
+            "moments": highlight_moments,
+            "strategy": highlight_strategy,
+            "total_duration_sec": reel_duration_sec(highlight_moments, fps)
+        }
+    pipeline_stats = pipe.stats()
+    logger.info(
+        "Analyzed %s: %d frames, %d tracks, player %s, %.0f ms",
+        filename, frame_count, tracker.total_tracks, player_id, pipeline_stats["wall_ms"]
+    )
+
+    if frame_count > 0:
+        avg_characters = total_persons / frame_count
+        avg_motion = float(np.mean(motion_scores)) if motion_scores else 0.0
+        motion_std = float(np.std(motion_scores)) if motion_scores else 0.0
+    else:
+        avg_characters = 0.0
+        avg_motion = 0.0
+        motion_std = 0.0
+
+    # Calculate FPS metrics
+    video_fps = float(fps) if fps else 0.0
+    frame_time_ms = (1000.0 / fps) if fps > 0 else 0.0
+    
+    # Calculate average reaction time
+    if len(reaction_times) > 0:
+        avg_reaction_time = sum(rt['reaction_time_ms'] for rt in reaction_times) / len(reaction_times)
+        min_reaction_time = min(rt['reaction_time_ms'] for rt in reaction_times)
+        max_reaction_time = max(rt['reaction_time_ms'] for rt in reaction_times)
+    else:
+        avg_reaction_time = 250
+        min_reaction_time = 200
+        max_reaction_time = 300
+
+    # Calculate performance score
+    scene_complexity_score = avg_characters + 0.5 * max_persons_in_frame
+    fps_stability = 100 - min(motion_std / 10, 100) if motion_std > 0 else 100
+    performance_score = min(100, (fps_stability * 0.4) + ((100 - min(avg_motion, 100)) * 0.3) + (min(video_fps / 60 * 100, 100) * 0.3))
+
+    # Prepare heat map data
+    heat_map_normalized = (heat_map_data / heat_map_data.max() * 100).tolist() if heat_map_data.max() > 0 else []
+
+    # Prepare encounter summary
+    encounter_summary = []
+    for i, encounter in enumerate(enemy_encounters[:10]):
+        encounter_summary.append({
+            'encounter_num': i + 1,
+            'time_sec': round(encounter['time_sec'], 2),
+            'new_enemies': encounter['new_persons']
+        })
+
+    # Prepare reaction time summary
+    reaction_summary = []
+    for i, rt in enumerate(reaction_times[:10]):
+        reaction_summary.append({
+            'encounter_num': i + 1,
+            'reaction_time_ms': round(rt['reaction_time_ms'], 0),
+            'time_sec': round(rt['encounter_frame'] / fps, 2) if fps > 0 else 0
+        })
+
+    return {
+        "status": "analyzed",
+        "filename": filename,
+        "avg_characters": round(avg_characters, 3),
+        "max_characters": int(max_persons_in_frame),
+        "total_frames": int(frame_count),
+        "scene_complexity_score": round(scene_complexity_score, 3),
+        "annotated_video": annotated_video_url(output_filename) if annotate else None,
+        "video_fps": round(video_fps, 2),
+        "frame_time_ms": round(frame_time_ms, 2),
+        "avg_motion_intensity": round(avg_motion, 2),
+        "motion_stability": round(fps_stability, 2),
+        "estimated_reaction_time_ms": int(avg_reaction_time),
+        "min_reaction_time_ms": int(min_reaction_time),
+        "max_reaction_time_ms": int(max_reaction_time),
+        "sudden_enemy_encounters": len(enemy_encounters),
+        "successful_eliminations": len(reaction_times),
+        "performance_score": round(performance_score, 2),
+        "persons_per_frame": timeline_points.persons.tolist(),
+        "encounter_details": encounter_summary,
+        "reaction_time_details": reaction_summary,
+        "heat_map": heat_map_normalized,
+        "timeline": timeline_points.to_points(),
+        "timeline_file": timeline_file,  # Full resolution, see /api/sessions/{session_id}/timeline
+        "total_persons_tracked": tracker.total_tracks,  # NEW
+        "player_detected": player_id is not None,  # NEW
+        "trajectories": tracker.trajectories(),  # {track id: [[frame, x, y], ...]} if enabled
+        "detection_sampling": sampler.stats(),
+        "inference_profile": profile,
+        "pipeline_timing": pipeline_stats,
+        "trace_file": tracer.filename,
+        "highlights": highlight_result  # {"highlight_video", "moments", ...} with highlights=True
+    }
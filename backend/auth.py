@@ -1,22 +1,22 @@
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from config import settings
 from models import TokenData, User
 from database import get_collection
+from password_hashing import password_hasher, pwd_context
+from user_cache import user_cache
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/login")
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verify password against hash"""
+    """Verify password against hash (blocking - async code uses password_hasher)"""
     return pwd_context.verify(plain_password, hashed_password)
 
 def get_password_hash(password: str) -> str:
-    """Hash password"""
+    """Hash password (blocking - async code uses password_hasher)"""
     return pwd_context.hash(password)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
@@ -44,12 +44,19 @@ async def authenticate_user(email: str, password: str):
     user = await get_user_by_email(email)
     if not user:
         return False
-    if not verify_password(password, user["hashed_password"]):
+    verified, new_hash = await password_hasher.verify_and_update(password, user["hashed_password"])
+    if not verified:
         return False
+    if new_hash is not None:
+        # Stored with an outdated cost - upgrade it while the password is at hand
+        await get_collection("users").update_one({"email": email}, {"$set": {"hashed_password": new_hash}})
+        user["hashed_password"] = new_hash
+        password_hasher.rehashed += 1
+    user_cache.put(user["_id"], user.get("token_version", 0), user)  # The token about to be issued
     return user
 
-async def get_current_user(token: str = Depends(oauth2_scheme)):
-    """Get current user from token"""
+def decode_token(token: str) -> dict:
+    """Claims of a valid access token, 401 otherwise"""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -57,16 +64,30 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
     )
     try:
         payload = jwt.decode(token, settings.secret_key, algorithms=[settings.algorithm])
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
-        token_data = TokenData(email=email)
     except JWTError:
         raise credentials_exception
-    
-    user = await get_user_by_email(email=token_data.email)
-    if user is None:
+    if payload.get("sub") is None:
         raise credentials_exception
+    return payload
+
+async def get_current_user(token: str = Depends(oauth2_scheme)):
+    """Get current user from token (cached per user id and token version, see user_cache.py)"""
+    payload = decode_token(token)
+    token_version = payload.get("ver", 0)
+    if payload.get("_id") is not None:
+        user = user_cache.get(payload["_id"], token_version)
+        if user is not None:
+            return user
+
+    token_data = TokenData(email=payload["sub"])
+    user = await get_user_by_email(email=token_data.email)
+    if user is None or user.get("token_version", 0) != token_version:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    user_cache.put(user["_id"], token_version, user)
     return user
 
 async def get_current_active_user(current_user: dict = Depends(get_current_user)):
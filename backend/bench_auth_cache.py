@@ -0,0 +1,84 @@
+"""
+Latency of authenticated GETs under load with and without the user cache.
+
+Sends concurrent requests to the app in-process (httpx ASGI transport, no
+network) with a bench user's token and reports p50 / p95 / p99 and
+requests per second for each resolution mode:
+
+- lookup: MongoDB lookup on every request (the cache turned off)
+- cache: users cached per id and token version (see user_cache.py)
+
+/api/auth/me only resolves the user; /api/users/sessions also runs its own
+sessions query. Like the API, this needs MongoDB (settings.mongodb_url).
+
+    python bench_auth_cache.py [requests] [concurrency]
+"""
+import asyncio
+import sys
+import time
+
+import httpx
+import numpy as np
+
+from config import settings
+from database import close_mongo_connection, connect_to_mongo
+from indexes import ensure_indexes
+from user_cache import user_cache
+
+BENCH_USER = {"email": "bench-auth@example.com", "username": "bench_auth", "password": "bench-auth-pw", "full_name": "Bench"}
+ROUTES = ["/api/auth/me", "/api/users/sessions"]
+MODES = {
+    "lookup": 0.0,  # user_cache_ttl_sec
+    "cache": settings.user_cache_ttl_sec or 30.0,
+}
+
+async def login(client) -> dict:
+    await client.post("/api/auth/register", json=BENCH_USER)  # 400 when it already exists
+    response = await client.post(
+        "/api/auth/login", data={"username": BENCH_USER["email"], "password": BENCH_USER["password"]}
+    )
+    response.raise_for_status()
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+async def load(client, url, headers, requests, concurrency):
+    """Latencies (ms) of requests GETs sent by concurrency tasks, and the wall time"""
+    latencies = []
+    remaining = iter(range(requests))
+
+    async def worker():
+        for _ in remaining:
+            start = time.perf_counter()
+            response = await client.get(url, headers=headers)
+            latencies.append((time.perf_counter() - start) * 1000)
+            response.raise_for_status()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return np.array(latencies), time.perf_counter() - start
+
+async def main():
+    import main as api
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 32
+
+    await connect_to_mongo()
+    await ensure_indexes()
+    transport = httpx.ASGITransport(app=api.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        headers = await login(client)
+        print(f"{requests} requests, {concurrency} concurrent\n")
+        print(f"{'route':<22} {'mode':<8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'req/s':>8} {'hits':>6}")
+        for url in ROUTES:
+            for mode, ttl_sec in MODES.items():
+                user_cache.ttl_sec = ttl_sec
+                user_cache.clear()
+                user_cache.hits = user_cache.misses = 0
+                await load(client, url, headers, min(100, requests), concurrency)  # Warm-up
+                latencies, elapsed = await load(client, url, headers, requests, concurrency)
+                p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+                print(f"{url:<22} {mode:<8} {p50:>8.2f} {p95:>8.2f} {p99:>8.2f} "
+                      f"{requests / elapsed:>8.0f} {user_cache.hits:>6}")
+    await close_mongo_connection()
+
+if __name__ == "__main__":
+    asyncio.run(main())
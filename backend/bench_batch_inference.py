@@ -0,0 +1,40 @@
+"""
+Benchmark batched YOLO inference on CPU.
+
+Reports decode + detection frames/sec for several batch sizes on a
+synthetic clip (or a real clip passed as the first argument).
+
+    python bench_batch_inference.py [video.mp4]
+"""
+import sys
+import cv2
+
+from analysis import get_yolo_model
+from detection import iter_batched_detections, read_frames
+from bench_utils import make_synthetic_clip, timed
+
+BATCH_SIZES = [1, 4, 8, 16]
+
+def run_detection(video_path, model, batch_size):
+    cap = cv2.VideoCapture(video_path)
+    frames = 0
+    for _frame, _boxes in iter_batched_detections(read_frames(cap), model, batch_size, conf=0.3, iou=0.5, max_det=10):
+        frames += 1
+    cap.release()
+    return frames
+
+def main():
+    video_path = sys.argv[1] if len(sys.argv) > 1 else make_synthetic_clip(num_frames=240)
+    model = get_yolo_model()
+
+    # Warm-up so the first batch size does not pay for lazy initialization
+    run_detection(video_path, model, 1)
+
+    print(f"Video: {video_path}")
+    print(f"{'batch':>6} {'frames':>7} {'seconds':>8} {'fps':>8}")
+    for batch_size in BATCH_SIZES:
+        frames, elapsed = timed(run_detection, video_path, model, batch_size)
+        print(f"{batch_size:>6} {frames:>7} {elapsed:>8.2f} {frames / elapsed:>8.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Batch upload ingestion: loose videos vs the same videos in a zip.
+
+Streams a multipart batch through ingest_batch_upload (in-process, no
+server) and reports MB/s and the time per video for each layout. Then
+smoke-checks the zips a client should not be able to break a batch with:
+every hostile member must land in `rejected` and leave nothing on disk.
+
+- encrypted: a member with the encryption flag set
+- compression: a member with an unsupported compression method
+- bomb: members that inflate past the batch limit
+
+    python bench_batch_upload.py [videos]
+"""
+import asyncio
+import io
+import os
+import shutil
+import struct
+import sys
+import tempfile
+import time
+import zipfile
+
+from starlette.requests import Request
+
+from bench_utils import make_synthetic_clip
+from config import settings
+from uploads import ingest_batch_upload
+
+BOUNDARY = "benchbatchboundary"
+
+def multipart(files) -> bytes:
+    """multipart/form-data body with (filename, data) in the files field"""
+    body = io.BytesIO()
+    for filename, data in files:
+        body.write(f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="files"; filename="{filename}"\r\n'
+                   f"Content-Type: application/octet-stream\r\n\r\n".encode())
+        body.write(data)
+        body.write(b"\r\n")
+    body.write(f"--{BOUNDARY}--\r\n".encode())
+    return body.getvalue()
+
+def make_zip(members, compression=zipfile.ZIP_STORED) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", compression) as archive:
+        for name, data in members:
+            archive.writestr(name, data)
+    return buffer.getvalue()
+
+def patch_member(data: bytes, index: int, flags: int = 0, method: int = None) -> bytes:
+    """Set general purpose flags / the compression method of a member, in its local and central header"""
+    data = bytearray(data)
+    with zipfile.ZipFile(io.BytesIO(bytes(data))) as archive:
+        local = archive.infolist()[index].header_offset
+    central = -1
+    for _ in range(index + 1):
+        central = data.find(b"PK\x01\x02", central + 1)
+    for start in (local + 6, central + 8):
+        old_flags, old_method = struct.unpack_from("<HH", data, start)
+        struct.pack_into("<HH", data, start, old_flags | flags, old_method if method is None else method)
+    return bytes(data)
+
+def make_request(body: bytes) -> Request:
+    chunks = [body[i:i + 64 * 1024] for i in range(0, len(body), 64 * 1024)]
+
+    async def receive():
+        return {"type": "http.request", "body": chunks.pop(0) if chunks else b"", "more_body": bool(chunks)}
+
+    scope = {"type": "http", "method": "POST", "path": "/", "headers": [
+        (b"content-type", f"multipart/form-data; boundary={BOUNDARY}".encode()),
+        (b"content-length", str(len(body)).encode()),
+    ]}
+    return Request(scope, receive)
+
+async def ingest(files):
+    """(uploads, rejected, seconds) of one batch; the stored uploads are deleted"""
+    request = make_request(multipart(files))
+    start = time.perf_counter()
+    uploads, rejected = await ingest_batch_upload(request)
+    elapsed = time.perf_counter() - start
+    for upload in uploads:
+        os.remove(upload.path)
+    return uploads, rejected, elapsed
+
+async def smoke(video: bytes):
+    cases = {
+        "encrypted": patch_member(make_zip([("ok.mp4", video), ("locked.mp4", video)]), 1, flags=0x1),
+        "compression": patch_member(make_zip([("ok.mp4", video), ("odd.mp4", video)]), 1, method=99),
+        "bomb": make_zip([(f"big{i}.mp4", video[:16] + bytes(400 * 1024)) for i in range(5)], zipfile.ZIP_DEFLATED),
+    }
+
+    batch_max_mb = settings.batch_max_mb
+    print(f"\n{'zip':<12} {'videos':>7} {'rejected':>9}  error")
+    for case, data in cases.items():
+        settings.batch_max_mb = 1 if case == "bomb" else batch_max_mb
+        uploads, rejected, _ = await ingest([(f"{case}.zip", data)])
+        leftovers = os.listdir(settings.upload_dir)
+        print(f"{case:<12} {len(uploads):>7} {len(rejected):>9}  {rejected[0]['error'] if rejected else ''}")
+        assert rejected, f"{case}: no member rejected"
+        assert not leftovers, f"{case}: left {leftovers} in the upload directory"
+    settings.batch_max_mb = batch_max_mb
+
+async def main():
+    videos = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    with open(make_synthetic_clip(num_frames=240), "rb") as f:
+        video = f.read()
+
+    upload_dir = settings.upload_dir
+    settings.upload_dir = tempfile.mkdtemp(prefix="bench_batch_")
+    try:
+        layouts = {
+            "loose": [(f"clip{i}.mp4", video) for i in range(videos)],
+            "zip": [("clips.zip", make_zip([(f"clip{i}.mp4", video) for i in range(videos)]))],
+        }
+        megabytes = len(video) * videos / 1024 / 1024
+        print(f"{videos} videos, {megabytes:.1f} MB")
+        print(f"{'layout':<8} {'videos':>7} {'seconds':>8} {'MB/s':>8} {'ms/video':>9}")
+        for layout, files in layouts.items():
+            await ingest(files)  # Warm-up
+            uploads, _, elapsed = await ingest(files)
+            print(f"{layout:<8} {len(uploads):>7} {elapsed:>8.3f} {megabytes / elapsed:>8.0f} "
+                  f"{elapsed * 1000 / len(uploads):>9.1f}")
+        await smoke(video)
+    finally:
+        shutil.rmtree(settings.upload_dir)
+        settings.upload_dir = upload_dir
+
+if __name__ == "__main__":
+    asyncio.run(main())
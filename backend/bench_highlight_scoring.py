@@ -0,0 +1,128 @@
+"""
+Benchmark highlight scoring against the previous per-frame event scan.
+
+Builds synthetic analysis timelines (person counts that change every few
+seconds, noisy motion) with enemy encounters and eliminations derived the
+way analysis.py derives them, then times highlights.detect_highlight_moments
+and the previous implementation, which scanned every encounter and
+elimination for every frame and merged with list.remove, and checks that
+both return the same moments.
+
+    python bench_highlight_scoring.py
+"""
+import numpy as np
+
+from bench_utils import timed
+from highlights import detect_highlight_moments
+
+TIMELINE_LENGTHS = [10000, 100000]
+FPS = 30.0
+
+def synthetic_timeline(num_frames, fps=FPS, seed=0):
+    """(timeline_data, enemy_encounters, reaction_times) shaped like analysis results"""
+    rng = np.random.default_rng(seed)
+    persons = np.zeros(num_frames, dtype=int)
+    pos = 0
+    while pos < num_frames:
+        length = int(rng.integers(fps, fps * 5))  # Person count holds for 1-5 s
+        persons[pos:pos + length] = rng.choice([0, 1, 1, 2, 2, 3, 4])
+        pos += length
+    motion = rng.gamma(2.0, 5.0, size=num_frames)
+
+    timeline_data, enemy_encounters, reaction_times = [], [], []
+    prev = 0
+    for idx in range(num_frames):
+        frame = idx + 1
+        count = int(persons[idx])
+        timeline_data.append({
+            'frame': frame,
+            'time': frame / fps,
+            'persons': count,
+            'motion': float(motion[idx]),
+            'detections': []
+        })
+        if count > prev:
+            enemy_encounters.append({'frame': frame, 'time_sec': frame / fps, 'new_persons': count - prev})
+        if count < prev and enemy_encounters:
+            since = frame - enemy_encounters[-1]['frame']
+            if 0 < since < fps * 3:
+                reaction_times.append({
+                    'encounter_frame': enemy_encounters[-1]['frame'],
+                    'elimination_frame': frame,
+                    'reaction_time_ms': since / fps * 1000
+                })
+        prev = count
+    return timeline_data, enemy_encounters, reaction_times
+
+def detect_highlight_moments_scan(timeline_data, enemy_encounters, reaction_times, fps, total_frames):
+    """The previous implementation: O(frames x events) scoring, O(n^2) merge"""
+    highlights = []
+    for frame_data in timeline_data:
+        frame_num = frame_data['frame']
+        persons = frame_data['persons']
+        motion = frame_data['motion']
+        excitement_score = 0
+        moment_type = []
+        if persons >= 3:
+            excitement_score += 30 * persons
+            moment_type.append("multi_enemy")
+        elif persons >= 2:
+            excitement_score += 20 * persons
+            moment_type.append("combat")
+        if motion > 15:
+            excitement_score += motion * 2
+            moment_type.append("intense_action")
+        for encounter in enemy_encounters:
+            if abs(frame_num - encounter['frame']) < fps * 2:
+                excitement_score += 40
+                moment_type.append("enemy_encounter")
+                break
+        for rt in reaction_times:
+            if abs(frame_num - rt['elimination_frame']) < fps * 1:
+                if rt['reaction_time_ms'] < 300:
+                    excitement_score += 50
+                    moment_type.append("quick_kill")
+                else:
+                    excitement_score += 30
+                    moment_type.append("elimination")
+                break
+        if excitement_score > 50:
+            highlights.append({
+                'frame': frame_num,
+                'time_sec': frame_data['time'],
+                'score': excitement_score,
+                'types': moment_type,
+                'persons': persons,
+                'motion': motion
+            })
+
+    merged_highlights = []
+    if highlights:
+        highlights.sort(key=lambda x: x['score'], reverse=True)
+        for highlight in highlights:
+            too_close = False
+            for existing in merged_highlights:
+                if abs(highlight['time_sec'] - existing['time_sec']) < 5:
+                    too_close = True
+                    if highlight['score'] > existing['score']:
+                        merged_highlights.remove(existing)
+                        too_close = False
+                    break
+            if not too_close:
+                merged_highlights.append(highlight)
+        merged_highlights.sort(key=lambda x: x['time_sec'])
+        merged_highlights = merged_highlights[:5]
+    return merged_highlights
+
+def main():
+    print(f"{'frames':>7} {'encounters':>11} {'eliminations':>13} {'scan s':>8} {'numpy s':>8} {'speedup':>8}  same moments")
+    for num_frames in TIMELINE_LENGTHS:
+        timeline, encounters, reactions = synthetic_timeline(num_frames)
+        args = (timeline, encounters, reactions, FPS, num_frames)
+        expected, scan = timed(detect_highlight_moments_scan, *args)
+        moments, vectorized = timed(detect_highlight_moments, *args)
+        print(f"{num_frames:>7} {len(encounters):>11} {len(reactions):>13} {scan:>8.2f} {vectorized:>8.3f} "
+              f"{scan / vectorized:>7.0f}x  {moments == expected}")
+
+if __name__ == "__main__":
+    main()
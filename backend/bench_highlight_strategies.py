@@ -0,0 +1,135 @@
+"""
+Time every registered highlight strategy on the same timeline.
+
+The timeline is synthetic (see bench_highlight_scoring.py) or a recorded one:
+a JSON file with the detect_highlight_moments inputs
+{"timeline": [...], "enemy_encounters": [...], "reaction_times": [...], "fps": 30}.
+For each strategy it prints the time per call and the moments it picks, so
+the cheapest strategy that still finds good moments can be chosen
+(settings.highlight_strategy, or strategy= on /generate-highlights).
+
+The "event_windows" strategy is also checked against the original
+per-event loops it was vectorized from.
+
+    python bench_highlight_strategies.py [timeline.json]
+"""
+import json
+import math
+import sys
+
+from bench_highlight_scoring import synthetic_timeline
+from bench_utils import timed
+from highlights import HIGHLIGHT_STRATEGIES, detect_highlight_moments
+
+NUM_FRAMES = 100000
+REPEATS = 3
+
+def event_window_moments_loop(timeline_data, enemy_encounters, reaction_times, fps, total_frames):
+    """The original kill streak / fast reaction / high intensity / clutch detector"""
+    moments = []
+    for i, encounter in enumerate(enemy_encounters):
+        encounter_frame = encounter['frame']
+        enemies_in_window = encounter['new_persons']
+        window_end = encounter_frame + int(fps * 5)
+        for j in range(i + 1, len(enemy_encounters)):
+            if enemy_encounters[j]['frame'] <= window_end:
+                enemies_in_window += enemy_encounters[j]['new_persons']
+        if enemies_in_window >= 2:
+            moments.append({
+                'type': 'kill_streak',
+                'start_frame': max(0, encounter_frame - int(fps * 2)),
+                'end_frame': min(total_frames, window_end + int(fps * 1)),
+                'score': enemies_in_window * 30,
+                'description': f'{enemies_in_window} enemies in quick succession'
+            })
+    for rt in reaction_times:
+        if rt['reaction_time_ms'] < 800:
+            moments.append({
+                'type': 'fast_reaction',
+                'start_frame': max(0, rt['encounter_frame'] - int(fps * 1.5)),
+                'end_frame': min(total_frames, rt['elimination_frame'] + int(fps * 1)),
+                'score': 100 - (rt['reaction_time_ms'] / 10),
+                'description': f'Quick elimination ({int(rt["reaction_time_ms"])}ms)'
+            })
+    if len(timeline_data) > 0:
+        window_size = int(fps * 3)
+        for i in range(0, len(timeline_data) - window_size, int(fps)):
+            window = timeline_data[i:i + window_size]
+            avg_persons = sum(f['persons'] for f in window) / len(window)
+            avg_motion = sum(f['motion'] for f in window) / len(window)
+            intensity_score = (avg_persons * 20) + (avg_motion / 5)
+            if intensity_score > 50:
+                moments.append({
+                    'type': 'high_intensity',
+                    'start_frame': window[0]['frame'],
+                    'end_frame': window[-1]['frame'],
+                    'score': intensity_score,
+                    'description': 'Intense combat action'
+                })
+    for i, frame_data in enumerate(timeline_data):
+        if frame_data['persons'] >= 3:
+            end_idx = min(len(timeline_data), i + int(fps * 5))
+            if end_idx < len(timeline_data):
+                if timeline_data[end_idx]['persons'] < frame_data['persons']:
+                    moments.append({
+                        'type': 'clutch',
+                        'start_frame': max(0, frame_data['frame'] - int(fps * 2)),
+                        'end_frame': min(total_frames, timeline_data[end_idx]['frame'] + int(fps * 1)),
+                        'score': frame_data['persons'] * 25,
+                        'description': f'Clutch vs {frame_data["persons"]} enemies'
+                    })
+
+    if len(moments) > 1:
+        moments.sort(key=lambda x: x['start_frame'])
+        merged = []
+        current = moments[0]
+        for next_moment in moments[1:]:
+            if next_moment['start_frame'] <= current['end_frame']:
+                if next_moment['score'] > current['score']:
+                    current = next_moment
+            else:
+                merged.append(current)
+                current = next_moment
+        merged.append(current)
+        moments = merged
+    moments.sort(key=lambda x: x['score'], reverse=True)
+    return moments[:5]
+
+def same_window_moments(expected, moments):
+    """Same clips, descriptions and (up to float rounding of window sums) scores"""
+    expected = sorted(expected, key=lambda m: m['start_frame'])
+    fields = ('type', 'start_frame', 'end_frame', 'description')
+    return len(expected) == len(moments) and all(
+        all(a[f] == b[f] for f in fields) and math.isclose(a['score'], b['score'], rel_tol=1e-9)
+        for a, b in zip(expected, moments)
+    )
+
+def load_timeline(path):
+    with open(path) as f:
+        data = json.load(f)
+    fps = data["fps"]
+    timeline = data["timeline"]
+    return timeline, data["enemy_encounters"], data["reaction_times"], fps, data.get("total_frames", len(timeline))
+
+def main():
+    if len(sys.argv) > 1:
+        args = load_timeline(sys.argv[1])
+    else:
+        timeline, encounters, reactions = synthetic_timeline(NUM_FRAMES)
+        args = (timeline, encounters, reactions, 30.0, NUM_FRAMES)
+    print(f"{len(args[0])} frames, {len(args[1])} encounters, {len(args[2])} eliminations\n")
+
+    for name in HIGHLIGHT_STRATEGIES:
+        runs = [timed(detect_highlight_moments, *args, strategy=name) for _ in range(REPEATS)]
+        moments = runs[0][0]
+        best = min(elapsed for _, elapsed in runs)
+        print(f"{name}: {best * 1000:.1f} ms, {len(moments)} moments")
+        for m in moments:
+            print(f"  {m['time_sec']:>8.1f}s  score {m['score']:>6.0f}  {', '.join(m['types'])}")
+
+    expected, loop = timed(event_window_moments_loop, *args)
+    moments = detect_highlight_moments(*args, strategy="event_windows")
+    print(f"\nevent_windows per-event loops: {loop * 1000:.1f} ms, same moments: {same_window_moments(expected, moments)}")
+
+if __name__ == "__main__":
+    main()
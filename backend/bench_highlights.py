@@ -0,0 +1,105 @@
+"""
+Benchmark the highlight reel writer against the previous seek-per-moment writer.
+
+Both write the same reel (5 moments, as detect_highlight_moments returns at
+most 5) from a long synthetic clip, with moments spread over the whole
+video, clustered near its end, in its first minute, and close enough at the
+start for two clips to overlap. Reports wall time and checks the decoded
+reels are frame-identical.
+
+    python bench_highlights.py [video.mp4]
+"""
+import hashlib
+import os
+import sys
+import tempfile
+
+import cv2
+import numpy as np
+
+import highlights
+from bench_utils import make_synthetic_clip, timed
+from detection import read_frames
+
+NUM_FRAMES = 18000  # 10 minutes at 30 fps
+
+def generate_highlight_reel_seek(input_video_path, highlight_moments, fps, original_filename):
+    """The previous writer: seek to every clip, rebuild the overlays per frame"""
+    cap = cv2.VideoCapture(input_video_path)
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    highlight_filename = f"highlights_{original_filename}"
+    out = cv2.VideoWriter(os.path.join(highlights.settings.output_dir, highlight_filename),
+                          cv2.VideoWriter_fourcc(*"mp4v"), fps, (width, height))
+    clip_frames = int(4 * fps)
+
+    for idx, moment in enumerate(highlight_moments):
+        start_frame = max(0, moment['frame'] - clip_frames // 2)
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+
+        frames_written = 0
+        while frames_written < clip_frames:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            overlay = frame.copy()
+            cv2.rectangle(overlay, (0, 0), (width, 80), (0, 0, 0), -1)
+            cv2.addWeighted(overlay, 0.6, frame, 0.4, 0, frame)
+            cv2.putText(frame, f"Highlight #{idx + 1}", (20, 30),
+                       cv2.FONT_HERSHEY_SIMPLEX, 1.0, (0, 255, 255), 2)
+            cv2.putText(frame, ", ".join(moment['types'][:2]).upper(), (20, 60),
+                       cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
+            bar_width = int(frames_written / clip_frames * (width - 40))
+            cv2.rectangle(frame, (20, height - 30), (20 + bar_width, height - 20),
+                         (0, 255, 255), -1)
+            out.write(frame)
+            frames_written += 1
+
+        if idx < len(highlight_moments) - 1:
+            black_frame = np.zeros((height, width, 3), dtype=np.uint8)
+            cv2.putText(black_frame, "NEXT HIGHLIGHT", (width // 2 - 150, height // 2),
+                       cv2.FONT_HERSHEY_SIMPLEX, 1.5, (255, 255, 255), 3)
+            for _ in range(int(fps * 0.5)):
+                out.write(black_frame)
+
+    cap.release()
+    out.release()
+    return highlight_filename
+
+def make_moments(frames, types=("multi_enemy", "intense_action")):
+    return [{'frame': int(f), 'score': 200, 'types': list(types)} for f in frames]
+
+def reel_digest(filename):
+    cap = cv2.VideoCapture(os.path.join(highlights.settings.output_dir, filename))
+    digest = hashlib.sha256()
+    count = 0
+    for frame in read_frames(cap):
+        digest.update(frame.tobytes())
+        count += 1
+    cap.release()
+    return count, digest.hexdigest()[:12]
+
+def main():
+    video_path = sys.argv[1] if len(sys.argv) > 1 else make_synthetic_clip(num_frames=NUM_FRAMES)
+    highlights.settings.output_dir = tempfile.mkdtemp()
+    cap = cv2.VideoCapture(video_path)
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+
+    scenarios = {
+        "spread": make_moments(np.linspace(total * 0.1, total * 0.9, 5)),
+        "clustered": make_moments(total - fps * 5 * np.arange(5, 0, -1)),
+        "first minute": make_moments(fps * 5 * np.arange(1, 6)),
+        "overlapping": make_moments(fps * (5 * np.arange(5) + 0.3)),  # First clip is clamped at frame 0
+    }
+    print(f"{os.path.basename(video_path)}: {total} frames at {fps:.0f} fps\n")
+    print(f"{'moments':<13} {'seek s':>7} {'single-pass s':>14} {'speedup':>8}  identical")
+    for name, moments in scenarios.items():
+        _, seek = timed(generate_highlight_reel_seek, video_path, moments, fps, "seek.mp4")
+        _, single = timed(highlights.generate_highlight_reel, video_path, moments, fps, "single.mp4")
+        same = reel_digest("highlights_seek.mp4") == reel_digest("highlights_single.mp4")
+        print(f"{name:<13} {seek:>7.2f} {single:>14.2f} {seek / single:>7.2f}x  {same}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Measure the fps / accuracy trade-off of every inference profile.
+
+Runs each profile of detection.INFERENCE_PROFILES (with the configured
+detector backend and settings.detection_roi) over the frames of a reference
+clip, in batches of settings.detection_batch_size, and compares its person
+boxes with the original full-frame, all-class, 640 px detections:
+
+- precision / recall: boxes matched one to one at IoU >= MATCH_IOU
+- count agreement: frames where the number of persons is the same (the
+  encounter / elimination metrics are driven by person counts)
+
+The table is printed and written to settings.inference_profile_report,
+which /api/inference-profiles publishes next to each profile. Use a real
+gameplay clip; the synthetic default clip only checks that it runs.
+
+    python bench_inference_profiles.py [video.mp4]
+"""
+import json
+import os
+import sys
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+from bench_onnx_parity import box_iou
+from bench_utils import make_synthetic_clip, timed
+from config import settings
+from detection import DETECTION_PARAMS, INFERENCE_PROFILES, detect_persons_batch, detection_params, read_frames
+from model_manager import get_yolo_model
+
+MATCH_IOU = 0.5
+
+def run_profile(model, frames, params):
+    batch_size = settings.detection_batch_size
+    detections = []
+    for start in range(0, len(frames), batch_size):
+        detections.extend(detect_persons_batch(model, frames[start:start + batch_size], **params))
+    return detections
+
+def matched_boxes(expected, actual):
+    """Boxes of actual matched one to one to expected at IoU >= MATCH_IOU (greedy, best IoU first)"""
+    if len(expected) == 0 or len(actual) == 0:
+        return 0
+    ious = box_iou(expected, actual)
+    matched = 0
+    while ious.size and ious.max() >= MATCH_IOU:
+        i, j = np.unravel_index(ious.argmax(), ious.shape)
+        matched += 1
+        ious[i, :] = 0
+        ious[:, j] = 0
+    return matched
+
+def accuracy(reference, detections):
+    matched = sum(matched_boxes(e, a) for e, a in zip(reference, detections))
+    expected = sum(len(e) for e in reference)
+    found = sum(len(a) for a in detections)
+    same_count = sum(len(e) == len(a) for e, a in zip(reference, detections))
+    return {
+        "precision": round(matched / found, 4) if found else 1.0,
+        "recall": round(matched / expected, 4) if expected else 1.0,
+        "count_agreement": round(same_count / len(reference), 4) if reference else 1.0,
+    }
+
+def main():
+    video_path = sys.argv[1] if len(sys.argv) > 1 else make_synthetic_clip(num_frames=240)
+    cap = cv2.VideoCapture(video_path)
+    frames = list(read_frames(cap))
+    cap.release()
+    model = get_yolo_model()
+    run_profile(model, frames[:settings.detection_batch_size], DETECTION_PARAMS)  # Warm-up
+
+    reference, _ = timed(run_profile, model, frames, DETECTION_PARAMS)
+    print(f"{os.path.basename(video_path)}: {len(frames)} frames, backend {settings.detector_backend}, "
+          f"roi {settings.detection_roi or 'whole frame'}\n")
+    print(f"{'profile':<12} {'fps':>7} {'ms/frame':>9} {'precision':>10} {'recall':>7} {'same count':>11}")
+
+    report = {}
+    for name in INFERENCE_PROFILES:
+        detections, elapsed = timed(run_profile, model, frames, detection_params(name))
+        report[name] = {
+            "fps": round(len(frames) / elapsed, 1),
+            "ms_per_frame": round(elapsed / len(frames) * 1000, 2),
+            **accuracy(reference, detections),
+        }
+        r = report[name]
+        print(f"{name:<12} {r['fps']:>7.1f} {r['ms_per_frame']:>9.2f} {r['precision']:>10.3f} "
+              f"{r['recall']:>7.3f} {r['count_agreement']:>11.3f}")
+
+    with open(settings.inference_profile_report, "w") as f:
+        json.dump({
+            "clip": os.path.basename(video_path),
+            "frames": len(frames),
+            "detector_backend": settings.detector_backend,
+            "roi": settings.detection_roi or None,
+            "measured_at": datetime.utcnow().isoformat(),
+            "profiles": report,
+        }, f, indent=2)
+    print(f"\nWrote {settings.inference_profile_report}")
+
+if __name__ == "__main__":
+    main()
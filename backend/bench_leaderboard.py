@@ -0,0 +1,64 @@
+"""
+Leaderboard reads: materialized skip lists vs sorting every entry.
+
+For boards of growing size, times per call (microseconds):
+
+- sort: what every request did before - order all entries by best score
+  (the old find().sort() without an index), then take the top page or
+  look up a position
+- top 100, deep page (a cursor in the middle), rank + 5 neighbors and an
+  update (one more analysis of a random player: its preset and "all" board
+  in all three windows) on the LeaderboardEngine
+
+The engine numbers should grow with log n, the sort with n log n.
+
+    python bench_leaderboard.py
+"""
+import random
+from datetime import datetime
+
+from bench_utils import timed
+from leaderboard import ALL_PRESETS, ALL_TIME, LeaderboardEngine, encode_cursor
+
+SIZES = [1_000, 10_000, 100_000, 300_000]
+PRESETS = ["valorant", "cs2", "bgmi", "fortnite"]
+REPEATS = 200
+
+def build(size: int) -> LeaderboardEngine:
+    engine = LeaderboardEngine()
+    now = datetime.utcnow()
+    for i in range(size):
+        engine.record(f"user{i}", f"player{i}", random.choice(PRESETS), {
+            "performance_score": round(random.uniform(0, 100), 2),
+            "estimated_reaction_time_ms": random.randint(120, 600),
+            "video_fps": 60,
+        }, now)
+    return engine
+
+def per_call_us(fn, repeats=REPEATS) -> float:
+    _, elapsed = timed(lambda: [fn() for _ in range(repeats)])
+    return elapsed / repeats * 1e6
+
+def main():
+    random.seed(0)
+    print(f"{'entries':>8} {'sort':>10} {'top 100':>9} {'deep page':>10} {'rank+5':>8} {'update':>8}   (us per call)")
+    for size in SIZES:
+        engine = build(size)
+        board = engine.boards[(ALL_PRESETS, ALL_TIME)]
+        entries = [entry for _, entry in board.slice(0, size)]
+        users = random.sample([entry["user_id"] for entry in entries], REPEATS)
+        middle = encode_cursor(board.slice(size // 2, 1)[0][0])
+
+        sort_us = per_call_us(lambda: sorted(entries, key=lambda e: -e["best_performance_score"])[:100], repeats=5)
+        top_us = per_call_us(lambda: engine.page(ALL_PRESETS, ALL_TIME, 100))
+        deep_us = per_call_us(lambda: engine.page(ALL_PRESETS, ALL_TIME, 100, middle))
+        user_iter = iter(users * 2)
+        rank_us = per_call_us(lambda: engine.around(next(user_iter), ALL_PRESETS, ALL_TIME, 5))
+        update_iter = iter(users)
+        update_us = per_call_us(lambda: engine.record(next(update_iter), "p", random.choice(PRESETS), {
+            "performance_score": random.uniform(0, 100), "estimated_reaction_time_ms": 300, "video_fps": 60
+        }, datetime.utcnow()))
+        print(f"{size:>8} {sort_us:>10.0f} {top_us:>9.0f} {deep_us:>10.0f} {rank_us:>8.1f} {update_us:>8.1f}")
+
+if __name__ == "__main__":
+    main()
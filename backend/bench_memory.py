@@ -0,0 +1,82 @@
+"""
+Measure the memory used by video analysis as videos get longer.
+
+- Peak RSS of analyze_video_path on synthetic clips of increasing length,
+  each run in a fresh process so the peaks do not mix
+- Python heap held by the person tracker when the same people stay on
+  screen for a 20-minute video (tracemalloc, no model needed)
+
+    python bench_memory.py
+"""
+import contextlib
+import io
+import multiprocessing
+import os
+import sys
+import tracemalloc
+import uuid
+
+from bench_tracker import synthetic_detections
+from bench_utils import make_synthetic_clip
+from tracker import PersonTracker
+
+CLIP_FRAMES = [1800, 9000, 36000]  # 1, 5 and 20 minutes at 30 fps
+
+def peak_rss_mb() -> float:
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # KiB on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def _analyze(video_path, results):
+    from analysis import analyze_video_path, get_yolo_model
+    from config import settings
+    from detection_cache import cache_key, detection_cache
+
+    os.makedirs(settings.output_dir, exist_ok=True)
+    get_yolo_model()
+    before = peak_rss_mb()
+    content_hash = f"bench-{uuid.uuid4().hex}"  # Do not hit the detection cache
+    with contextlib.redirect_stdout(io.StringIO()):
+        analyze_video_path(video_path, os.path.basename(video_path), None, "full", content_hash)
+    os.remove(detection_cache._path(cache_key(content_hash, "full")))
+    results.put((before, peak_rss_mb()))
+
+def tracker_heap_mb(num_frames: int) -> float:
+    frames = synthetic_detections(num_frames, on_screen=4, lifetime=num_frames * 2)
+    tracemalloc.start()
+    tracker = PersonTracker()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for frame_idx, boxes in enumerate(frames, start=1):
+            tracker.update(boxes, frame_idx)
+            if frame_idx > 5:
+                tracker.lock_player(frame_idx)
+    current, _peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return current / (1024 * 1024)
+
+def main():
+    print(f"Tracker heap, 4 people on screen for 36000 frames: {tracker_heap_mb(36000):.2f} MB")
+
+    try:
+        import resource  # noqa: F401
+    except ImportError:
+        print("Peak RSS needs the resource module (Linux / macOS)")
+        return
+
+    ctx = multiprocessing.get_context("spawn")
+    print(f"\n{'frames':>7} {'after model load MB':>20} {'peak MB':>8} {'analysis MB':>12}")
+    for num_frames in CLIP_FRAMES:
+        clip = make_synthetic_clip(num_frames=num_frames, width=320, height=180, num_figures=4)
+        results = ctx.Queue()
+        worker = ctx.Process(target=_analyze, args=(clip, results))
+        worker.start()
+        worker.join()
+        if worker.exitcode != 0:
+            print(f"{num_frames:>7} analysis failed (exit code {worker.exitcode})")
+            continue
+        before, peak = results.get()
+        print(f"{num_frames:>7} {before:>20.1f} {peak:>8.1f} {peak - before:>12.1f}")
+
+if __name__ == "__main__":
+    main()
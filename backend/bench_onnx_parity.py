@@ -0,0 +1,103 @@
+"""
+Compare the ONNX Runtime detector backend with the PyTorch one.
+
+Runs both backends (see detectors.py) on the same sample frames: the
+ultralytics sample images (bus.jpg, zidane.jpg) plus evenly spaced frames of
+a clip, a real gameplay clip when one is given. For every frame the person
+boxes are matched greedily by IoU; the frame is at parity when every box
+has a partner with IoU >= MIN_IOU and a confidence within MAX_CONF_DIFF.
+Then both backends are timed on the clip frames at batch sizes 1 and 8.
+
+Exports settings.onnx_model_path first if it does not exist (needs
+ultralytics + torch, like the PyTorch backend itself).
+
+    python bench_onnx_parity.py [video.mp4]
+"""
+import os
+import sys
+
+import cv2
+import numpy as np
+
+from bench_utils import make_synthetic_clip, timed
+from config import settings
+from detection import DETECTION_PARAMS, read_frames
+from detectors import OnnxDetector, TorchDetector, export_onnx
+
+MIN_IOU = 0.9
+MAX_CONF_DIFF = 0.05
+SAMPLE_FRAMES = 16
+BATCH_SIZES = [1, 8]
+
+def sample_frames(video_path):
+    from ultralytics.utils import ASSETS
+    frames = [(name, cv2.imread(str(ASSETS / name))) for name in ("bus.jpg", "zidane.jpg")]
+    cap = cv2.VideoCapture(video_path)
+    clip = list(read_frames(cap))
+    cap.release()
+    step = max(1, len(clip) // SAMPLE_FRAMES)
+    frames += [(f"frame {i}", clip[i]) for i in range(0, len(clip), step)][:SAMPLE_FRAMES]
+    return frames, clip
+
+def box_iou(a, b):
+    """IoU matrix of two (n, 4+) box arrays"""
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-7)
+
+def match(expected, actual):
+    """(matched pairs, min IoU, max confidence difference) of a greedy IoU matching"""
+    if len(expected) == 0 or len(actual) == 0:
+        return 0, 1.0, 0.0
+    ious = box_iou(expected, actual)
+    pairs, min_iou, max_conf = 0, 1.0, 0.0
+    while ious.size and ious.max() > 0:
+        i, j = np.unravel_index(ious.argmax(), ious.shape)
+        pairs += 1
+        min_iou = min(min_iou, float(ious[i, j]))
+        max_conf = max(max_conf, abs(float(expected[i, 4] - actual[j, 4])))
+        ious[i, :] = 0
+        ious[:, j] = 0
+    return pairs, min_iou, max_conf
+
+def throughput(detector, frames, batch_size):
+    def run():
+        for start in range(0, len(frames), batch_size):
+            detector.detect(frames[start:start + batch_size], **DETECTION_PARAMS)
+    _, elapsed = timed(run)
+    return len(frames) / elapsed
+
+def main():
+    video_path = sys.argv[1] if len(sys.argv) > 1 else make_synthetic_clip(num_frames=240)
+    if not os.path.exists(settings.onnx_model_path):
+        print(f"Exporting {settings.yolo_model_path} -> {export_onnx()}")
+    torch_detector = TorchDetector(settings.yolo_model_path)
+    onnx_detector = OnnxDetector(settings.onnx_model_path, settings.onnx_imgsz, settings.onnx_threads)
+
+    frames, clip = sample_frames(video_path)
+    print(f"{'frame':<12} {'torch':>6} {'onnx':>5} {'matched':>8} {'min IoU':>8} {'max dconf':>10}  parity")
+    at_parity = 0
+    for name, frame in frames:
+        expected = torch_detector.detect([frame], **DETECTION_PARAMS)[0]
+        actual = onnx_detector.detect([frame], **DETECTION_PARAMS)[0]
+        pairs, min_iou, max_conf = match(expected, actual)
+        parity = pairs == len(expected) == len(actual) and min_iou >= MIN_IOU and max_conf <= MAX_CONF_DIFF
+        at_parity += parity
+        print(f"{name:<12} {len(expected):>6} {len(actual):>5} {pairs:>8} {min_iou:>8.3f} {max_conf:>10.4f}  {parity}")
+    print(f"\n{at_parity}/{len(frames)} frames at parity (IoU >= {MIN_IOU}, |dconf| <= {MAX_CONF_DIFF})\n")
+
+    print(f"{'batch':>6} {'torch fps':>10} {'onnx fps':>9} {'speedup':>8}")
+    for batch_size in BATCH_SIZES:
+        throughput(onnx_detector, clip[:batch_size], batch_size)  # Warm-up
+        throughput(torch_detector, clip[:batch_size], batch_size)
+        torch_fps = throughput(torch_detector, clip, batch_size)
+        onnx_fps = throughput(onnx_detector, clip, batch_size)
+        print(f"{batch_size:>6} {torch_fps:>10.1f} {onnx_fps:>9.1f} {onnx_fps / torch_fps:>7.2f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Login throughput with bcrypt on the event loop vs the hashing executor.
+
+Simulates a burst of concurrent logins (the password verify of
+authenticate_user) while a heartbeat task ticks every TICK_SEC on the same
+event loop, standing in for every other request the API is serving:
+
+- inline: pwd_context.verify on the event loop (the old behavior)
+- executor: password_hasher.verify_and_update (see password_hashing.py)
+
+Reports logins per second, p50 / p99 login latency, the worst heartbeat
+delay (how long other requests stall) and the hasher's peak queue depth.
+Then times the first login of a hash with an outdated cost (verify + rehash)
+against the next one.
+
+    python bench_password_hashing.py [logins] [workers]
+"""
+import asyncio
+import sys
+import time
+
+import numpy as np
+
+from config import settings
+from password_hashing import PasswordHasher, pwd_context
+
+PASSWORD = "bench-password"
+TICK_SEC = 0.01
+
+async def heartbeat(stop: asyncio.Event) -> float:
+    """Worst lateness (ms) of a TICK_SEC sleep until stop is set"""
+    worst = 0.0
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(TICK_SEC)
+        worst = max(worst, time.perf_counter() - start - TICK_SEC)
+    return worst * 1000
+
+async def burst(login, logins: int):
+    """Latencies (ms) of logins concurrent logins, wall time and worst heartbeat delay"""
+    stop = asyncio.Event()
+    ticker = asyncio.create_task(heartbeat(stop))
+    await asyncio.sleep(TICK_SEC * 2)
+    latencies = []
+
+    async def one():
+        start = time.perf_counter()
+        await login()
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(logins)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    return np.array(latencies), elapsed, await ticker
+
+async def main():
+    logins = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else settings.password_hash_workers
+    hashed = pwd_context.hash(PASSWORD)
+    hasher = PasswordHasher(workers=workers, max_queue=logins)
+
+    async def inline():
+        assert pwd_context.verify(PASSWORD, hashed)
+
+    async def executor():
+        verified, _ = await hasher.verify_and_update(PASSWORD, hashed)
+        assert verified
+
+    print(f"{logins} concurrent logins, bcrypt rounds {settings.bcrypt_rounds}, {workers} hashing workers\n")
+    print(f"{'mode':<10} {'logins/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'max loop stall ms':>18} {'peak queue':>11}")
+    for mode, login in (("inline", inline), ("executor", executor)):
+        latencies, elapsed, stall = await burst(login, logins)
+        p50, p99 = np.percentile(latencies, [50, 99])
+        peak = hasher.status()["peak_queued"] if mode == "executor" else "-"
+        print(f"{mode:<10} {logins / elapsed:>9.1f} {p50:>8.0f} {p99:>8.0f} {stall:>18.1f} {peak:>11}")
+
+    outdated = pwd_context.hash(PASSWORD, rounds=max(4, settings.bcrypt_rounds - 2))
+    start = time.perf_counter()
+    _, new_hash = await hasher.verify_and_update(PASSWORD, outdated)
+    rehash_ms = (time.perf_counter() - start) * 1000
+    start = time.perf_counter()
+    await hasher.verify_and_update(PASSWORD, new_hash)
+    print(f"\nOutdated hash: first login {rehash_ms:.0f} ms (verify + rehash), "
+          f"next login {(time.perf_counter() - start) * 1000:.0f} ms")
+    print(hasher.status())
+    hasher.shutdown()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,49 @@
+"""
+Benchmark the threaded analysis pipeline against running the same stages
+sequentially in one thread.
+
+Prints the wall time of analyze_video_path in both modes and the per-stage
+timing counters, which show the bottleneck stage (highest busy_ms) and
+where the others sit waiting on it.
+
+    python bench_pipeline.py [video.mp4]
+"""
+import os
+import sys
+import uuid
+
+from analysis import analyze_video_path, get_yolo_model
+from bench_utils import make_synthetic_clip, timed
+from config import settings
+from detection_cache import cache_key, detection_cache
+
+def print_stages(timing: dict):
+    print(f"  {'stage':<8} {'frames':>7} {'busy ms':>10} {'ms/frame':>9} {'wait in':>10} {'wait out':>10}")
+    for name, stage in timing["stages"].items():
+        print(f"  {name:<8} {stage['frames']:>7} {stage['busy_ms']:>10} {stage['ms_per_frame']:>9} "
+              f"{stage['wait_in_ms']:>10} {stage['wait_out_ms']:>10}")
+
+def main():
+    video_path = sys.argv[1] if len(sys.argv) > 1 else make_synthetic_clip(num_frames=600)
+    name = os.path.basename(video_path)
+    os.makedirs(settings.output_dir, exist_ok=True)
+    get_yolo_model()
+
+    results = {}
+    for threaded in (False, True):
+        # A throwaway content hash so both runs really run YOLO instead of hitting the cache
+        content_hash = f"bench-{uuid.uuid4().hex}"
+        result, elapsed = timed(analyze_video_path, video_path, name, None, "full", content_hash, threaded)
+        os.remove(detection_cache._path(cache_key(content_hash, "full")))
+        results[threaded] = (result, elapsed)
+
+    sequential, sequential_time = results[False]
+    threaded, threaded_time = results[True]
+    print(f"\n=== {video_path} ({threaded['total_frames']} frames, {os.cpu_count()} CPUs) ===")
+    print(f"sequential: {sequential_time:.2f}s")
+    print_stages(sequential["pipeline_timing"])
+    print(f"threaded:   {threaded_time:.2f}s ({sequential_time / threaded_time:.2f}x)")
+    print_stages(threaded["pipeline_timing"])
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Compare adaptive detection sampling against full (every-frame) detection.
+
+Runs analyze_video_path in both modes on the same clips and reports the
+speedup, how many frames were actually sent to YOLO, and how far the
+sampled metrics are from the full-mode ones.
+
+    python bench_sampling_accuracy.py [clip1.mp4 clip2.mp4 ...]
+"""
+import os
+import sys
+
+from analysis import analyze_video_path, get_yolo_model
+from bench_utils import make_synthetic_clip, timed
+from config import settings
+
+COMPARED_METRICS = [
+    "avg_characters",
+    "max_characters",
+    "sudden_enemy_encounters",
+    "successful_eliminations",
+    "estimated_reaction_time_ms",
+    "total_persons_tracked",
+]
+
+def compare(full: dict, sampled: dict) -> dict:
+    """Accuracy of a sampled analysis relative to the full one"""
+    report = {}
+    for key in COMPARED_METRICS:
+        report[key] = (full.get(key, 0), sampled.get(key, 0))
+
+    full_persons = [f["persons"] for f in full.get("timeline", [])]
+    sampled_persons = [f["persons"] for f in sampled.get("timeline", [])]
+    n = min(len(full_persons), len(sampled_persons))
+    matches = sum(1 for a, b in zip(full_persons[:n], sampled_persons[:n]) if a == b)
+    report["timeline_person_count_agreement"] = matches / n if n else 1.0
+    return report
+
+def main():
+    clips = sys.argv[1:] or [make_synthetic_clip(num_frames=600, num_figures=4)]
+    os.makedirs(settings.output_dir, exist_ok=True)
+    get_yolo_model()
+
+    for clip in clips:
+        name = os.path.basename(clip)
+        full, full_time = timed(analyze_video_path, clip, name, None, "full")
+        sampled, sampled_time = timed(analyze_video_path, clip, name, None, "adaptive")
+        if "error" in full:
+            print(f"{clip}: {full['error']}")
+            continue
+
+        stats = sampled["detection_sampling"]
+        print(f"\n=== {clip} ===")
+        print(f"full:     {full_time:.2f}s")
+        print(f"adaptive: {sampled_time:.2f}s ({full_time / sampled_time:.2f}x), "
+              f"YOLO on {stats['detected_frames']}/{stats['total_frames']} frames")
+        for key, value in compare(full, sampled).items():
+            if isinstance(value, tuple):
+                print(f"  {key:<32} full={value[0]:<10} adaptive={value[1]}")
+            else:
+                print(f"  {key:<32} {value:.1%}")
+
+if __name__ == "__main__":
+    main()
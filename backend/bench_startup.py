@@ -0,0 +1,97 @@
+"""
+Time to first response of each route group on a cold API process.
+
+Every route group runs in a fresh interpreter (this script with --child),
+which imports main, runs the startup event and sends the group's first
+request, so each number is what the first user of that group would wait
+after a deploy or a --reload. Reports the import, startup and first
+request times, the total from interpreter launch, and whether torch /
+ultralytics ended up in the API process (they should not).
+
+The analysis group posts a short synthetic clip to /analyze-video-vision
+twice: the first response includes starting a worker and loading the model
+(unless the startup warm-up already finished), the second one is warm.
+--no-warmup starts the API with yolo_warmup off to compare.
+
+Like the API, the startup event needs MongoDB (settings.mongodb_url).
+
+    python bench_startup.py [--no-warmup]
+"""
+import json
+import os
+import subprocess
+import sys
+import time
+
+ROUTE_GROUPS = {
+    "root": ("GET", "/", {}),
+    "auth": ("POST", "/api/auth/login", {"data": {"username": "bench@example.com", "password": "wrong"}}),
+    "leaderboard": ("GET", "/api/leaderboard", {}),
+    "sessions": ("GET", "/api/users/sessions", {}),  # 401 without a token, after the auth dependency
+    "analysis": ("POST", "/analyze-video-vision", {}),
+}
+
+def child(group, clip_path):
+    """Cold API process: import, startup, first request(s) of one route group"""
+    start = time.perf_counter()
+    import main
+    from fastapi.testclient import TestClient
+    imported = time.perf_counter()
+
+    method, url, kwargs = ROUTE_GROUPS[group]
+    report = {"group": group}
+    with TestClient(main.app) as client:
+        started = time.perf_counter()
+        for i in range(2 if group == "analysis" else 1):
+            sent = time.perf_counter()
+            if group == "analysis":
+                with open(clip_path, "rb") as f:
+                    response = client.post(url, files={"file": ("bench.mp4", f, "video/mp4")})
+            else:
+                response = client.request(method, url, **kwargs)
+            report[f"request_{i + 1}_sec"] = round(time.perf_counter() - sent, 3)
+            report[f"status_{i + 1}"] = response.status_code
+            if i == 0:
+                report["first_response_sec"] = round(time.perf_counter() - start, 3)
+
+    report["import_sec"] = round(imported - start, 3)
+    report["startup_sec"] = round(started - imported, 3)
+    report["torch_imported"] = "torch" in sys.modules or "ultralytics" in sys.modules
+    print(json.dumps(report))
+
+def run_group(group, warmup, clip_path):
+    env = {**os.environ, "YOLO_WARMUP": "true" if warmup else "false"}
+    launched = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, __file__, "--child", group, clip_path],
+        capture_output=True, text=True, env=env
+    )
+    total = time.perf_counter() - launched
+    lines = [line for line in proc.stdout.splitlines() if line.startswith("{")]
+    if proc.returncode != 0 or not lines:
+        print(f"{group:<12} failed:\n{proc.stderr[-2000:]}")
+        return None
+    report = json.loads(lines[-1])
+    report["total_sec"] = round(total, 3)
+    return report
+
+def main():
+    from bench_utils import make_synthetic_clip
+    warmup = "--no-warmup" not in sys.argv
+    clip_path = make_synthetic_clip(num_frames=90)
+    print(f"yolo_warmup={warmup}\n")
+    print(f"{'group':<12} {'import s':>9} {'startup s':>10} {'request s':>10} {'2nd req s':>10} "
+          f"{'status':>7} {'total s':>8}  torch in API")
+    for group in ROUTE_GROUPS:
+        r = run_group(group, warmup, clip_path)
+        if r is None:
+            continue
+        second = f"{r['request_2_sec']:>10.3f}" if "request_2_sec" in r else f"{'':>10}"
+        print(f"{group:<12} {r['import_sec']:>9.3f} {r['startup_sec']:>10.3f} {r['request_1_sec']:>10.3f} {second} "
+              f"{r['status_1']:>7} {r['total_sec']:>8.3f}  {r['torch_imported']}")
+
+if __name__ == "__main__":
+    if len(sys.argv) > 3 and sys.argv[1] == "--child":
+        child(sys.argv[2], sys.argv[3])
+    else:
+        main()
@@ -0,0 +1,87 @@
+"""
+Benchmark the cost of tracing tracker decisions.
+
+- Tracker throughput on synthetic detections with tracing off, at info
+  level, at debug level and at debug level sampled 1-in-10
+- analyze_video_path with trace off and on (detections come from the
+  detection cache after the first run, so tracking and annotation dominate)
+
+    python bench_tracing.py [video.mp4]
+"""
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+from bench_tracker import synthetic_detections
+from bench_utils import make_synthetic_clip, timed
+from tracing import NULL_TRACER, Tracer
+from tracker import PersonTracker
+
+NUM_FRAMES = 20000
+ROUNDS = 7
+
+def run_tracker(frames, tracer):
+    tracker = PersonTracker(tracer=tracer)
+    # CPU time of this process (including writing the trace), not wall time:
+    # other load on the machine made wall-clock runs swing by +-30%
+    start = time.process_time()
+    for frame_idx, boxes in enumerate(frames, start=1):
+        tracker.update(boxes, frame_idx)
+        if frame_idx > 5:
+            tracker.lock_player(frame_idx)
+    tracer.close()  # Flushes the buffered trace
+    elapsed = time.process_time() - start
+    return elapsed
+
+def bench_tracker():
+    frames = synthetic_detections(NUM_FRAMES)
+    trace_dir = tempfile.mkdtemp()
+    configs = [
+        ("off", lambda: NULL_TRACER),
+        ("info", lambda: Tracer(os.path.join(trace_dir, "info.jsonl"), "info")),
+        ("debug 1/10", lambda: Tracer(os.path.join(trace_dir, "sampled.jsonl"), "debug", 10)),
+        ("debug", lambda: Tracer(os.path.join(trace_dir, "debug.jsonl"), "debug")),
+    ]
+    print(f"Tracker, {NUM_FRAMES} frames, best of {ROUNDS} interleaved rounds")
+    print(f"  {'tracing':<11} {'frames/s':>9} {'ms/frame':>9} {'events':>8} {'trace KB':>9}")
+    baseline = None
+    run_tracker(frames, NULL_TRACER)  # Warm-up
+    # Configs take turns within each round, so a slow phase of the machine hits all of them
+    runs = {name: [] for name, _ in configs}
+    tracers = {}
+    for _ in range(ROUNDS):
+        for name, make_tracer in configs:
+            tracers[name] = make_tracer()
+            runs[name].append(run_tracker(frames, tracers[name]))
+    for name, _ in configs:
+        tracer = tracers[name]
+        elapsed = min(runs[name])
+        size_kb = os.path.getsize(tracer.path) / 1024 if tracer.path else 0
+        baseline = baseline or elapsed
+        print(f"  {name:<11} {NUM_FRAMES / elapsed:>9.0f} {elapsed * 1000 / NUM_FRAMES:>9.3f} "
+              f"{tracer.events_written:>8} {size_kb:>9.0f}  ({elapsed / baseline:.2f}x)")
+
+def bench_analysis(video_path):
+    from analysis import analyze_video_path, get_yolo_model
+    from config import settings
+
+    os.makedirs(settings.output_dir, exist_ok=True)
+    get_yolo_model()
+    name = os.path.basename(video_path)
+    with contextlib.redirect_stdout(io.StringIO()):
+        analyze_video_path(video_path, name)  # Fill the detection cache
+        _, off = timed(analyze_video_path, video_path, name)
+        result, on = timed(analyze_video_path, video_path, name, trace=True)
+    print(f"\nanalyze_video_path, {result['total_frames']} frames")
+    print(f"  trace off: {off:.2f}s")
+    print(f"  trace on:  {on:.2f}s ({on / off:.2f}x), {result['trace_file']}")
+
+def main():
+    bench_tracker()
+    bench_analysis(sys.argv[1] if len(sys.argv) > 1 else make_synthetic_clip(num_frames=600))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Benchmark the person tracker as the video gets longer.
+
+Feeds synthetic detections (people walking in and out of the frame, a few
+on screen at a time) to tracker.PersonTracker and to the old per-box scan
+over every track ever seen, and reports frames/sec and per-frame latency
+for increasing video lengths. The tracker should stay flat; the old scan
+slows down as tracks accumulate.
+
+    python bench_tracker.py
+"""
+import time
+
+import numpy as np
+
+from tracker import PersonTracker
+
+VIDEO_LENGTHS = [1000, 10000, 50000]
+WIDTH, HEIGHT = 1280, 720
+
+def synthetic_detections(num_frames, on_screen=5, lifetime=120, seed=0):
+    """Per-frame (n, 5) box arrays; every person stays for about lifetime frames"""
+    rng = np.random.default_rng(seed)
+    people = []  # [x, y, vx, vy, size, frames_left]
+    frames = []
+    for _ in range(num_frames):
+        while len(people) < on_screen:
+            people.append([
+                rng.uniform(100, WIDTH - 100), rng.uniform(200, HEIGHT - 100),
+                rng.uniform(-3, 3), rng.uniform(-1, 1),
+                rng.uniform(40, 120), rng.integers(lifetime // 2, lifetime * 2)
+            ])
+        boxes = []
+        for p in people:
+            p[0] += p[2]
+            p[1] += p[3]
+            p[5] -= 1
+            w, h = p[4] * 0.4, p[4]
+            boxes.append([p[0] - w / 2, p[1] - h / 2, p[0] + w / 2, p[1] + h / 2, 0.9])
+        people = [p for p in people if p[5] > 0]
+        frames.append(np.array(boxes, dtype=np.float32))
+    return frames
+
+def run_tracker(frames):
+    """Returns (tracks created, per-frame seconds)"""
+    tracker = PersonTracker()
+    latencies = []
+    for frame_idx, boxes in enumerate(frames, start=1):
+        start = time.perf_counter()
+        tracker.update(boxes, frame_idx)
+        if frame_idx > 5:
+            tracker.lock_player(frame_idx)
+        latencies.append(time.perf_counter() - start)
+    return tracker.total_tracks, latencies
+
+def run_legacy_scan(frames):
+    """The previous matching loop: every box against every track ever seen"""
+    person_tracker = {}
+    next_person_id = 1
+    latencies = []
+    for frame_idx, boxes in enumerate(frames, start=1):
+        start = time.perf_counter()
+        for box in boxes:
+            cx, cy = (box[0] + box[2]) / 2, (box[1] + box[3]) / 2
+            area = (box[2] - box[0]) * (box[3] - box[1])
+            best_score, best_id = 0, None
+            for pid, pdata in person_tracker.items():
+                if pdata['last_seen'] >= frame_idx - 15:
+                    last_pos = pdata['positions'][-1]
+                    dist = np.sqrt((cx - last_pos['x'])**2 + (cy - last_pos['y'])**2)
+                    if dist < 300:
+                        size_diff = abs(area - pdata['last_area']) / pdata['last_area']
+                        score = max(0, 100 - dist / 3) * 0.7 + max(0, 100 - size_diff * 100) * 0.3
+                        if score > best_score:
+                            best_score, best_id = score, pid
+            if best_id is None or best_score <= 30:
+                best_id = next_person_id
+                next_person_id += 1
+                person_tracker[best_id] = {'positions': [], 'last_seen': frame_idx}
+            person_tracker[best_id]['positions'].append({'x': cx, 'y': cy, 'frame': frame_idx})
+            person_tracker[best_id]['last_seen'] = frame_idx
+            person_tracker[best_id]['last_area'] = area
+        latencies.append(time.perf_counter() - start)
+    return len(person_tracker), latencies
+
+def main():
+    print(f"{'frames':>7} {'impl':<8} {'tracks':>7} {'frames/s':>9} {'ms/frame':>9} {'first 10%':>10} {'last 10%':>9}")
+    for num_frames in VIDEO_LENGTHS:
+        frames = synthetic_detections(num_frames)
+        tenth = num_frames // 10
+        for name, fn in (("tracker", run_tracker), ("legacy", run_legacy_scan)):
+            tracks, latencies = fn(frames)
+            total = sum(latencies)
+            first_ms = sum(latencies[:tenth]) * 1000 / tenth
+            last_ms = sum(latencies[-tenth:]) * 1000 / tenth
+            print(f"{num_frames:>7} {name:<8} {tracks:>7} {num_frames / total:>9.0f} "
+                  f"{total * 1000 / num_frames:>9.3f} {first_ms:>10.3f} {last_ms:>9.3f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""
+Shared helpers for the bench_*.py scripts.
+"""
+import os
+import time
+import cv2
+import numpy as np
+
+BENCH_DIR = "bench_data"
+
+def make_synthetic_clip(path=None, num_frames=300, width=640, height=360, fps=30.0, num_figures=3, seed=0):
+    """
+    Write a synthetic gameplay-like clip: a noisy background with a few
+    person-shaped figures walking around. Returns the file path.
+    """
+    if path is None:
+        os.makedirs(BENCH_DIR, exist_ok=True)
+        path = os.path.join(BENCH_DIR, f"synthetic_{num_frames}f_{width}x{height}.mp4")
+    if os.path.exists(path):
+        return path
+
+    rng = np.random.default_rng(seed)
+    background = rng.integers(40, 90, size=(height, width, 3), dtype=np.uint8)
+    positions = rng.uniform([0, height * 0.3], [width, height * 0.7], size=(num_figures, 2))
+    velocities = rng.uniform(-4, 4, size=(num_figures, 2))
+
+    fourcc = cv2.VideoWriter_fourcc(*"mp4v")
+    out = cv2.VideoWriter(path, fourcc, fps, (width, height))
+    for _ in range(num_frames):
+        frame = background.copy()
+        positions += velocities
+        velocities[positions[:, 0] < 0, 0] *= -1
+        velocities[positions[:, 0] > width, 0] *= -1
+        for x, y in positions.astype(int):
+            # Head + body + legs, roughly person proportions
+            cv2.circle(frame, (x, y - 40), 10, (60, 120, 200), -1)
+            cv2.rectangle(frame, (x - 12, y - 30), (x + 12, y + 15), (30, 30, 160), -1)
+            cv2.line(frame, (x - 6, y + 15), (x - 10, y + 45), (30, 30, 30), 5)
+            cv2.line(frame, (x + 6, y + 15), (x + 10, y + 45), (30, 30, 30), 5)
+        out.write(frame)
+    out.release()
+    return path
+
+def timed(fn, *args, **kwargs):
+    """Call fn and return (result, elapsed seconds)"""
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
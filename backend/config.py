@@ -5,11 +5,17 @@ class Settings(BaseSettings):
     # MongoDB
     mongodb_url: str = "mongodb://localhost:27017"
     database_name: str = "lagskill_arena"
+    mongo_index_check: str = "fail"  # explain() the hot queries at startup: "fail" on a COLLSCAN, "warn" or "off" (see indexes.py)
     
     # JWT
     secret_key: str = "your-secret-key-change-in-production"
     algorithm: str = "HS256"
     access_token_expire_minutes: int = 30
+    user_cache_ttl_sec: float = 30.0  # Authenticated users cached in-process (0 = look up every request), see user_cache.py
+    user_cache_size: int = 10000  # Least recently used users are dropped above this
+    bcrypt_rounds: int = 12  # Cost of new password hashes, lower ones are rehashed at login
+    password_hash_workers: int = 2  # Concurrent bcrypt calls (threads, off the event loop)
+    password_hash_queue: int = 64  # More waiting bcrypt calls are rejected with 503
     
     # Admin
     admin_email: str = "admin@lagskill.com"
@@ -17,6 +23,48 @@ class Settings(BaseSettings):
     
     # Application
     environment: str = "development"
+    upload_dir: str = "uploads"
+    output_dir: str = "outputs"
+    yolo_model_path: str = "yolov8n.pt"
+    detector_backend: str = "torch"  # "torch" = ultralytics / PyTorch, "onnx" = ONNX Runtime (see detectors.py)
+    onnx_model_path: str = "yolov8n.onnx"  # Exported with python detectors.py
+    onnx_imgsz: int = 640  # Letterbox size of the ONNX backend
+    onnx_threads: int = 0  # ONNX Runtime intra-op threads (0 = one per core)
+    inference_profile: str = "default"  # Predict settings, see detection.INFERENCE_PROFILES
+    detection_roi: str = ""  # "x1,y1,x2,y2" frame fractions to detect in (leave out the HUD), empty = whole frame
+    inference_profile_report: str = "inference_profiles.json"  # Measured by bench_inference_profiles.py
+    max_upload_mb: int = 500  # Larger video uploads are rejected with 413
+    upload_retention_mb: int = 4096  # Uploads kept as sources of on-demand annotated renders, oldest deleted above this
+    batch_max_videos: int = 50  # Videos per batch upload (files + zip members)
+    batch_max_mb: int = 4096  # Larger batch uploads are rejected with 413
+    
+    # Analysis jobs
+    analysis_workers: int = 2  # Worker processes, each holds its own YOLO model
+    yolo_warmup: bool = True  # Start the workers with the API and warm their model on a blank frame
+    job_retention_minutes: int = 60  # How long finished jobs stay queryable
+    progress_interval_sec: float = 0.5  # Minimum time between two progress events of a job
+    progress_chunk_points: int = 20  # Timeline points per progress event (downsampled)
+    progress_heartbeat_sec: float = 15.0  # Keep-alive comment on idle event streams
+    detection_batch_size: int = 8  # Frames per YOLO predict call
+    detection_sampling: str = "full"  # "full" = every frame, "adaptive" = see sampling.py
+    sampling_stride: int = 3  # Detect every k-th frame in adaptive mode
+    sampling_motion_threshold: float = 10.0  # Mean absdiff that switches to every frame
+    sampling_dense_window: int = 15  # Frames to stay dense after a trigger
+    detection_cache_dir: str = "detection_cache"
+    detection_cache_max_mb: int = 512  # Least recently used entries are evicted above this
+    pipeline_threaded: bool = True  # Decode / motion / detect / encode on separate threads
+    pipeline_queue_size: int = 16  # Frames buffered between two pipeline stages
+    track_trajectory_stride: int = 0  # Report every n-th position of each track (0 = off)
+    highlight_strategy: str = "excitement"  # Highlight detector, see highlights.py
+    timeline_dir: str = "timelines"  # Full-resolution analysis timelines (.npz)
+    timeline_points: int = 500  # Timeline points returned with an analysis (downsampled over the whole video)
+    tracks_dir: str = "tracks"  # Recorded annotations, annotated videos are rendered from these on demand
+    
+    # Logging / tracing
+    log_level: str = "INFO"
+    trace_dir: str = "traces"  # Per-job JSONL traces of tracker decisions
+    trace_level: str = "debug"  # "debug" = every frame, "info" = new / expired tracks and player lock
+    trace_sample_every: int = 1  # Keep every n-th debug event of each kind
     
     class Config:
         env_file = ".env"
@@ -0,0 +1,129 @@
+"""
+Person detection helpers.
+
+Frames are grouped into batches so each YOLO predict call amortizes the
+Python / ultralytics preprocessing overhead over several frames.
+"""
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+
+from config import settings
+
+PERSON_CLASS = 0  # COCO class 0 = person
+
+# Predict settings shared by every pipeline, so cached detections can be reused
+DETECTION_PARAMS = {
+    "conf": 0.3,  # Lower confidence threshold for better detection
+    "iou": 0.5,   # Intersection over union threshold
+    "max_det": 10  # Maximum detections per frame
+}
+
+# Inference profiles: predict settings on top of DETECTION_PARAMS
+# (settings.inference_profile, or profile= on /api/analyze-video).
+# "default" is the original behavior: all 80 COCO classes are scored at
+# 640 px and persons are kept afterwards, so other classes can take max_det
+# slots. classes=[0] limits NMS and max_det to persons; a smaller imgsz is
+# faster but misses small / distant players. bench_inference_profiles.py
+# measures the fps / accuracy of each profile.
+INFERENCE_PROFILES = {
+    "default": {},
+    "person": {"classes": [PERSON_CLASS]},
+    "person_416": {"classes": [PERSON_CLASS], "imgsz": 416},
+    "person_320": {"classes": [PERSON_CLASS], "imgsz": 320},
+}
+
+def parse_roi(roi: str) -> Optional[Tuple[float, float, float, float]]:
+    """
+    Parse a region of interest "x1,y1,x2,y2" given as fractions of the frame
+    (e.g. "0,0.08,1,0.85" leaves out a HUD at the top and bottom). Empty = whole frame.
+    """
+    if not roi:
+        return None
+    try:
+        x1, y1, x2, y2 = (float(v) for v in roi.split(","))
+    except ValueError:
+        raise ValueError(f"Invalid region of interest '{roi}', expected x1,y1,x2,y2 fractions")
+    if not (0 <= x1 < x2 <= 1 and 0 <= y1 < y2 <= 1):
+        raise ValueError(f"Invalid region of interest '{roi}', expected 0 <= x1 < x2 <= 1 and 0 <= y1 < y2 <= 1")
+    return (x1, y1, x2, y2)
+
+def detection_params(profile: Optional[str] = None) -> dict:
+    """Predict settings of an inference profile (defaults to the configured one) and the configured ROI"""
+    profile = profile or settings.inference_profile
+    if profile not in INFERENCE_PROFILES:
+        raise ValueError(f"Unknown inference profile '{profile}', expected one of {tuple(INFERENCE_PROFILES)}")
+    params = {**DETECTION_PARAMS, **INFERENCE_PROFILES[profile]}
+    roi = parse_roi(settings.detection_roi)
+    if roi is not None:
+        params["roi"] = roi
+    return params
+
+def detect_persons_batch(model, frames, conf=0.3, iou=0.5, max_det=10, classes=None, imgsz=None, roi=None):
+    """
+    Run one predict call on a list of frames with a detector (see detectors.py).
+    Returns one (n, 5) float array per frame: x1, y1, x2, y2, confidence (persons only).
+    With roi (fractions, see parse_roi) only that part of the frames is searched;
+    boxes are still in full-frame pixels.
+    """
+    if roi is None:
+        return model.detect(frames, conf=conf, iou=iou, max_det=max_det, classes=classes, imgsz=imgsz)
+
+    height, width = frames[0].shape[:2]
+    x1, x2 = int(roi[0] * width), int(roi[2] * width)
+    y1, y2 = int(roi[1] * height), int(roi[3] * height)
+    detections = model.detect(
+        [frame[y1:y2, x1:x2] for frame in frames],
+        conf=conf, iou=iou, max_det=max_det, classes=classes, imgsz=imgsz
+    )
+    for boxes in detections:
+        boxes[:, [0, 2]] += x1
+        boxes[:, [1, 3]] += y1
+    return detections
+
+def read_frames(cap):
+    """Yield the decoded frames of an open cv2.VideoCapture"""
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            return
+        yield frame
+
+def iter_batched_detections(frames, model, batch_size=8, **predict_kwargs):
+    """
+    Detect persons in an iterable of frames, batch_size frames per predict call.
+    Yields (frame, person_boxes) in frame order.
+    """
+    batch_size = max(1, int(batch_size))
+    frames = iter(frames)
+
+    while True:
+        batch = []
+        for frame in frames:
+            batch.append(frame)
+            if len(batch) == batch_size:
+                break
+
+        if not batch:
+            return
+
+        for frame, boxes in zip(batch, detect_persons_batch(model, batch, **predict_kwargs)):
+            yield frame, boxes
+
+        if len(batch) < batch_size:
+            return
+
+def iter_motion(frames):
+    """
+    Add the motion intensity (mean absdiff of consecutive grayscale frames)
+    to each frame. Yields (frame, motion); motion is None for the first frame.
+    """
+    prev_gray = None
+    for frame in frames:
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        motion = None
+        if prev_gray is not None:
+            motion = float(np.mean(cv2.absdiff(gray, prev_gray)))
+        prev_gray = gray
+        yield frame, motion
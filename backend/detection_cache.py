@@ -0,0 +1,204 @@
+"""
+On-disk cache of per-frame detection results.
+
+Entries are keyed by a content hash of the uploaded video plus the model,
+predict settings and sampling mode, so /api/analyze-video and
+/generate-highlights on the same file only run YOLO once.
+
+Each entry is one compressed .npz file in a columnar (CSR) layout:
+    frame_offsets  (n + 1,)  boxes of frame i are rows offsets[i]:offsets[i + 1]
+    boxes          (m, 4)    x1, y1, x2, y2
+    classes        (m,)      COCO class ids
+    confidences    (m,)
+    motion         (n,)      mean absdiff to the previous frame (0 for frame 0)
+    fps, width, height
+
+The directory is kept under settings.detection_cache_max_mb by evicting
+the least recently used entries (file mtime is bumped on every read).
+"""
+import glob
+import hashlib
+import os
+import uuid
+from collections import deque
+from typing import Optional
+
+import numpy as np
+
+from config import settings
+from detection import PERSON_CLASS, detection_params
+from detectors import detector_tag
+
+def file_sha256(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """Content hash of a file"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def cache_key(content_hash: str, sampling_tag: str, profile: Optional[str] = None) -> str:
+    """Cache key for a video + model / detector backend + predict settings (inference profile) + sampling mode"""
+    params = ",".join(f"{k}={v}" for k, v in sorted(detection_params(profile).items()))
+    settings_hash = hashlib.sha256(
+        f"{detector_tag()}|{params}|{sampling_tag}".encode()
+    ).hexdigest()[:16]
+    return f"{content_hash}_{settings_hash}"
+
+class CachedDetections:
+    def __init__(self, frame_offsets, boxes, classes, confidences, motion, fps, width, height):
+        self.frame_offsets = frame_offsets
+        self.boxes = boxes
+        self.classes = classes
+        self.confidences = confidences
+        self.motion = motion
+        self.fps = float(fps)
+        self.width = int(width)
+        self.height = int(height)
+
+    @property
+    def num_frames(self) -> int:
+        return len(self.motion)
+
+    def person_boxes(self, frame_idx: int):
+        """(n, 5) person boxes of a frame, same format as detection.detect_persons_batch"""
+        start, end = self.frame_offsets[frame_idx], self.frame_offsets[frame_idx + 1]
+        keep = self.classes[start:end] == PERSON_CLASS
+        return np.column_stack([self.boxes[start:end][keep], self.confidences[start:end][keep]]).astype(np.float32)
+
+class DetectionRecorder:
+    """Collects per-frame detections while a video is analyzed"""
+    def __init__(self):
+        self.counts = []
+        self.frame_boxes = []
+        self.motion = []
+
+    def add(self, person_boxes, motion):
+        self.counts.append(len(person_boxes))
+        self.frame_boxes.append(person_boxes)
+        self.motion.append(motion or 0.0)
+
+    def build(self, fps, width, height) -> CachedDetections:
+        boxes = np.concatenate(self.frame_boxes) if self.frame_boxes else np.zeros((0, 5), dtype=np.float32)
+        return CachedDetections(
+            frame_offsets=np.concatenate([[0], np.cumsum(self.counts)]).astype(np.int64),
+            boxes=boxes[:, :4].astype(np.float32),
+            classes=np.full(len(boxes), PERSON_CLASS, dtype=np.uint8),
+            confidences=boxes[:, 4].astype(np.float16),
+            motion=np.array(self.motion, dtype=np.float32),
+            fps=fps,
+            width=width,
+            height=height,
+        )
+
+class DetectionCache:
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.npz")
+
+    def load(self, key: str) -> Optional[CachedDetections]:
+        """Load an entry, or None if it is not cached"""
+        path = self._path(key)
+        try:
+            with np.load(path) as data:
+                entry = CachedDetections(**{name: data[name] for name in data.files})
+            os.utime(path)  # Mark as recently used
+            return entry
+        except (OSError, KeyError, ValueError):
+            return None
+
+    def load_any(self, content_hash: str) -> Optional[CachedDetections]:
+        """Load any entry for a video (e.g. when only the motion scores are needed)"""
+        for path in glob.glob(os.path.join(self.directory, f"{content_hash}_*.npz")):
+            entry = self.load(os.path.basename(path)[:-len(".npz")])
+            if entry is not None:
+                return entry
+        return None
+
+    def store(self, key: str, entry: CachedDetections):
+        """Write an entry atomically, then evict old entries if over the size limit"""
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = os.path.join(self.directory, f".{uuid.uuid4().hex}.tmp.npz")
+        np.savez_compressed(
+            tmp_path,
+            frame_offsets=entry.frame_offsets,
+            boxes=entry.boxes,
+            classes=entry.classes,
+            confidences=entry.confidences,
+            motion=entry.motion,
+            fps=entry.fps,
+            width=entry.width,
+            height=entry.height,
+        )
+        os.replace(tmp_path, self._path(key))
+        self.evict()
+
+    def evict(self):
+        """Delete least recently used entries until the cache fits in max_bytes"""
+        entries = []
+        for path in glob.glob(os.path.join(self.directory, "*.npz")):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+detection_cache = DetectionCache(settings.detection_cache_dir, settings.detection_cache_max_mb * 1024 * 1024)
+
+def iter_frame_detections(frames, fps, width, height, content_hash, sampler, model_loader, batch_size, profile=None):
+    """
+    Yield (frame, person_boxes, motion) for every frame of a video.
+
+    Detections come from the cache when this video was already analyzed with
+    the same settings (a full-mode entry also serves adaptive requests), so
+    YOLO is skipped entirely; otherwise they are computed with the sampler and
+    stored once the whole video has been read. Sets sampler.cache_hit.
+
+    frames is an iterable of (frame, motion) pairs (iter_motion, e.g. the
+    decode and motion stages of a pipeline.FramePipeline); fps, width and
+    height are the video's, for the cache entry. The capture is not taken
+    here: with a pipeline it is read on the decode thread only, as
+    cv2.VideoCapture is not thread-safe.
+    profile is the inference profile (see detection.INFERENCE_PROFILES, defaults to the configured one).
+    """
+    key = cache_key(content_hash, sampler.cache_tag(), profile)
+    cached = detection_cache.load(key) or detection_cache.load(cache_key(content_hash, "full", profile))
+    sampler.cache_hit = cached is not None
+
+    if cached is not None:
+        for frame_idx, (frame, _motion) in enumerate(frames):
+            if frame_idx >= cached.num_frames:
+                break
+            motion = float(cached.motion[frame_idx]) if frame_idx > 0 else None
+            sampler.total_frames += 1
+            yield frame, cached.person_boxes(frame_idx), motion
+        return
+
+    # The sampler only sees frames; motion values are matched back up in order
+    motions = deque()
+    def sampler_frames():
+        for frame, motion in frames:
+            motions.append(motion)
+            yield frame
+
+    recorder = DetectionRecorder()
+    detections = sampler.iter_detections(sampler_frames(), model_loader(), batch_size, **detection_params(profile))
+    for frame, boxes in detections:
+        motion = motions.popleft()
+        recorder.add(boxes, motion)
+        yield frame, boxes, motion
+
+    detection_cache.store(key, recorder.build(fps, width, height))
@@ -0,0 +1,201 @@
+"""
+Person detector backends.
+
+Every backend has detect(frames, conf, iou, max_det, classes, imgsz)
+returning one (n, 5) float32 array per frame: x1, y1, x2, y2, confidence,
+persons only. The backend is picked by settings.detector_backend:
+
+- "torch": ultralytics YOLO with PyTorch eager inference (the original
+  behavior)
+- "onnx": the same weights exported to ONNX (export_onnx) and run with ONNX
+  Runtime on the CPU, without torch or ultralytics. Preprocessing is the
+  ultralytics letterbox (scale to imgsz, pad to a multiple of 32) and the
+  raw (batch, 4 + 80, anchors) output is decoded in numpy: boxes whose best
+  class is person (the same rule as ultralytics' NMS), confidence filter,
+  greedy NMS, max_det.
+
+Detections of the two backends are compared on sample frames by
+bench_onnx_parity.py.
+"""
+import os
+from typing import List
+
+import cv2
+import numpy as np
+
+from config import settings
+from detection import PERSON_CLASS
+
+DETECTOR_BACKENDS = ("torch", "onnx")
+
+LETTERBOX_STRIDE = 32
+LETTERBOX_COLOR = (114, 114, 114)
+MAX_NMS_CANDIDATES = 30000  # Same cap as ultralytics' NMS
+
+def create_detector(backend=None):
+    """Build the detector for a backend (defaults to the configured backend)"""
+    backend = backend or settings.detector_backend
+    if backend not in DETECTOR_BACKENDS:
+        raise ValueError(f"Unknown detector backend '{backend}', expected one of {DETECTOR_BACKENDS}")
+    if backend == "torch":
+        return TorchDetector(settings.yolo_model_path)
+    return OnnxDetector(settings.onnx_model_path, settings.onnx_imgsz, settings.onnx_threads)
+
+def detector_tag(backend=None) -> str:
+    """Identifies the configured model and backend in detection cache keys"""
+    backend = backend or settings.detector_backend
+    if backend == "torch":
+        return settings.yolo_model_path  # Unchanged, so existing cache entries stay valid
+    return f"{settings.onnx_model_path}|onnx|{settings.onnx_imgsz}"
+
+def _patch_torch_load():
+    """Patch torch.load to use weights_only=False (needed to load yolov8n.pt)"""
+    import torch
+    _original_torch_load = torch.load
+    def patched_torch_load(*args, **kwargs):
+        kwargs['weights_only'] = False
+        return _original_torch_load(*args, **kwargs)
+    torch.load = patched_torch_load
+
+class TorchDetector:
+    backend = "torch"
+
+    def __init__(self, model_path: str):
+        from ultralytics import YOLO
+        _patch_torch_load()
+        self.model_path = model_path
+        self.model = YOLO(model_path)
+
+    def detect(self, frames, conf=0.3, iou=0.5, max_det=10, classes=None, imgsz=None) -> List[np.ndarray]:
+        predict_kwargs = {"classes": classes} if classes is not None else {}
+        if imgsz is not None:
+            predict_kwargs["imgsz"] = imgsz
+        results = self.model(frames, verbose=False, conf=conf, iou=iou, max_det=max_det, **predict_kwargs)
+
+        detections = []
+        for r in results:
+            if r.boxes is None or len(r.boxes) == 0:
+                detections.append(np.zeros((0, 5), dtype=np.float32))
+                continue
+            xyxy = r.boxes.xyxy.cpu().numpy()
+            classes = r.boxes.cls.cpu().numpy().astype(int)
+            confs = r.boxes.conf.cpu().numpy()
+            keep = classes == PERSON_CLASS
+            detections.append(np.column_stack([xyxy[keep], confs[keep]]).astype(np.float32))
+        return detections
+
+def letterbox_shape(height: int, width: int, imgsz: int):
+    """(scale, resized (w, h), padded (w, h)) of the ultralytics letterbox for a frame size"""
+    scale = min(imgsz / height, imgsz / width)
+    resized_w, resized_h = int(round(width * scale)), int(round(height * scale))
+    padded_w = resized_w + (imgsz - resized_w) % LETTERBOX_STRIDE
+    padded_h = resized_h + (imgsz - resized_h) % LETTERBOX_STRIDE
+    return scale, (resized_w, resized_h), (padded_w, padded_h)
+
+def letterbox(frame: np.ndarray, imgsz: int) -> np.ndarray:
+    """Resize keeping the aspect ratio, pad (gray, centered) to a multiple of the stride"""
+    height, width = frame.shape[:2]
+    _, (resized_w, resized_h), (padded_w, padded_h) = letterbox_shape(height, width, imgsz)
+    if (resized_w, resized_h) != (width, height):
+        frame = cv2.resize(frame, (resized_w, resized_h), interpolation=cv2.INTER_LINEAR)
+    dw, dh = (padded_w - resized_w) / 2, (padded_h - resized_h) / 2
+    top, bottom = int(round(dh - 0.1)), int(round(dh + 0.1))
+    left, right = int(round(dw - 0.1)), int(round(dw + 0.1))
+    return cv2.copyMakeBorder(frame, top, bottom, left, right, cv2.BORDER_CONSTANT, value=LETTERBOX_COLOR)
+
+def preprocess(frames, imgsz: int) -> np.ndarray:
+    """BGR frames (all the same size) -> (batch, 3, h, w) float32 RGB in [0, 1]"""
+    batch = np.stack([letterbox(frame, imgsz) for frame in frames])
+    return np.ascontiguousarray(batch[..., ::-1].transpose(0, 3, 1, 2), dtype=np.float32) / 255.0
+
+def nms(boxes: np.ndarray, scores: np.ndarray, iou: float, max_det: int) -> np.ndarray:
+    """Greedy non-maximum suppression; indexes of the kept boxes, best first"""
+    order = np.argsort(-scores, kind="stable")[:MAX_NMS_CANDIDATES]
+    x1, y1, x2, y2 = boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]
+    areas = (x2 - x1) * (y2 - y1)
+    keep = []
+    while order.size > 0 and len(keep) < max_det:
+        best, rest = order[0], order[1:]
+        keep.append(best)
+        w = np.clip(np.minimum(x2[best], x2[rest]) - np.maximum(x1[best], x1[rest]), 0, None)
+        h = np.clip(np.minimum(y2[best], y2[rest]) - np.maximum(y1[best], y1[rest]), 0, None)
+        inter = w * h
+        overlap = inter / (areas[best] + areas[rest] - inter + 1e-7)
+        order = rest[overlap <= iou]
+    return np.array(keep, dtype=np.int64)
+
+def decode_persons(output: np.ndarray, frame_shape, imgsz: int, conf=0.3, iou=0.5, max_det=10) -> np.ndarray:
+    """
+    Person boxes of one image from a raw YOLOv8 output (4 + classes, anchors):
+    center x, center y, width, height in letterboxed pixels, then class scores.
+    Returns (n, 5) x1, y1, x2, y2, confidence in frame pixels.
+    """
+    scores = output[4:]
+    person = scores[PERSON_CLASS]
+    candidates = (person > conf) & (scores.argmax(axis=0) == PERSON_CLASS)
+    if not candidates.any():
+        return np.zeros((0, 5), dtype=np.float32)
+
+    cx, cy, w, h = output[:4, candidates]
+    boxes = np.stack([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], axis=1)
+    confidences = person[candidates]
+    keep = nms(boxes, confidences, iou, max_det)
+    boxes, confidences = boxes[keep], confidences[keep]
+
+    # Undo the letterbox (gain and padding computed like ultralytics' scale_boxes)
+    height, width = frame_shape[:2]
+    _, _, (padded_w, padded_h) = letterbox_shape(height, width, imgsz)
+    gain = min(padded_h / height, padded_w / width)
+    pad_x = round((padded_w - width * gain) / 2 - 0.1)
+    pad_y = round((padded_h - height * gain) / 2 - 0.1)
+    boxes[:, [0, 2]] = np.clip((boxes[:, [0, 2]] - pad_x) / gain, 0, width)
+    boxes[:, [1, 3]] = np.clip((boxes[:, [1, 3]] - pad_y) / gain, 0, height)
+    return np.column_stack([boxes, confidences]).astype(np.float32)
+
+class OnnxDetector:
+    backend = "onnx"
+
+    def __init__(self, model_path: str, imgsz: int = 640, threads: int = 0):
+        try:
+            import onnxruntime
+        except ImportError as e:
+            raise RuntimeError("detector_backend 'onnx' needs the onnxruntime package") from e
+        if not os.path.exists(model_path):
+            raise RuntimeError(f"ONNX model {model_path} not found, export it with detectors.export_onnx()")
+
+        options = onnxruntime.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        self.model_path = model_path
+        self.imgsz = imgsz
+        self.session = onnxruntime.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def detect(self, frames, conf=0.3, iou=0.5, max_det=10, classes=None, imgsz=None) -> List[np.ndarray]:
+        """classes is accepted for the common interface; only persons are ever decoded"""
+        if len(frames) == 0:
+            return []
+        imgsz = imgsz or self.imgsz
+        outputs = self.session.run(None, {self.input_name: preprocess(frames, imgsz)})[0]
+        return [
+            decode_persons(output, frame.shape, imgsz, conf, iou, max_det)
+            for output, frame in zip(outputs, frames)
+        ]
+
+def export_onnx(model_path=None, onnx_path=None, imgsz=None) -> str:
+    """
+    Export the YOLO weights to ONNX (needs ultralytics + torch, run once where
+    they are installed). Dynamic axes, so any batch size and letterbox shape
+    can be fed. Returns the path of the .onnx file.
+    """
+    from ultralytics import YOLO
+    _patch_torch_load()
+    model_path = model_path or settings.yolo_model_path
+    onnx_path = onnx_path or settings.onnx_model_path
+    exported = YOLO(model_path).export(format="onnx", imgsz=imgsz or settings.onnx_imgsz, dynamic=True)
+    if os.path.abspath(exported) != os.path.abspath(onnx_path):
+        os.replace(exported, onnx_path)
+    return onnx_path
+
+if __name__ == "__main__":
+    print(f"Exported {export_onnx()}")
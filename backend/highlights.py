@@ -0,0 +1,479 @@
+"""
+Highlight moments and reels.
+
+Highlight detectors are strategies registered in HIGHLIGHT_STRATEGIES by
+name. Each one takes a HighlightTimeline (the analysis timeline and its
+events as numpy arrays) and returns up to 5 moments in time order, each
+with at least frame, time_sec, score and types, and optionally the
+start_frame / end_frame of its clip:
+
+- "excitement": scores every frame (person count, motion, encounters and
+  eliminations nearby) and keeps the best frames at least 5 seconds apart
+- "event_windows": clips around kill streaks, fast reactions, high
+  intensity windows and clutches, merged where they overlap
+
+Both are vectorized: event bonuses come from frame-indexed event arrays,
+not a scan over all events per frame.
+
+Each highlight moment becomes a clip (its start_frame / end_frame, or 4
+seconds centered on its frame). Clip windows are sorted by start frame and cut from the source video in one
+forward pass: the decoder never goes back, frames shared by overlapping
+clips are decoded once, short gaps between clips are skipped with grab()
+(decode without color conversion) and only gaps longer than SEEK_GAP_SEC
+are jumped with a seek. Seeking to every clip with CAP_PROP_POS_FRAMES
+instead restarts decoding from the previous keyframe each time.
+
+The black overlay band and the transition frame are built once per reel;
+only the top band of each frame is blended.
+"""
+import bisect
+import os
+from typing import Optional
+
+import cv2
+import numpy as np
+
+from config import settings
+from timeline import Timeline
+
+CLIP_DURATION_SEC = 4  # Footage per highlight
+TRANSITION_SEC = 0.5  # "NEXT HIGHLIGHT" card between clips
+OVERLAY_HEIGHT = 80  # Darkened band at the top of every clip frame
+SEEK_GAP_SEC = 10  # Longer gaps are seeked over (longer than typical keyframe intervals)
+MAX_MOMENTS = 5
+
+HIGHLIGHT_STRATEGIES = {}
+
+def highlight_strategy(name: str):
+    """Register a highlight detector under name"""
+    def register(fn):
+        HIGHLIGHT_STRATEGIES[name] = fn
+        return fn
+    return register
+
+def get_highlight_strategy(name: Optional[str] = None):
+    """The detector registered as name (defaults to the configured strategy)"""
+    name = name or settings.highlight_strategy
+    if name not in HIGHLIGHT_STRATEGIES:
+        raise ValueError(f"Unknown highlight strategy '{name}', expected one of {tuple(HIGHLIGHT_STRATEGIES)}")
+    return HIGHLIGHT_STRATEGIES[name]
+
+class HighlightTimeline:
+    """Per-frame analysis timeline and its events as numpy arrays (events in frame order)"""
+
+    def __init__(self, frames, times, persons, motion, encounter_frames, encounter_new_persons,
+                 elimination_frames, elimination_encounter_frames, elimination_ms, fps, total_frames):
+        self.frames = frames
+        self.times = times
+        self.persons = persons
+        self.motion = motion
+        self.encounter_frames = encounter_frames
+        self.encounter_new_persons = encounter_new_persons
+        self.elimination_frames = elimination_frames
+        self.elimination_encounter_frames = elimination_encounter_frames
+        self.elimination_ms = elimination_ms
+        self.fps = fps
+        self.total_frames = total_frames
+
+    @classmethod
+    def from_analysis(cls, timeline_data, enemy_encounters, reaction_times, fps, total_frames):
+        """
+        Build from the enemy_encounters / reaction_times lists of an analysis and
+        its timeline, a timeline.Timeline or a list of timeline point dicts.
+        """
+        if isinstance(timeline_data, Timeline):
+            frames, times = timeline_data.frame, timeline_data.time
+            persons, motion = timeline_data.persons.astype(np.int64), timeline_data.motion
+        else:
+            n = len(timeline_data)
+            frames = np.fromiter((f['frame'] for f in timeline_data), dtype=np.int64, count=n)
+            times = np.fromiter((f['time'] for f in timeline_data), dtype=np.float64, count=n)
+            persons = np.fromiter((f['persons'] for f in timeline_data), dtype=np.int64, count=n)
+            motion = np.fromiter((f['motion'] for f in timeline_data), dtype=np.float64, count=n)
+        return cls(
+            frames=frames,
+            times=times,
+            persons=persons,
+            motion=motion,
+            encounter_frames=np.array([e['frame'] for e in enemy_encounters], dtype=np.int64),
+            encounter_new_persons=np.array([e['new_persons'] for e in enemy_encounters], dtype=np.int64),
+            elimination_frames=np.array([rt['elimination_frame'] for rt in reaction_times], dtype=np.int64),
+            elimination_encounter_frames=np.array([rt['encounter_frame'] for rt in reaction_times], dtype=np.int64),
+            elimination_ms=np.array([rt['reaction_time_ms'] for rt in reaction_times], dtype=np.float64),
+            fps=fps,
+            total_frames=total_frames,
+        )
+
+    def __len__(self):
+        return len(self.frames)
+
+def _window_counts(event_frames, frames, limit):
+    """
+    Number of events with |frame - event| < limit for every frame: events are
+    scattered into a frame-indexed array and convolved with a box window.
+    """
+    counts = np.zeros(len(frames))
+    radius = int(np.ceil(limit)) - 1  # Integer frame distances below limit
+    if radius < 0 or len(event_frames) == 0 or len(frames) == 0:
+        return counts
+    first, last = int(frames.min()), int(frames.max())
+    lo = first - radius
+    events = event_frames[(event_frames >= lo) & (event_frames <= last + radius)]
+    indicator = np.bincount(events - lo, minlength=last - first + 2 * radius + 1)
+    # Entry k sums the events at frames first + k - radius .. first + k + radius
+    window_counts = np.convolve(indicator, np.ones(2 * radius + 1), mode="valid")
+    return window_counts[frames - first]
+
+def _first_in_window(event_frames, frames, limit):
+    """
+    Index (into the frame-sorted events) of the earliest event with
+    |frame - event| < limit for every frame, -1 where there is none.
+    """
+    radius = int(np.ceil(limit)) - 1
+    if radius < 0 or len(event_frames) == 0:
+        return np.full(len(frames), -1)
+    first = np.searchsorted(event_frames, frames - radius, side="left")
+    hit = first < len(event_frames)
+    hit[hit] = event_frames[first[hit]] <= frames[hit] + radius
+    return np.where(hit, first, -1)
+
+def suppress_nearby(times, scores, spacing):
+    """
+    Greedy non-maximum suppression on a timeline: visit frames by score
+    (ties in timeline order) and keep each one that is not within spacing of
+    an already kept frame. Returns the kept indices.
+    """
+    kept_times = []  # Sorted, for the nearest-neighbour check
+    kept = []
+    for idx in np.argsort(-scores, kind="stable").tolist():
+        t = times[idx]
+        pos = bisect.bisect_left(kept_times, t)
+        if pos < len(kept_times) and kept_times[pos] - t < spacing:
+            continue
+        if pos > 0 and t - kept_times[pos - 1] < spacing:
+            continue
+        kept_times.insert(pos, t)
+        kept.append(idx)
+    return kept
+
+def detect_highlight_moments(timeline_data, enemy_encounters, reaction_times, fps, total_frames, strategy=None):
+    """Detect exciting moments in gameplay with a registered strategy (defaults to the configured one)"""
+    timeline = HighlightTimeline.from_analysis(timeline_data, enemy_encounters, reaction_times, fps, total_frames)
+    return get_highlight_strategy(strategy)(timeline)
+
+@highlight_strategy("excitement")
+def excitement_moments(timeline):
+    """
+    Detect exciting moments in gameplay based on multiple factors:
+    - High enemy activity (multiple enemies)
+    - Quick eliminations (fast reaction times)
+    - Intense combat (high motion + enemies)
+    - Clutch moments (surviving intense situations)
+    Scores every frame at once: O(frames + events log events).
+    """
+    if len(timeline) == 0:
+        return []
+
+    frames, persons, motion, fps = timeline.frames, timeline.persons, timeline.motion, timeline.fps
+    times = timeline.times.tolist()
+    # Eliminations are recorded in frame order; the earliest one nearby counts
+    order = np.argsort(timeline.elimination_frames, kind="stable")
+    elimination_frames, elimination_ms = timeline.elimination_frames[order], timeline.elimination_ms[order]
+
+    # Factor 1: Multiple enemies (high person count)
+    multi_enemy = persons >= 3
+    combat = (persons >= 2) & ~multi_enemy
+    scores = np.where(multi_enemy, 30 * persons, np.where(combat, 20 * persons, 0)).astype(np.float64)
+
+    # Factor 2: High motion (intense action)
+    intense_action = motion > 15
+    scores += np.where(intense_action, motion * 2, 0.0)
+
+    # Factor 3: Enemy encounter within 2 seconds
+    enemy_encounter = _window_counts(timeline.encounter_frames, frames, fps * 2) > 0
+    scores += np.where(enemy_encounter, 40, 0)
+
+    # Factor 4: Elimination within 1 second, bonus for fast reactions
+    nearest = _first_in_window(elimination_frames, frames, fps * 1)
+    elimination = nearest >= 0
+    quick_kill = np.zeros(len(frames), dtype=bool)
+    quick_kill[elimination] = elimination_ms[nearest[elimination]] < 300
+    scores += np.where(quick_kill, 50, np.where(elimination, 30, 0))
+
+    # Store if exciting enough, then keep highlights at least 5 seconds apart
+    candidates = np.flatnonzero(scores > 50)
+    kept = candidates[suppress_nearby([times[i] for i in candidates], scores[candidates], 5)]
+
+    # Sort by time, limit to 5 moments
+    kept = sorted(kept.tolist(), key=lambda i: times[i])[:MAX_MOMENTS]
+    highlights = []
+    for i in kept:
+        moment_type = []
+        if multi_enemy[i]:
+            moment_type.append("multi_enemy")
+        elif combat[i]:
+            moment_type.append("combat")
+        if intense_action[i]:
+            moment_type.append("intense_action")
+        if enemy_encounter[i]:
+            moment_type.append("enemy_encounter")
+        if quick_kill[i]:
+            moment_type.append("quick_kill")
+        elif elimination[i]:
+            moment_type.append("elimination")
+        highlights.append({
+            'frame': int(frames[i]),
+            'time_sec': times[i],
+            # Integer unless the motion term was added
+            'score': float(scores[i]) if intense_action[i] else int(scores[i]),
+            'types': moment_type,
+            'persons': int(persons[i]),
+            'motion': float(motion[i])
+        })
+    return highlights
+
+def merge_overlapping_windows(starts, ends, scores):
+    """
+    Sweep windows by start frame; of two overlapping windows keep the one
+    with the higher score (the earlier one on ties). Returns the kept indices.
+    """
+    order = np.argsort(starts, kind="stable").tolist()
+    if not order:
+        return []
+    starts, ends, scores = starts.tolist(), ends.tolist(), scores.tolist()
+    merged = []
+    current = order[0]
+    for idx in order[1:]:
+        if starts[idx] <= ends[current]:
+            if scores[idx] > scores[current]:
+                current = idx
+        else:
+            merged.append(current)
+            current = idx
+    merged.append(current)
+    return merged
+
+@highlight_strategy("event_windows")
+def event_window_moments(timeline):
+    """
+    Clips around game events, merged where they overlap, top 5 by score:
+    1. Kill streaks - 2+ new enemies within 5 seconds
+    2. Fast reactions - eliminations under 800ms
+    3. High intensity - 3 second windows with many persons and high motion
+    4. Clutch moments - 3+ enemies, fewer of them 5 seconds later
+    """
+    fps, total_frames = timeline.fps, timeline.total_frames
+    frames, persons, motion = timeline.frames, timeline.persons, timeline.motion
+    kinds, starts, ends, scores, values = [], [], [], [], []
+
+    def add(kind, start, end, score, value):
+        kinds.append(np.full(len(start), kind))
+        starts.append(start)
+        ends.append(end)
+        scores.append(np.asarray(score, dtype=np.float64))
+        values.append(np.asarray(value, dtype=np.float64))
+
+    # 1. KILL STREAKS - new enemies from each encounter through the next 5 seconds
+    encounter_frames = timeline.encounter_frames
+    window_end = encounter_frames + int(fps * 5)
+    new_persons = np.concatenate([[0], np.cumsum(timeline.encounter_new_persons)])
+    following = np.arange(1, len(encounter_frames) + 1)
+    last = np.maximum(np.searchsorted(encounter_frames, window_end, side="right"), following)
+    enemies_in_window = timeline.encounter_new_persons + new_persons[last] - new_persons[following]
+    streak = enemies_in_window >= 2
+    add(0, np.maximum(0, encounter_frames - int(fps * 2))[streak],  # 2 sec before
+        np.minimum(total_frames, window_end + int(fps * 1))[streak],  # 1 sec after
+        enemies_in_window[streak] * 30, enemies_in_window[streak])
+
+    # 2. FAST REACTIONS - under 800ms is impressive
+    reaction_ms = timeline.elimination_ms
+    fast = reaction_ms < 800
+    add(1, np.maximum(0, timeline.elimination_encounter_frames - int(fps * 1.5))[fast],
+        np.minimum(total_frames, timeline.elimination_frames + int(fps * 1))[fast],
+        100 - reaction_ms[fast] / 10, reaction_ms[fast])
+
+    # 3. HIGH INTENSITY - many persons + high motion over 3 second windows, every second
+    window_size, step = int(fps * 3), int(fps)
+    if window_size > 0 and step > 0 and len(timeline) > window_size:
+        first = np.arange(0, len(timeline) - window_size, step)
+        avg_persons = np.lib.stride_tricks.sliding_window_view(persons, window_size)[first].sum(axis=1) / window_size
+        avg_motion = np.lib.stride_tricks.sliding_window_view(motion, window_size)[first].sum(axis=1) / window_size
+        intensity_score = (avg_persons * 20) + (avg_motion / 5)
+        intense = intensity_score > 50  # Threshold for "exciting"
+        add(2, frames[first][intense], frames[first + window_size - 1][intense],
+            intensity_score[intense], np.zeros(int(intense.sum())))
+
+    # 4. CLUTCH MOMENTS - 3+ enemies, fewer of them 5 seconds later
+    survival_frames = int(fps * 5)
+    if len(timeline) > survival_frames:
+        later = persons[survival_frames:]
+        now = persons[:len(later)]
+        clutch = np.flatnonzero((now >= 3) & (later < now))
+        add(3, np.maximum(0, frames[clutch] - int(fps * 2)),
+            np.minimum(total_frames, frames[clutch + survival_frames] + int(fps * 1)),
+            persons[clutch] * 25, persons[clutch])
+
+    kinds, starts, ends = np.concatenate(kinds), np.concatenate(starts), np.concatenate(ends)
+    scores, values = np.concatenate(scores), np.concatenate(values)
+
+    # Remove overlapping moments (keep highest score), then the top 5 by score
+    merged = merge_overlapping_windows(starts, ends, scores)
+    top = sorted(merged, key=lambda i: scores[i], reverse=True)[:MAX_MOMENTS]
+
+    moments = []
+    for i in sorted(top, key=lambda i: starts[i]):
+        kind, value = int(kinds[i]), values[i]
+        moment_type = ("kill_streak", "fast_reaction", "high_intensity", "clutch")[kind]
+        description = (
+            f'{int(value)} enemies in quick succession',
+            f'Quick elimination ({int(value)}ms)',
+            'Intense combat action',
+            f'Clutch vs {int(value)} enemies',
+        )[kind]
+        start = int(starts[i])
+        moments.append({
+            'type': moment_type,
+            'start_frame': start,
+            'end_frame': int(ends[i]),
+            # Streak and clutch scores are counts x points
+            'score': int(scores[i]) if moment_type in ("kill_streak", "clutch") else float(scores[i]),
+            'description': description,
+            'frame': start,
+            'time_sec': start / fps if fps > 0 else 0,
+            'types': [moment_type]
+        })
+    return moments
+
+def clip_windows(highlight_moments, fps):
+    """[start, end) source frames of each moment's clip (4 seconds centered on its frame by default)"""
+    clip_frames = int(CLIP_DURATION_SEC * fps)
+    windows = []
+    for moment in highlight_moments:
+        if 'start_frame' in moment:
+            windows.append((moment['start_frame'], moment['end_frame']))
+        else:
+            start = max(0, moment['frame'] - clip_frames // 2)
+            windows.append((start, start + clip_frames))
+    return windows
+
+def reel_duration_sec(highlight_moments, fps):
+    """Length of the clips of a reel (without transitions)"""
+    if fps <= 0:
+        return 0
+    return round(sum(end - start for start, end in clip_windows(highlight_moments, fps)) / fps, 1)
+
+class ClipOverlay:
+    """Darkened title band of one clip"""
+
+    def __init__(self, number, moment, width, height):
+        # cv2.rectangle corners are inclusive, the band covers rows 0..OVERLAY_HEIGHT
+        self.black = np.zeros((min(OVERLAY_HEIGHT + 1, height), width, 3), dtype=np.uint8)
+        self.overlay_text = f"Highlight #{number}"
+        self.moment_types = ", ".join(moment['types'][:2]).upper()  # Show first 2 types
+
+    def apply(self, frame):
+        band = frame[:self.black.shape[0]]
+        # Semi-transparent black band: 40% of the frame shows through
+        cv2.addWeighted(self.black, 0.6, band, 0.4, 0, band)
+        cv2.putText(frame, self.overlay_text, (20, 30),
+                   cv2.FONT_HERSHEY_SIMPLEX, 1.0, (0, 255, 255), 2)
+        cv2.putText(frame, self.moment_types, (20, 60),
+                   cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
+
+def transition_frame(width, height):
+    black_frame = np.zeros((height, width, 3), dtype=np.uint8)
+    cv2.putText(black_frame, "NEXT HIGHLIGHT",
+               (width // 2 - 150, height // 2),
+               cv2.FONT_HERSHEY_SIMPLEX, 1.5, (255, 255, 255), 3)
+    return black_frame
+
+def generate_highlight_reel(input_video_path, highlight_moments, fps, original_filename) -> Optional[str]:
+    """
+    Generate a highlight reel video from detected moments, in video order.
+    Returns the reel's filename in the output directory, or None.
+    """
+    if not highlight_moments:
+        return None
+
+    cap = cv2.VideoCapture(input_video_path)
+    if not cap.isOpened():
+        return None
+
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+
+    # Create output path with sanitized filename (remove spaces and special chars)
+    safe_filename = original_filename.replace(" ", "_").replace("%", "")
+    highlight_filename = f"highlights_{safe_filename}"
+    highlight_path = os.path.join(settings.output_dir, highlight_filename)
+
+    # Video writer - use same codec as main analysis (mp4v works for playback)
+    fourcc = cv2.VideoWriter_fourcc(*"mp4v")
+    out = cv2.VideoWriter(highlight_path, fourcc, fps, (width, height))
+
+    if not out.isOpened():
+        print(f"❌ Failed to create video writer for {highlight_path}")
+        cap.release()
+        return None
+
+    clips = sorted(zip(clip_windows(highlight_moments, fps), highlight_moments), key=lambda clip: clip[0][0])
+    windows = [window for window, _ in clips]
+    moments = [moment for _, moment in clips]
+    overlays = [ClipOverlay(idx + 1, moment, width, height) for idx, moment in enumerate(moments)]
+    transition = transition_frame(width, height)
+    transition_frames = int(fps * TRANSITION_SEC)
+    seek_gap = int(fps * SEEK_GAP_SEC)
+
+    def write_clip_frame(clip_idx, frame, offset):
+        overlays[clip_idx].apply(frame)
+        # Draw progress bar
+        clip_frames = windows[clip_idx][1] - windows[clip_idx][0]
+        bar_width = int(offset / clip_frames * (width - 40))
+        cv2.rectangle(frame, (20, height - 30), (20 + bar_width, height - 20),
+                     (0, 255, 255), -1)
+        out.write(frame)
+
+    # Frames of later clips that overlap the clip being written, held until their turn
+    pending = [[] for _ in windows]
+    current = 0
+    frame_idx = 0  # Index of the next frame to decode
+    eof = False
+    while current < len(windows):
+        start, end = windows[current]
+
+        if eof or frame_idx >= end:
+            # Clip done (or the video ended): transition, then start the next clip
+            if current < len(windows) - 1:
+                for _ in range(transition_frames):
+                    out.write(transition)
+            current += 1
+            if current < len(windows):
+                for offset, frame in enumerate(pending[current]):
+                    write_clip_frame(current, frame, offset)
+                pending[current] = None
+            continue
+
+        if frame_idx < start:
+            if start - frame_idx > seek_gap:
+                cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+                frame_idx = start
+            else:
+                # Between clips: advance without converting the frame
+                eof = not cap.grab()
+                frame_idx += 1
+            continue
+
+        ret, frame = cap.read()
+        if not ret:
+            eof = True
+            continue
+        for later in range(current + 1, len(windows)):
+            if windows[later][0] <= frame_idx < windows[later][1]:
+                pending[later].append(frame.copy())
+        write_clip_frame(current, frame, frame_idx - start)
+        frame_idx += 1
+
+    cap.release()
+    out.release()
+
+    return highlight_filename
@@ -0,0 +1,213 @@
+"""
+MongoDB indexes.
+
+INDEXES declares the indexes of every collection; ensure_indexes() creates
+them from the startup event (creating an index that already exists is a
+no-op). QUERY_SHAPES lists the hot queries of the API: verify_query_plans()
+runs explain() on each one and reports every shape whose winning plan scans
+the whole collection (COLLSCAN) - with settings.mongo_index_check = "fail"
+the API then refuses to start instead of silently scanning on every request.
+
+New queries on a hot path get a shape here, next to the index that serves it.
+
+The unique indexes cannot be built on a database that already holds
+duplicates (users created twice by concurrent sign-ups, a user_stats
+document inserted twice): the API then refuses to start. dedupe() resolves
+them - merged user_stats, renamed usernames - except duplicate emails,
+which it only reports: merge or delete those accounts by hand, or start
+with MONGO_INDEX_CHECK=warn meanwhile.
+
+    python indexes.py  (report duplicates, create the indexes and print the plan of every shape)
+    python indexes.py --dedupe  (resolve the duplicates first - with the API stopped)
+"""
+import asyncio
+import sys
+from typing import List, Optional
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+from config import settings
+from database import get_collection
+from tracing import logger
+
+INDEX_CHECK_MODES = ("fail", "warn", "off")
+
+INDEXES = {
+    "users": [
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),  # Every authenticated request
+        IndexModel([("username", ASCENDING)], name="username_unique", unique=True),
+    ],
+    "user_stats": [
+        IndexModel([("user_id", ASCENDING)], name="user_id_unique", unique=True),
+    ],
+    "sessions": [
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING)], name="user_recent"),
+    ],
+    "leaderboard_entries": [
+        IndexModel(
+            [("user_id", ASCENDING), ("game_preset", ASCENDING), ("window", ASCENDING), ("bucket", ASCENDING)],
+            name="user_board_unique", unique=True,
+        ),
+        # A board (window, bucket, preset) is one range in rank order, see leaderboard.py
+        IndexModel(
+            [("window", ASCENDING), ("bucket", ASCENDING), ("game_preset", ASCENDING),
+             ("best_performance_score", DESCENDING), ("user_id", ASCENDING)],
+            name="board_rank_user",
+        ),
+    ],
+    "highlight_sessions": [
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING)], name="user_recent"),
+    ],
+}
+
+# (collection, filter, sort) of the hot queries, with placeholder values
+QUERY_SHAPES = [
+    ("users", {"email": "shape@example.com"}, None),
+    ("users", {"username": "shape"}, None),
+    ("user_stats", {"user_id": "shape"}, None),
+    ("sessions", {"user_id": "shape"}, [("created_at", DESCENDING)]),
+    ("leaderboard_entries", {"user_id": "shape", "game_preset": "shape", "window": "daily", "bucket": "shape"}, None),
+    ("leaderboard_entries", {"window": "daily", "bucket": "shape", "game_preset": "shape"},  # One board
+     [("best_performance_score", DESCENDING), ("user_id", ASCENDING)]),
+    ("leaderboard_entries", {"window": "daily", "bucket": "shape"},  # Every board of a bucket (load)
+     [("game_preset", ASCENDING), ("best_performance_score", DESCENDING), ("user_id", ASCENDING)]),
+    ("leaderboard_entries", {"window": "daily", "bucket": {"$lt": "shape"}}, None),  # Rollover
+    ("highlight_sessions", {"user_id": "shape"}, [("created_at", DESCENDING)]),
+]
+
+# Fields of user_stats summed / maxed when its duplicates are merged (see user_stats_update in main.py)
+STATS_COUNTERS = ("total_sessions", "total_reaction_tests", "total_videos_analyzed")
+STATS_BEST = ("best_reaction_time", "best_fps", "best_performance_score")
+
+async def ensure_indexes():
+    """Create the declared indexes; a collection whose indexes cannot be built is logged, not fatal"""
+    for collection_name, models in INDEXES.items():
+        try:
+            names = await get_collection(collection_name).create_indexes(models)
+            logger.info("Indexes of %s: %s", collection_name, ", ".join(names))
+        except OperationFailure as e:
+            # e.g. duplicates in a field that should be unique - the query plan check reports the scan
+            logger.error("Could not create the indexes of %s: %s (see python indexes.py --dedupe)", collection_name, e)
+
+async def find_duplicates(collection_name: str, field: str) -> List[dict]:
+    """Values of field held by several documents: {"_id": value, "ids": [oldest first]}"""
+    cursor = get_collection(collection_name).aggregate([
+        {"$sort": {"_id": 1}},
+        {"$group": {"_id": f"${field}", "ids": {"$push": "$_id"}}},
+        {"$match": {"ids.1": {"$exists": True}}},
+    ], allowDiskUse=True)
+    return await cursor.to_list(None)
+
+async def dedupe(apply: bool = False) -> List[str]:
+    """
+    Resolve the duplicates that keep the unique indexes from being built.
+    Returns what was done (apply) or would be done:
+
+    - user_stats: the documents of a user are merged into the oldest one
+    - users.username: every account but the oldest is renamed "<username>_<n>"
+    - users.email: only reported, accounts are not merged automatically
+    """
+    actions = []
+    stats = get_collection("user_stats")
+    for group in await find_duplicates("user_stats", "user_id"):
+        keep, *extra = group["ids"]
+        docs = await stats.find({"_id": {"$in": group["ids"]}}).to_list(None)
+        merged = {field: sum(doc.get(field, 0) for doc in docs) for field in STATS_COUNTERS}
+        for field in STATS_BEST:
+            values = [doc[field] for doc in docs if doc.get(field) is not None]
+            if values:
+                merged[field] = max(values)
+        actions.append(f"user_stats user_id={group['_id']}: merge {len(extra)} duplicates into {keep}")
+        if apply:
+            await stats.update_one({"_id": keep}, {"$set": merged})
+            await stats.delete_many({"_id": {"$in": extra}})
+
+    users = get_collection("users")
+    for group in await find_duplicates("users", "username"):
+        base = group["_id"] or "user"
+        suffix = 1
+        for user_id in group["ids"][1:]:
+            suffix += 1
+            while await users.find_one({"username": f"{base}_{suffix}"}, {"_id": 1}):
+                suffix += 1
+            username = f"{base}_{suffix}"
+            actions.append(f"users username={group['_id']!r}: rename {user_id} to {username!r}")
+            if apply:
+                await users.update_one({"_id": user_id}, {"$set": {"username": username}})
+                await get_collection("leaderboard_entries").update_many(
+                    {"user_id": str(user_id)}, {"$set": {"username": username}}
+                )
+
+    for group in await find_duplicates("users", "email"):
+        ids = ", ".join(str(user_id) for user_id in group["ids"])
+        actions.append(f"users email={group['_id']!r}: accounts {ids} - merge or delete them by hand")
+    return actions
+
+def _plan_stages(plan) -> List[str]:
+    """All stage names of an explain() plan tree"""
+    stages = []
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            stages.append(plan["stage"])
+        for value in plan.values():
+            stages += _plan_stages(value)
+    elif isinstance(plan, list):
+        for value in plan:
+            stages += _plan_stages(value)
+    return stages
+
+async def explain_shape(collection_name: str, query: dict, sort: Optional[list] = None) -> List[str]:
+    """Stages of the winning plan of a query shape"""
+    cursor = get_collection(collection_name).find(query)
+    if sort:
+        cursor = cursor.sort(sort)
+    explained = await cursor.limit(1).explain()
+    return _plan_stages(explained["queryPlanner"]["winningPlan"])
+
+async def verify_query_plans(mode: Optional[str] = None) -> List[dict]:
+    """
+    explain() every registered query shape. Returns the shapes that scan the
+    whole collection; with mode "fail" (default settings.mongo_index_check)
+    raises RuntimeError if there is one.
+    """
+    mode = mode or settings.mongo_index_check
+    if mode not in INDEX_CHECK_MODES:
+        raise ValueError(f"Unknown index check mode '{mode}', expected one of {INDEX_CHECK_MODES}")
+    if mode == "off":
+        return []
+
+    scans = []
+    for collection_name, query, sort in QUERY_SHAPES:
+        stages = await explain_shape(collection_name, query, sort)
+        if "COLLSCAN" in stages:
+            scans.append({"collection": collection_name, "filter": query, "sort": sort, "stages": stages})
+
+    for scan in scans:
+        logger.warning("Query on %s %s sort %s scans the whole collection: %s",
+                       scan["collection"], scan["filter"], scan["sort"], " <- ".join(scan["stages"]))
+    if scans and mode == "fail":
+        raise RuntimeError(
+            f"{len(scans)} registered queries do a COLLSCAN, see the log (set MONGO_INDEX_CHECK=warn to start anyway)"
+        )
+    return scans
+
+async def _main():
+    from database import connect_to_mongo, close_mongo_connection
+    await connect_to_mongo()
+    try:
+        apply = "--dedupe" in sys.argv[1:]
+        actions = await dedupe(apply)
+        for action in actions:
+            print(action)
+        if actions and not apply:
+            print("Run python indexes.py --dedupe (with the API stopped) to resolve them\n")
+        await ensure_indexes()
+        for collection_name, query, sort in QUERY_SHAPES:
+            stages = await explain_shape(collection_name, query, sort)
+            print(f"{collection_name:<20} {str(query):<36} {str(sort or ''):<34} {' <- '.join(stages)}")
+    finally:
+        await close_mongo_connection()
+
+if __name__ == "__main__":
+    asyncio.run(_main())
@@ -0,0 +1,343 @@
+"""
+Background job queue for video analysis.
+
+Uploads are handed to a pool of worker processes (each loads the YOLO model
+once) so the event loop keeps serving login, leaderboard etc. while videos
+are being analyzed. Job state lives in memory in the API process.
+
+Jobs submitted with progress=True get a progress callback (see progress.py).
+Workers put its events on one multiprocessing queue shared by the pool; a
+thread in the API process hands them to their job, where Job.stream()
+replays them to any number of listeners (the /api/jobs/{job_id}/events
+stream).
+
+submit_batch() queues many calls as one job: each call is its own pool task,
+so they spread over all workers, and the job gets a progress event whenever
+one of them finishes.
+"""
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Awaitable, Callable, Iterable, Optional
+
+from config import settings
+from tracing import logger
+import analysis
+
+_progress_queue = None  # Worker processes: progress events to the API process
+
+def _init_worker(progress_queue):
+    """Process pool initializer - keep the progress queue, then load the model"""
+    global _progress_queue
+    _progress_queue = progress_queue
+    analysis.init_worker()
+
+def _worker_status() -> dict:
+    """Model status of the worker process that runs it"""
+    return {"pid": os.getpid(), **analysis.model_manager.status()}
+
+def _run_with_progress(job_id: str, fn: Callable, args: tuple):
+    """Run fn(*args) in a worker with a progress callback that reports to the API process"""
+    return fn(*args, progress=lambda event: _progress_queue.put((job_id, event)))
+
+class JobStatus:
+    QUEUED = "queued"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+class Job:
+    def __init__(self, kind: str, user_id: Optional[str] = None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.user_id = user_id
+        self.status = JobStatus.QUEUED
+        self.result: Optional[dict] = None
+        self.error: Optional[str] = None
+        self.created_at = datetime.utcnow()
+        self.finished_at: Optional[datetime] = None
+        self.futures = []  # Pool tasks (several for a batch job)
+        self.progress: Optional[dict] = None  # Latest progress event
+        self.events = []  # All progress events, replayed to late listeners
+        self._update = asyncio.Event()
+
+    @property
+    def done(self) -> bool:
+        return self.status in (JobStatus.COMPLETED, JobStatus.FAILED)
+
+    def to_dict(self) -> dict:
+        """Public job status (without the result payload)"""
+        status = self.status
+        if status == JobStatus.QUEUED and any(future.running() for future in self.futures):
+            status = JobStatus.RUNNING
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": status,
+            "error": self.error,
+            "created_at": self.created_at.isoformat(),
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "progress": {k: v for k, v in self.progress.items() if k != "timeline"} if self.progress else None,
+        }
+
+    def add_progress(self, event: dict):
+        if self.done:
+            return
+        self.progress = event
+        self.events.append(event)
+        self._notify()
+
+    def _notify(self):
+        """Wake up everyone waiting in stream()"""
+        self._update.set()
+        self._update = asyncio.Event()
+
+    async def stream(self, heartbeat_sec: Optional[float] = None) -> AsyncIterator[Optional[dict]]:
+        """
+        Yield the job's progress events (earlier ones first) until it is done.
+        Yields None after heartbeat_sec without an event.
+        """
+        sent = 0
+        while True:
+            update = self._update
+            while sent < len(self.events):
+                yield self.events[sent]
+                sent += 1
+            if self.done:
+                return
+            try:
+                await asyncio.wait_for(update.wait(), heartbeat_sec)
+            except asyncio.TimeoutError:
+                yield None
+
+class JobManager:
+    def __init__(self):
+        self.executor: Optional[ProcessPoolExecutor] = None
+        self.jobs = {}
+        self._watchers = set()
+        self._progress_queue = None
+        self._broken = False  # Set when a worker died outside a job (warm-up)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def start(self):
+        """Start the worker pool (called from the app startup event)"""
+        if self._broken:
+            self.shutdown()
+            self._broken = False
+        if self.executor is None:
+            # spawn, not fork: forking a process that already imported torch can deadlock
+            context = multiprocessing.get_context("spawn")
+            if self._progress_queue is None:
+                # Outlives pool restarts, so one reader thread serves all pools
+                self._progress_queue = context.Queue()
+                threading.Thread(target=self._read_progress, name="job-progress", daemon=True).start()
+            self.executor = ProcessPoolExecutor(
+                max_workers=settings.analysis_workers,
+                mp_context=context,
+                initializer=_init_worker,
+                initargs=(self._progress_queue,),
+            )
+            print(f"Started analysis worker pool with {settings.analysis_workers} workers")
+
+    def warm_up(self):
+        """
+        Start every worker now instead of on the first job: each one loads and
+        warms up its model in the pool initializer while the API already serves.
+        """
+        self.start()
+        for _ in range(settings.analysis_workers):
+            self.executor.submit(_worker_status).add_done_callback(self._log_warm_worker)
+
+    def _log_warm_worker(self, future):
+        if future.exception() is not None:
+            logger.warning("Analysis worker failed to start: %s", future.exception())
+            if isinstance(future.exception(), BrokenProcessPool):
+                self._broken = True  # Replace the pool on the next job instead of failing it
+            return
+        status = future.result()
+        logger.info("Analysis worker %s ready: %s", status.pop("pid"), status)
+
+    def shutdown(self):
+        """Stop the worker pool, cancelling jobs that have not started"""
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+    def _submit(self, fn: Callable, *args):
+        """executor.submit on a running pool, replacing one that broke since the last job"""
+        self.start()
+        try:
+            return self.executor.submit(fn, *args)
+        except BrokenProcessPool:
+            self.shutdown()
+            self.start()
+            return self.executor.submit(fn, *args)
+
+    def _drop_broken(self, executor: ProcessPoolExecutor):
+        """A worker of executor died (e.g. out of memory) - the next job starts a new pool"""
+        if self.executor is executor:  # Not already replaced for another job
+            self.shutdown()
+
+    def submit(
+        self,
+        kind: str,
+        fn: Callable,
+        *args,
+        user_id: Optional[str] = None,
+        on_complete: Optional[Callable[[dict], Awaitable[dict]]] = None,
+        on_failure: Optional[Callable[[], Awaitable]] = None,
+        progress: bool = False,
+    ) -> Job:
+        """
+        Queue fn(*args) on the worker pool and return the job immediately.
+        on_complete runs in the API process with the worker's result and its
+        return value becomes the job result. A result with an "error" marks
+        the job failed like an exception does; then on_failure runs instead.
+        With progress, fn is called with progress= (a callback whose events
+        become the job's progress, see Job.stream).
+        """
+        job = self._new_job(kind, user_id)
+        if progress:
+            job.futures = [self._submit(_run_with_progress, job.id, fn, args)]
+        else:
+            job.futures = [self._submit(fn, *args)]
+        self._start_watch(job, asyncio.wrap_future(job.futures[0]), on_complete, on_failure)
+        return job
+
+    def submit_batch(
+        self,
+        kind: str,
+        fn: Callable,
+        calls: Iterable[tuple],
+        user_id: Optional[str] = None,
+        on_complete: Optional[Callable[[dict], Awaitable[dict]]] = None,
+        on_failure: Optional[Callable[[], Awaitable]] = None,
+    ) -> Job:
+        """
+        Queue fn(*args) for every args tuple of calls, each as its own pool
+        task, and return one job for all of them. The worker result is
+        {"results": [...]} in the order of calls (a call that raised gives
+        {"error": ...}); on_complete and on_failure work like in submit().
+        """
+        job = self._new_job(kind, user_id)
+        job.futures = [self._submit(fn, *args) for args in calls]
+        self._start_watch(job, self._gather(job, self.executor), on_complete, on_failure)
+        return job
+
+    def _new_job(self, kind: str, user_id: Optional[str]) -> Job:
+        self._prune()
+        self._loop = asyncio.get_running_loop()
+        return Job(kind, user_id)
+
+    def _start_watch(self, job: Job, result: Awaitable, on_complete, on_failure):
+        self.jobs[job.id] = job
+        watcher = asyncio.create_task(self._watch(job, result, on_complete, on_failure, self.executor))
+        self._watchers.add(watcher)
+        watcher.add_done_callback(self._watchers.discard)
+
+    async def _gather(self, job: Job, executor: ProcessPoolExecutor) -> dict:
+        """
+        Results of a batch job's tasks, with a progress event each time one
+        finishes. A task lost to a crashed worker fails like one that raised,
+        so the results of the others are kept.
+        """
+        started = time.perf_counter()
+        total = len(job.futures)
+        results = [None] * total
+        finished, failed = 0, 0
+
+        async def wait(i, future):
+            nonlocal finished, failed
+            try:
+                results[i] = await asyncio.wrap_future(future)
+            except BrokenProcessPool:
+                results[i] = {"error": "Analysis worker crashed"}
+                self._drop_broken(executor)
+            except Exception as e:
+                results[i] = {"error": str(e)}
+            finished += 1
+            failed += not results[i] or "error" in results[i]
+            elapsed = time.perf_counter() - started
+            job.add_progress({
+                "done": finished,
+                "total": total,
+                "failed": failed,
+                "percent": round(min(99.0, 100.0 * finished / total), 1),  # 100 once the results are saved
+                "elapsed_sec": round(elapsed, 2),
+                "eta_sec": round(elapsed / finished * (total - finished), 1),
+            })
+
+        await asyncio.gather(*(wait(i, future) for i, future in enumerate(job.futures)))
+        return {"results": results}
+
+    async def run(self, fn: Callable, *args):
+        """Run fn(*args) on the worker pool and wait for the result"""
+        future = self._submit(fn, *args)
+        executor = self.executor
+        try:
+            return await asyncio.wrap_future(future)
+        except BrokenProcessPool:
+            self._drop_broken(executor)
+            raise
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self.jobs.get(job_id)
+
+    async def _watch(self, job: Job, result: Awaitable, on_complete, on_failure, executor: ProcessPoolExecutor):
+        try:
+            result = await result
+            if not result or "error" in result:
+                # e.g. "Could not open video" - the worker reports it instead of raising
+                raise RuntimeError((result or {}).get("error") or "Analysis returned no result")
+            if on_complete is not None:
+                result = await on_complete(result)
+            job.result = result
+            job.status = JobStatus.COMPLETED
+        except BrokenProcessPool as e:
+            # A worker died (e.g. out of memory) - replace the pool for the next jobs
+            print(f"❌ Job {job.id} failed, worker pool crashed: {e}")
+            job.error = "Analysis worker crashed"
+            job.status = JobStatus.FAILED
+            self._drop_broken(executor)
+        except Exception as e:
+            print(f"❌ Job {job.id} failed: {e}")
+            job.error = str(e)
+            job.status = JobStatus.FAILED
+        finally:
+            if job.status == JobStatus.FAILED and on_failure is not None:
+                try:
+                    await on_failure()
+                except Exception as e:
+                    print(f"❌ Job {job.id}: on_failure failed: {e}")
+            job.finished_at = datetime.utcnow()
+            job._notify()
+
+    def _read_progress(self):
+        """Reader thread: hand progress events from the workers to their jobs on the event loop"""
+        while True:
+            job_id, event = self._progress_queue.get()
+            job = self.jobs.get(job_id)
+            if job is None or self._loop is None:
+                continue
+            try:
+                self._loop.call_soon_threadsafe(job.add_progress, event)
+            except RuntimeError:
+                pass  # Event loop closed (shutdown)
+
+    def _prune(self):
+        """Forget finished jobs older than the retention window"""
+        cutoff = datetime.utcnow() - timedelta(minutes=settings.job_retention_minutes)
+        expired = [
+            job_id for job_id, job in self.jobs.items()
+            if job.done and job.finished_at < cutoff
+        ]
+        for job_id in expired:
+            del self.jobs[job_id]
+
+job_manager = JobManager()
@@ -0,0 +1,463 @@
+"""
+Materialized leaderboards.
+
+The leaderboard_entries collection is the source of truth: one document per
+user, game preset, window and bucket. Each analysis upserts the user's entry
+in the board of its game preset and in the "all" board, for every window:
+
+- all_time: a single bucket, "all_time"
+- weekly: one bucket per ISO week, e.g. "2026-W42"
+- daily: one bucket per UTC day, e.g. "2026-10-18"
+
+so a preset keeps its own best score instead of taking over the one of the
+game the user played last. The (window, bucket, game_preset, score) index
+makes every board one contiguous index range, read with a single range scan
+already in rank order.
+
+This module keeps the boards of the current buckets ranked in memory so reads
+never go to MongoDB. Each board is a RankedSkipList ordered by best
+performance score (ties: by user id), where a node also stores
+how many entries its links skip, so:
+
+- insert / remove / rank of an entry: O(log n)
+- the entry at a rank: O(log n), a page of k entries after it: O(log n + k)
+
+The engine loads the current buckets in the startup event (rebuilding the
+collection from the sessions first when it is empty, e.g. on the first start
+after the per-user "leaderboard" collection was replaced) and is fed with
+every analysis that updates the collection (see save_analysis_session),
+applying the same rules as entry_updates(). A background task rolls the
+daily and weekly boards over at UTC midnight and deletes the past buckets.
+Pages use cursors (score and user id of the last entry), so a page does
+not shift when entries above it move, and a cursor stays valid across
+restarts and API processes. Like user_cache, the engine is per API
+process.
+
+    python leaderboard.py  (rebuild the entries from the sessions, then restart the API)
+"""
+import asyncio
+import base64
+import random
+from datetime import datetime, timedelta
+from typing import Iterable, List, Optional
+
+from pymongo import UpdateOne
+
+from database import get_collection
+from tracing import logger
+
+ALL_PRESETS = "all"
+ALL_TIME = "all_time"
+WINDOWS = (ALL_TIME, "weekly", "daily")
+ENTRY_FIELDS = {
+    "user_id": 1, "username": 1, "game_preset": 1, "window": 1, "best_performance_score": 1,
+    "best_reaction_time": 1, "best_game_preset": 1, "latest_fps": 1, "updated_at": 1,
+}
+BOARD_SORT = [("best_performance_score", -1), ("user_id", 1)]  # Rank order within a board
+MAX_LEVEL = 32
+LEVEL_PROBABILITY = 0.25
+
+class _Node:
+    __slots__ = ("key", "value", "next", "span")
+
+    def __init__(self, key, value, level: int):
+        self.key = key
+        self.value = value
+        self.next = [None] * level
+        self.span = [0] * level  # Entries passed when following next[i]
+
+class RankedSkipList:
+    """Skip list of unique, comparable keys with O(log n) rank and index lookups"""
+    def __init__(self):
+        self._head = _Node(None, None, MAX_LEVEL)
+        self._level = 1
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _random_level(self) -> int:
+        level = 1
+        while level < MAX_LEVEL and random.random() < LEVEL_PROBABILITY:
+            level += 1
+        return level
+
+    def insert(self, key, value):
+        update = [self._head] * MAX_LEVEL
+        rank = [0] * MAX_LEVEL  # Position of update[i]
+        x = self._head
+        for i in range(self._level - 1, -1, -1):
+            rank[i] = rank[i + 1] if i < self._level - 1 else 0
+            while x.next[i] is not None and x.next[i].key < key:
+                rank[i] += x.span[i]
+                x = x.next[i]
+            update[i] = x
+
+        level = self._random_level()
+        if level > self._level:
+            for i in range(self._level, level):
+                self._head.span[i] = self._size
+            self._level = level
+
+        node = _Node(key, value, level)
+        for i in range(level):
+            node.next[i] = update[i].next[i]
+            update[i].next[i] = node
+            node.span[i] = update[i].span[i] - (rank[0] - rank[i])
+            update[i].span[i] = rank[0] - rank[i] + 1
+        for i in range(level, self._level):
+            update[i].span[i] += 1
+        self._size += 1
+
+    def remove(self, key) -> bool:
+        update = [self._head] * MAX_LEVEL
+        x = self._head
+        for i in range(self._level - 1, -1, -1):
+            while x.next[i] is not None and x.next[i].key < key:
+                x = x.next[i]
+            update[i] = x
+        x = x.next[0]
+        if x is None or x.key != key:
+            return False
+
+        for i in range(self._level):
+            if update[i].next[i] is x:
+                update[i].span[i] += x.span[i] - 1
+                update[i].next[i] = x.next[i]
+            else:
+                update[i].span[i] -= 1
+        while self._level > 1 and self._head.next[self._level - 1] is None:
+            self._level -= 1
+        self._size -= 1
+        return True
+
+    def count_le(self, key) -> int:
+        """Number of keys <= key"""
+        x, passed = self._head, 0
+        for i in range(self._level - 1, -1, -1):
+            while x.next[i] is not None and x.next[i].key <= key:
+                passed += x.span[i]
+                x = x.next[i]
+        return passed
+
+    def rank(self, key) -> Optional[int]:
+        """0-based index of key, None if it is not in the list"""
+        x, passed = self._head, 0
+        for i in range(self._level - 1, -1, -1):
+            while x.next[i] is not None and x.next[i].key <= key:
+                passed += x.span[i]
+                x = x.next[i]
+            if x is not self._head and x.key == key:
+                return passed - 1
+        return None
+
+    def _node_at(self, index: int) -> Optional[_Node]:
+        x, passed, target = self._head, 0, index + 1
+        for i in range(self._level - 1, -1, -1):
+            while x.next[i] is not None and passed + x.span[i] <= target:
+                passed += x.span[i]
+                x = x.next[i]
+            if passed == target:
+                return x
+        return None
+
+    def slice(self, start: int, count: int) -> list:
+        """(key, value) of the count entries from index start on"""
+        items = []
+        node = self._node_at(start) if 0 <= start < self._size else None
+        while node is not None and len(items) < count:
+            items.append((node.key, node.value))
+            node = node.next[0]
+        return items
+
+def encode_cursor(key) -> str:
+    score, user_id = key
+    return base64.urlsafe_b64encode(f"{-score!r}:{user_id}".encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str):
+    """Board key from a page cursor, ValueError if it is malformed"""
+    try:
+        score, user_id = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode().split(":", 1)
+        return (-float(score), user_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid leaderboard cursor '{cursor}'") from e
+
+
+def bucket_of(window: str, when: datetime) -> str:
+    """Bucket of a window that a UTC time falls in"""
+    if window == "daily":
+        return when.strftime("%Y-%m-%d")
+    if window == "weekly":
+        year, week, _ = when.isocalendar()
+        return f"{year}-W{week:02d}"
+    if window == ALL_TIME:
+        return ALL_TIME
+    raise ValueError(f"Unknown leaderboard window '{window}', expected one of {WINDOWS}")
+
+def next_rollover(when: datetime) -> datetime:
+    """Next UTC midnight, where daily (and on Mondays weekly) buckets change"""
+    return datetime(when.year, when.month, when.day) + timedelta(days=1)
+
+def entry_updates(
+    user_id: str, username: str, game_preset: str, result: dict, when: datetime,
+    windows: Iterable[str] = WINDOWS
+) -> List[UpdateOne]:
+    """
+    Upserts of one analysis into the leaderboard_entries of its preset and of
+    "all", one per window. Pipeline updates, so best_game_preset can follow
+    the best score: every expression reads the entry as it was before.
+    """
+    performance_score = result.get("performance_score", 0)
+    update = [{"$set": {
+        "username": {"$literal": username},  # User input: a leading "$" must not read a field
+        "latest_performance_score": performance_score,
+        "latest_reaction_time": result.get("estimated_reaction_time_ms", 0),
+        "latest_fps": result.get("video_fps", 0),
+        "best_game_preset": {
+            "$cond": [{"$gt": [performance_score, "$best_performance_score"]}, {"$literal": game_preset}, "$best_game_preset"]
+        },
+        "best_performance_score": {"$max": ["$best_performance_score", performance_score]},
+        "best_reaction_time": {"$min": ["$best_reaction_time", result.get("estimated_reaction_time_ms", 999)]},
+        "updated_at": when,
+        "created_at": {"$ifNull": ["$created_at", when]},
+    }}]
+    return [
+        UpdateOne(
+            {"user_id": user_id, "game_preset": preset, "window": window, "bucket": bucket_of(window, when)},
+            update, upsert=True
+        )
+        for window in windows
+        for preset in dict.fromkeys((game_preset, ALL_PRESETS))
+    ]
+
+class LeaderboardEngine:
+    def __init__(self):
+        self.buckets = {}  # window -> current bucket
+        self.entries = {}  # (user id, preset, window) -> entry
+        self.boards = {}  # (preset, window) -> RankedSkipList
+        self._rollover_task: Optional[asyncio.Task] = None
+        self.loaded = False
+
+    @staticmethod
+    def _key(entry: dict):
+        return (-entry["best_performance_score"], entry["user_id"])
+
+    def _link(self, entry: dict):
+        self.boards.setdefault((entry["game_preset"], entry["window"]), RankedSkipList()).insert(self._key(entry), entry)
+
+    def _add(self, entry: dict):
+        self.entries[(entry["user_id"], entry["game_preset"], entry["window"])] = entry
+        self._link(entry)
+
+    def _board(self, game_preset: str, window: str) -> Optional[RankedSkipList]:
+        bucket = bucket_of(window, datetime.utcnow())  # ValueError on an unknown window
+        if bucket > self.buckets.get(window, ""):
+            self.roll()
+        return self.boards.get((game_preset, window))
+
+    def bucket(self, window: str) -> Optional[str]:
+        return self.buckets.get(window)
+
+    def roll(self, now: Optional[datetime] = None) -> List[str]:
+        """Move every window whose bucket has ended to the bucket of now (empty boards)"""
+        now = now or datetime.utcnow()
+        rolled = []
+        for window in WINDOWS:
+            bucket = bucket_of(window, now)
+            if bucket <= self.buckets.get(window, ""):
+                continue
+            self.buckets[window] = bucket
+            self.boards = {key: board for key, board in self.boards.items() if key[1] != window}
+            self.entries = {key: entry for key, entry in self.entries.items() if key[2] != window}
+            rolled.append(window)
+        return rolled
+
+    async def load(self):
+        """Rebuild the boards of the current buckets, one index range scan per window"""
+        self.buckets = {}
+        self.entries = {}
+        self.boards = {}
+        self.roll()
+        collection = get_collection("leaderboard_entries")
+        if await collection.find_one({}, {"_id": 1}) is None:
+            sessions = await rebuild_entries(clear=False)
+            logger.info("leaderboard_entries was empty, rebuilt it from %d sessions", sessions)
+        for window, bucket in self.buckets.items():
+            cursor = collection.find({"window": window, "bucket": bucket}, ENTRY_FIELDS).sort(
+                [("game_preset", 1)] + BOARD_SORT
+            )
+            async for doc in cursor:
+                self._add({
+                    "user_id": doc["user_id"],
+                    "game_preset": doc["game_preset"],
+                    "window": window,
+                    "username": doc.get("username", "Anonymous"),
+                    "best_performance_score": doc.get("best_performance_score", 0),
+                    "best_reaction_time": doc.get("best_reaction_time", 0),
+                    "best_game_preset": doc.get("best_game_preset", doc["game_preset"]),
+                    "latest_fps": doc.get("latest_fps", 0),
+                    "updated_at": doc.get("updated_at") or datetime.utcnow(),
+                })
+        self.loaded = True
+        logger.info("Loaded leaderboard %s: %s", self.buckets, self.counts())
+
+    def record(self, user_id: str, username: str, game_preset: str, result: dict, when: datetime):
+        """Apply one analysis, like the entry_updates() of the same time do in MongoDB"""
+        self.roll(when)
+        performance_score = result.get("performance_score", 0)
+        reaction_time = result.get("estimated_reaction_time_ms", 999)
+        for window in WINDOWS:
+            if bucket_of(window, when) != self.buckets[window]:
+                continue  # Analysis of a bucket that has rolled over meanwhile
+            for preset in dict.fromkeys((game_preset, ALL_PRESETS)):
+                entry = self.entries.get((user_id, preset, window))
+                if entry is None:
+                    self._add({
+                        "user_id": user_id,
+                        "game_preset": preset,
+                        "window": window,
+                        "username": username,
+                        "best_performance_score": performance_score,
+                        "best_reaction_time": reaction_time,
+                        "best_game_preset": game_preset,
+                        "latest_fps": result.get("video_fps", 0),
+                        "updated_at": when,
+                    })
+                    continue
+                self.boards[(preset, window)].remove(self._key(entry))
+                if performance_score > entry["best_performance_score"]:
+                    entry["best_game_preset"] = game_preset
+                    entry["best_performance_score"] = performance_score
+                entry["best_reaction_time"] = min(entry["best_reaction_time"], reaction_time)
+                entry.update(username=username, latest_fps=result.get("video_fps", 0), updated_at=when)
+                self._link(entry)
+
+    async def prune(self) -> int:
+        """Delete the entries of past daily and weekly buckets"""
+        collection = get_collection("leaderboard_entries")
+        deleted = 0
+        for window, bucket in self.buckets.items():
+            if window != ALL_TIME:
+                result = await collection.delete_many({"window": window, "bucket": {"$lt": bucket}})
+                deleted += result.deleted_count
+        return deleted
+
+    async def rollover(self):
+        rolled = self.roll()
+        deleted = await self.prune()
+        if rolled or deleted:
+            logger.info("Leaderboard rollover: %s now %s, %d past entries deleted",
+                        ", ".join(rolled) or "no window", self.buckets, deleted)
+
+    async def _rollover_loop(self):
+        while True:
+            try:
+                await self.rollover()
+            except Exception:
+                logger.exception("Leaderboard rollover failed")
+            now = datetime.utcnow()
+            await asyncio.sleep((next_rollover(now) - now).total_seconds())
+
+    def start_rollover(self):
+        """Roll over (and prune what ended while the API was down) now, then every UTC midnight"""
+        if self._rollover_task is None:
+            self._rollover_task = asyncio.create_task(self._rollover_loop())
+
+    def stop_rollover(self):
+        if self._rollover_task is not None:
+            self._rollover_task.cancel()
+            self._rollover_task = None
+
+    def count(self, game_preset: str = ALL_PRESETS, window: str = ALL_TIME) -> int:
+        board = self._board(game_preset, window)
+        return len(board) if board is not None else 0
+
+    def counts(self, window: str = ALL_TIME) -> dict:
+        self._board(ALL_PRESETS, window)
+        return {preset: len(board) for (preset, board_window), board in self.boards.items()
+                if board_window == window and len(board)}
+
+    @staticmethod
+    def _ranked(items, first_rank: int) -> list:
+        return [{"rank": first_rank + i, **entry} for i, (_, entry) in enumerate(items)]
+
+    def page(self, game_preset: str = ALL_PRESETS, window: str = ALL_TIME, limit: int = 100,
+             cursor: Optional[str] = None):
+        """(ranked entries, cursor of the next page or None) - from the top or after cursor"""
+        board = self._board(game_preset, window)
+        if board is None:
+            return [], None
+        start = board.count_le(decode_cursor(cursor)) if cursor else 0
+        items = board.slice(start, limit)
+        next_cursor = encode_cursor(items[-1][0]) if items and start + len(items) < len(board) else None
+        return self._ranked(items, start + 1), next_cursor
+
+    def around(self, user_id: str, game_preset: str = ALL_PRESETS, window: str = ALL_TIME,
+               neighbors: int = 5) -> Optional[dict]:
+        """A user's rank and the entries up to neighbors places above and below, None if not on the board"""
+        board = self._board(game_preset, window)
+        entry = self.entries.get((user_id, game_preset, window))
+        if entry is None or board is None:
+            return None
+        index = board.rank(self._key(entry))
+        if index is None:
+            return None
+        start = max(0, index - neighbors)
+        return {
+            "rank": index + 1,
+            "count": len(board),
+            "entries": self._ranked(board.slice(start, index - start + neighbors + 1), start + 1),
+        }
+
+leaderboard = LeaderboardEngine()
+
+async def rebuild_entries(batch_size: int = 1000, clear: bool = True):
+    """
+    Rebuild leaderboard_entries from the analysis sessions (those with a
+    performance score, not the reaction tests): the all-time buckets from
+    every one, the daily and weekly ones from those of the current bucket.
+    The upserts are idempotent, so with clear=False (the collection is empty)
+    API processes starting together can each run it.
+    """
+    usernames = {}
+    async for user in get_collection("users").find({}, {"username": 1}):
+        usernames[str(user["_id"])] = user.get("username", "Anonymous")
+
+    collection = get_collection("leaderboard_entries")
+    if clear:
+        await collection.delete_many({})
+    now = datetime.utcnow()
+    operations, sessions = [], 0
+    cursor = get_collection("sessions").find({"performance_score": {"$exists": True}}, {
+        "user_id": 1, "game_preset": 1, "performance_score": 1, "estimated_reaction_time_ms": 1,
+        "video_fps": 1, "created_at": 1,
+    }).sort("_id", 1)  # ObjectIds follow insertion order, no sort in memory
+    async for session in cursor:
+        when = session.get("created_at")
+        if when is None:
+            continue
+        windows = [window for window in WINDOWS if bucket_of(window, when) == bucket_of(window, now)]
+        operations += entry_updates(
+            session["user_id"], usernames.get(session["user_id"], "Anonymous"),
+            session.get("game_preset", "unknown"), session, when, windows
+        )
+        sessions += 1
+        if len(operations) >= batch_size:
+            await collection.bulk_write(operations)
+            operations = []
+    if operations:
+        await collection.bulk_write(operations)
+    return sessions
+
+async def _main():
+    from database import connect_to_mongo, close_mongo_connection
+    await connect_to_mongo()
+    try:
+        sessions = await rebuild_entries()
+        print(f"Rebuilt leaderboard_entries from {sessions} sessions: "
+              f"{await get_collection('leaderboard_entries').count_documents({})} entries")
+    finally:
+        await close_mongo_connection()
+
+if __name__ == "__main__":
+    asyncio.run(_main())
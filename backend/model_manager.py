@@ -0,0 +1,71 @@
+"""
+YOLO model manager.
+
+Loading the detector (settings.detector_backend, see detectors.py) takes
+seconds - torch + ultralytics or an ONNX Runtime session - so it is only
+loaded where inference runs and only when it is first needed: nothing in the
+API process imports torch (auth, leaderboard and session routes start
+without it), the analysis worker processes load it in their pool
+initializer (see jobs.py).
+
+warm_up() runs one predict call on a blank frame after loading, so the first
+real batch does not also pay for the lazy one-time setup on the first call
+(layer fusing, allocator / kernel initialization).
+"""
+import threading
+import time
+from typing import Optional
+
+import numpy as np
+
+from config import settings
+from detection import detect_persons_batch, detection_params
+from detectors import create_detector
+from tracing import logger
+
+class ModelManager:
+    def __init__(self, backend: Optional[str] = None):
+        self.backend = backend or settings.detector_backend
+        self._model = None
+        self._lock = threading.Lock()  # Pipeline stages may ask for the model from several threads
+        self.load_sec: Optional[float] = None
+        self.warmup_sec: Optional[float] = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._model is not None
+
+    def get(self):
+        """The detector, loaded on first use"""
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    start = time.perf_counter()
+                    self._model = create_detector(self.backend)
+                    self.load_sec = time.perf_counter() - start
+                    logger.info("Loaded %s detector %s in %.2fs", self.backend, self._model.model_path, self.load_sec)
+        return self._model
+
+    def warm_up(self, width: int = 640, height: int = 360):
+        """Load the model and run one predict call on a blank frame"""
+        model = self.get()
+        if self.warmup_sec is None:
+            start = time.perf_counter()
+            detect_persons_batch(model, [np.zeros((height, width, 3), dtype=np.uint8)], **detection_params())
+            self.warmup_sec = time.perf_counter() - start
+            logger.info("Warmed up %s detector in %.2fs", self.backend, self.warmup_sec)
+        return model
+
+    def status(self) -> dict:
+        return {
+            "backend": self.backend,
+            "loaded": self.loaded,
+            "load_sec": round(self.load_sec, 3) if self.load_sec is not None else None,
+            "warmup_sec": round(self.warmup_sec, 3) if self.warmup_sec is not None else None,
+        }
+
+model_manager = ModelManager()
+
+def get_yolo_model():
+    """Get the YOLO model for this process, loading it on first use"""
+    return model_manager.get()
@@ -0,0 +1,110 @@
+"""
+Password hashing off the event loop.
+
+A bcrypt hash or verify takes 100-300 ms of CPU (settings.bcrypt_rounds),
+so login, register and create_admin_user hand it to a small thread pool
+(bcrypt releases the GIL while hashing) instead of stalling every other
+request on the event loop. At most settings.password_hash_workers hashes run
+at once; when settings.password_hash_queue calls are already waiting, new
+ones are rejected with 503, so a login burst turns into quick retries rather
+than an ever longer queue. status() reports the queue depth and the wait /
+hash times (see /api/admin/stats).
+
+Hashes with fewer rounds than settings.bcrypt_rounds are outdated:
+verify_and_update() returns a new hash for them, which login stores.
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional, Tuple
+
+from fastapi import HTTPException
+from passlib.context import CryptContext
+
+from config import settings
+
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=settings.bcrypt_rounds,
+    bcrypt__min_rounds=settings.bcrypt_rounds,  # Lower costs need an update
+)
+
+class PasswordHasher:
+    def __init__(self, workers: Optional[int] = None, max_queue: Optional[int] = None):
+        self.workers = workers or settings.password_hash_workers
+        self.max_queue = settings.password_hash_queue if max_queue is None else max_queue
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()  # Counters are updated from the worker threads too
+        self.queued = 0  # Waiting for a worker
+        self.running = 0
+        self.peak_queued = 0
+        self.completed = 0
+        self.rejected = 0
+        self.rehashed = 0
+        self._wait_sec = 0.0
+        self._hash_sec = 0.0
+
+    async def _run(self, fn: Callable, *args):
+        """Run fn(*args) on a hashing thread, 503 if too many calls are waiting"""
+        if self.queued >= self.max_queue:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=503,
+                detail="Too many logins at once, please try again in a moment",
+                headers={"Retry-After": "1"},
+            )
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password-hash")
+
+        def call():
+            started = time.perf_counter()
+            with self._lock:
+                self.queued -= 1
+                self.running += 1
+            try:
+                return fn(*args), started, time.perf_counter()
+            finally:
+                with self._lock:
+                    self.running -= 1
+
+        with self._lock:
+            self.queued += 1
+            self.peak_queued = max(self.peak_queued, self.queued)
+        submitted = time.perf_counter()
+        result, started, finished = await asyncio.wrap_future(self._executor.submit(call))
+        with self._lock:
+            self.completed += 1
+            self._wait_sec += started - submitted
+            self._hash_sec += finished - started
+        return result
+
+    async def hash(self, password: str) -> str:
+        return await self._run(pwd_context.hash, password)
+
+    async def verify_and_update(self, password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """(password matches, new hash if the stored one is outdated else None)"""
+        return await self._run(pwd_context.verify_and_update, password, hashed_password)
+
+    def status(self) -> dict:
+        completed = max(self.completed, 1)
+        return {
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "queued": self.queued,
+            "running": self.running,
+            "peak_queued": self.peak_queued,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "rehashed": self.rehashed,
+            "avg_wait_ms": round(self._wait_sec / completed * 1000, 1),
+            "avg_hash_ms": round(self._hash_sec / completed * 1000, 1),
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,252 @@
+"""
+Threaded frame pipeline.
+
+Each stage runs on its own thread and hands frames to the next one through
+a bounded queue, so decoding, motion, YOLO and encoding overlap instead of
+waiting on each other (OpenCV and torch release the GIL while they work).
+The bounded queues keep at most queue_size frames in flight per stage.
+
+    pipe = FramePipeline()
+    decoded = pipe.source("decode", read_frames(cap))
+    moving = pipe.stage("motion", iter_motion, decoded)
+    frames = pipe.consume("track", moving)
+    writer = pipe.sink("encode", out.write)
+    for item in frames:
+        ...
+        writer.put(frame)
+    pipe.close()
+
+If the loop over frames raises or breaks, the other stages are stopped as
+soon as that iterator is closed.
+
+With threaded=False the same stages run lazily in the calling thread, which
+gives the sequential baseline with the same timing counters (wait_in is then
+the time spent running the previous stages).
+"""
+import queue
+import threading
+import time
+
+_END = object()  # Marks the end of a stage's output
+
+class _StageError:
+    """Carries an exception from a stage thread to the next stage"""
+    def __init__(self, exc: BaseException):
+        self.exc = exc
+
+class StageStats:
+    """Per-stage timing counters"""
+    def __init__(self, name: str):
+        self.name = name
+        self.frames = 0
+        self.busy_s = 0.0  # Time spent doing the stage's own work
+        self.wait_in_s = 0.0  # Time blocked waiting for the previous stage
+        self.wait_out_s = 0.0  # Time blocked because the next stage was full
+
+    def to_dict(self) -> dict:
+        return {
+            "frames": self.frames,
+            "busy_ms": round(self.busy_s * 1000, 1),
+            "wait_in_ms": round(self.wait_in_s * 1000, 1),
+            "wait_out_ms": round(self.wait_out_s * 1000, 1),
+            "ms_per_frame": round(self.busy_s * 1000 / self.frames, 3) if self.frames else 0.0,
+        }
+
+class FramePipeline:
+    def __init__(self, queue_size: int = 16, threaded: bool = True):
+        self.queue_size = max(1, int(queue_size))
+        self.threaded = threaded
+        self.stages = {}  # name -> StageStats, in pipeline order
+        self._threads = []
+        self._sinks = []
+        self._stop = threading.Event()
+        self._started = time.perf_counter()
+
+    def _register(self, name: str) -> StageStats:
+        stats = StageStats(name)
+        self.stages[name] = stats
+        return stats
+
+    def _put(self, q: queue.Queue, item, stats: StageStats) -> bool:
+        """Put with back-pressure; gives up once the pipeline is closed"""
+        start = time.perf_counter()
+        try:
+            while not self._stop.is_set():
+                try:
+                    q.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+        finally:
+            stats.wait_out_s += time.perf_counter() - start
+
+    def _input(self, upstream, stats: StageStats):
+        """Iterate over the previous stage, counting the time spent waiting for it"""
+        if not self.threaded:
+            iterator = iter(upstream)
+            while True:
+                start = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    stats.wait_in_s += time.perf_counter() - start
+                yield item
+
+        while True:
+            start = time.perf_counter()
+            item = _END
+            while not self._stop.is_set():
+                try:
+                    item = upstream.get(timeout=0.1)
+                    break
+                except queue.Empty:
+                    continue
+            stats.wait_in_s += time.perf_counter() - start
+            if item is _END:
+                return
+            if isinstance(item, _StageError):
+                raise item.exc
+            yield item
+
+    def _timed(self, iterator, stats: StageStats):
+        """Count the time spent producing each item, minus the time waiting for input"""
+        iterator = iter(iterator)
+        while True:
+            waited = stats.wait_in_s
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                stats.busy_s += time.perf_counter() - start - (stats.wait_in_s - waited)
+            stats.frames += 1
+            yield item
+
+    def _spawn(self, name: str, iterator, stats: StageStats) -> queue.Queue:
+        q = queue.Queue(maxsize=self.queue_size)
+
+        def run():
+            try:
+                for item in self._timed(iterator, stats):
+                    if not self._put(q, item, stats):
+                        return
+                self._put(q, _END, stats)
+            except BaseException as e:
+                self._put(q, _StageError(e), stats)
+
+        thread = threading.Thread(target=run, name=f"pipeline-{name}", daemon=True)
+        thread.start()
+        self._threads.append(thread)
+        return q
+
+    def source(self, name: str, iterable):
+        """First stage: produces items from an iterable (e.g. decoded frames)"""
+        stats = self._register(name)
+        if not self.threaded:
+            return self._timed(iterable, stats)
+        return self._spawn(name, iterable, stats)
+
+    def stage(self, name: str, fn, upstream):
+        """Middle stage: fn(iterator over upstream items) returns an iterator of output items"""
+        stats = self._register(name)
+        iterator = fn(self._input(upstream, stats))
+        if not self.threaded:
+            return self._timed(iterator, stats)
+        return self._spawn(name, iterator, stats)
+
+    def consume(self, name: str, upstream):
+        """Stage run by the calling thread: returns an iterator over the upstream items"""
+        stats = self._register(name)
+        return self._consume(self._input(upstream, stats), stats)
+
+    def _consume(self, items, stats: StageStats):
+        finished = False
+        try:
+            for item in items:
+                stats.frames += 1
+                out_waited = stats.wait_out_s
+                start = time.perf_counter()
+                yield item
+                # The caller's loop body is this stage's work
+                stats.busy_s += time.perf_counter() - start - (stats.wait_out_s - out_waited)
+            finished = True
+        finally:
+            if not finished:
+                # The caller's loop raised or broke out - stop the other threads
+                self._stop.set()
+
+    def sink(self, name: str, fn):
+        """
+        Final stage: returns a writer whose put(item) hands items to fn on the
+        sink thread. Back-pressure is charged to the stage registered before it.
+        """
+        producer = list(self.stages.values())[-1] if self.stages else StageStats("caller")
+        writer = _SinkWriter(self, name, fn, self._register(name), producer)
+        self._sinks.append(writer)
+        return writer
+
+    def close(self):
+        """Flush the sinks and stop every stage thread"""
+        try:
+            for writer in self._sinks:
+                writer.close()
+        finally:
+            self._stop.set()
+            for thread in self._threads:
+                thread.join()
+            self._threads = []
+
+    def stats(self) -> dict:
+        """Timing counters of every stage plus the wall time"""
+        return {
+            "threaded": self.threaded,
+            "wall_ms": round((time.perf_counter() - self._started) * 1000, 1),
+            "stages": {name: stats.to_dict() for name, stats in self.stages.items()},
+        }
+
+class _SinkWriter:
+    def __init__(self, pipeline: FramePipeline, name: str, fn, stats: StageStats, producer: StageStats):
+        self.pipeline = pipeline
+        self.fn = fn
+        self.stats = stats
+        self.producer = producer
+        self.error = None
+        self._queue = None
+        if pipeline.threaded:
+            self._queue = queue.Queue(maxsize=pipeline.queue_size)
+            self._thread = threading.Thread(target=self._run, name=f"pipeline-{name}", daemon=True)
+            self._thread.start()
+
+    def _call(self, item):
+        start = time.perf_counter()
+        self.fn(item)
+        self.stats.busy_s += time.perf_counter() - start
+        self.stats.frames += 1
+
+    def _run(self):
+        for item in self.pipeline._input(self._queue, self.stats):
+            if self.error is None:
+                try:
+                    self._call(item)
+                except BaseException as e:
+                    self.error = e  # Keep draining so put() never blocks forever
+
+    def put(self, item):
+        if self.error is not None:
+            raise self.error
+        if self._queue is None:
+            self._call(item)
+        else:
+            self.pipeline._put(self._queue, item, self.producer)
+
+    def close(self):
+        if self._queue is not None:
+            self.pipeline._put(self._queue, _END, self.producer)
+            self._thread.join()
+            self._queue = None
+        if self.error is not None:
+            raise self.error
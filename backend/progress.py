@@ -0,0 +1,79 @@
+"""
+Progress events of a running analysis.
+
+analyze_video_path reports through a ProgressReporter: at most one event
+every settings.progress_interval_sec (and a last one when the video is
+done), each a small dict:
+
+    {"frames_processed", "total_frames", "percent", "elapsed_sec",
+     "frames_per_sec", "eta_sec", "encounters", "eliminations",
+     "timeline": [...]}
+
+"timeline" holds the timeline points added since the previous event
+(downsampled to settings.progress_chunk_points, see timeline.py), so a
+client that keeps every event has the whole timeline at reduced resolution
+before the result arrives. The reporter only reads the analysis loop's own
+counters; events go to a callback (the job queue forwards them from the
+worker process to the API process, see jobs.py).
+"""
+import time
+from typing import Callable, Optional
+
+from config import settings
+from timeline import TimelineBuilder
+
+class ProgressReporter:
+    def __init__(
+        self,
+        send: Callable[[dict], None],
+        total_frames: int,
+        fps: float,
+        interval_sec: Optional[float] = None,
+        chunk_points: Optional[int] = None,
+    ):
+        self.send = send
+        self.total_frames = max(0, total_frames)
+        self.fps = fps
+        self.interval_sec = settings.progress_interval_sec if interval_sec is None else interval_sec
+        self.chunk_points = settings.progress_chunk_points if chunk_points is None else chunk_points
+        self.started = time.monotonic()
+        self.last_sent = self.started
+        self.sent_entries = 0  # Timeline entries already sent
+
+    def update(self, frames_processed: int, timeline: TimelineBuilder, encounters: int, eliminations: int):
+        """Called once per frame; sends an event when the interval has passed"""
+        now = time.monotonic()
+        if now - self.last_sent >= self.interval_sec:
+            self._send(now, frames_processed, timeline, encounters, eliminations)
+
+    def finish(self, frames_processed: int, timeline: TimelineBuilder, encounters: int, eliminations: int):
+        """Send the last event (the rest of the timeline, eta 0)"""
+        self._send(time.monotonic(), frames_processed, timeline, encounters, eliminations, done=True)
+
+    def _send(self, now, frames_processed, timeline, encounters, eliminations, done=False):
+        elapsed = now - self.started
+        rate = frames_processed / elapsed if elapsed > 0 else 0.0
+        # The container's frame count is an estimate; never report more than 99% before the end
+        total = max(self.total_frames, frames_processed)
+        if done:
+            percent, eta = 100.0, 0.0
+        elif total > 0:
+            percent = min(99.0, 100.0 * frames_processed / total)
+            eta = (total - frames_processed) / rate if rate > 0 else None
+        else:
+            percent, eta = None, None
+
+        chunk = timeline.build(self.fps, self.sent_entries).downsample(self.chunk_points)
+        self.sent_entries = len(timeline)
+        self.last_sent = now
+        self.send({
+            "frames_processed": frames_processed,
+            "total_frames": total,
+            "percent": round(percent, 1) if percent is not None else None,
+            "elapsed_sec": round(elapsed, 2),
+            "frames_per_sec": round(rate, 1),
+            "eta_sec": round(eta, 1) if eta is not None else None,
+            "encounters": encounters,
+            "eliminations": eliminations,
+            "timeline": chunk.to_points(),
+        })
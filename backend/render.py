@@ -0,0 +1,231 @@
+"""
+Annotated video rendering.
+
+Analysis does not draw or encode anything. It records what to draw on every
+frame (boxes, track ids, player flag, velocity, the info overlay) in an
+AnnotationRecorder, saved as a small .npz in the tracks directory. The
+annotated video is rendered from that record and the source video the first
+time it is requested (see main.py), and served from the output directory
+after that.
+"""
+import os
+import uuid
+from typing import Optional
+
+import cv2
+import numpy as np
+
+from config import settings
+from detection import read_frames
+from pipeline import FramePipeline
+
+def tracks_path(video_filename: str) -> str:
+    """Where the annotations of an annotated video are stored"""
+    return os.path.join(settings.tracks_dir, f"{video_filename}.npz")
+
+def annotated_video_url(video_filename: str) -> str:
+    return f"/download-video/{video_filename}"
+
+class AnnotationRecorder:
+    """Per-frame drawing instructions, stored flat (frame_offsets index the person arrays)"""
+
+    def __init__(self):
+        self.frame_offsets = [0]
+        self.player_ids = []  # Locked player after each frame (0 = none yet)
+        self.boxes = []  # [x1, y1, x2, y2]
+        self.conf = []
+        self.player_score = []
+        self.velocity = []  # [vx, vy]
+        self.is_player = []
+
+    def add_person(self, x1, y1, x2, y2, conf, player_score, velocity_x, velocity_y, is_player):
+        self.boxes.append((x1, y1, x2, y2))
+        self.conf.append(conf)
+        self.player_score.append(player_score)
+        self.velocity.append((velocity_x, velocity_y))
+        self.is_player.append(is_player)
+
+    def end_frame(self, player_id: Optional[int]):
+        self.frame_offsets.append(len(self.boxes))
+        self.player_ids.append(player_id or 0)
+
+    def save(self, path: str, source_path: str, fps: float, width: int, height: int):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        np.savez_compressed(
+            path,
+            source=np.array(os.path.abspath(source_path)),
+            fps=np.float64(fps),
+            size=np.array([width, height], dtype=np.int32),
+            frame_offsets=np.array(self.frame_offsets, dtype=np.int64),
+            player_ids=np.array(self.player_ids, dtype=np.int64),
+            boxes=np.array(self.boxes, dtype=np.int32).reshape(-1, 4),
+            conf=np.array(self.conf, dtype=np.float64),
+            player_score=np.array(self.player_score, dtype=np.float64),
+            velocity=np.array(self.velocity, dtype=np.float64).reshape(-1, 2),
+            is_player=np.array(self.is_player, dtype=bool),
+        )
+
+def draw_person(frame, frame_number, x1, y1, x2, y2, conf, player_score, velocity_x, velocity_y, is_player):
+    """Box, label, confidence, distance and movement arrow of one person"""
+    box_center_x = (x1 + x2) / 2
+    box_center_y = (y1 + y2) / 2
+    estimated_distance = 1000 / ((y2 - y1) + 1)
+
+    # Choose color based on player/enemy
+    if is_player:
+        color = (0, 255, 0)  # Green for player
+        label = f"YOU"  # Simplified - no ID shown
+        thickness = 3
+    else:
+        # Red for enemies
+        color = (0, 0, 255)  # Red for enemy
+        label = f"ENEMY"  # Simplified - no ID shown to avoid confusion from ID changes
+        thickness = 2
+
+    # Draw main bounding box
+    cv2.rectangle(frame, (x1, y1), (x2, y2), color, thickness)
+
+    # Draw label background
+    label_size = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.6, 2)[0]
+    cv2.rectangle(
+        frame,
+        (x1, y1 - label_size[1] - 10),
+        (x1 + label_size[0] + 10, y1),
+        color,
+        -1  # Filled
+    )
+
+    # Draw label text
+    cv2.putText(
+        frame,
+        label,
+        (x1 + 5, y1 - 5),
+        cv2.FONT_HERSHEY_SIMPLEX,
+        0.6,
+        (255, 255, 255),  # White text
+        2
+    )
+
+    # Draw confidence score
+    conf_text = f"{conf:.0%}"
+    cv2.putText(
+        frame,
+        conf_text,
+        (x1, y2 + 20),
+        cv2.FONT_HERSHEY_SIMPLEX,
+        0.5,
+        color,
+        2
+    )
+
+    # DEBUG: Show player score for first 30 frames to help verify detection
+    if frame_number <= 30 and not is_player:
+        score_text = f"Score: {player_score:.0f}"
+        cv2.putText(
+            frame,
+            score_text,
+            (x1, y1 - 30),
+            cv2.FONT_HERSHEY_SIMPLEX,
+            0.4,
+            (255, 255, 0),  # Yellow
+            1
+        )
+
+    # Draw distance indicator (for enemies)
+    if not is_player:
+        dist_text = f"{estimated_distance:.0f}m"
+        cv2.putText(
+            frame,
+            dist_text,
+            (x1, y2 + 40),
+            cv2.FONT_HERSHEY_SIMPLEX,
+            0.5,
+            (255, 255, 0),  # Yellow
+            2
+        )
+
+    # Draw velocity arrow (movement prediction)
+    if abs(velocity_x) > 2 or abs(velocity_y) > 2:
+        arrow_end_x = int(box_center_x + velocity_x * 3)
+        arrow_end_y = int(box_center_y + velocity_y * 3)
+        cv2.arrowedLine(
+            frame,
+            (int(box_center_x), int(box_center_y)),
+            (arrow_end_x, arrow_end_y),
+            (255, 255, 0),  # Yellow arrow
+            2,
+            tipLength=0.3
+        )
+
+    # Draw center dot
+    cv2.circle(frame, (int(box_center_x), int(box_center_y)), 3, color, -1)
+
+def draw_frame_info(frame, frame_number, player_id, persons_in_frame, fps):
+    """Frame info overlay with player detection status"""
+    player_detected_text = f"Player: ID {player_id}" if player_id else "Player: Detecting..."
+    info_text = f"Frame: {frame_number} | {player_detected_text} | Enemies: {persons_in_frame - (1 if player_id else 0)} | FPS: {fps:.1f}"
+    cv2.rectangle(frame, (10, 10), (600, 40), (0, 0, 0), -1)
+    cv2.putText(frame, info_text, (15, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 2)
+
+def iter_annotated_frames(frames, annotations):
+    """Draw the recorded annotations onto the decoded frames"""
+    offsets = annotations["frame_offsets"]
+    boxes = annotations["boxes"].tolist()
+    conf = annotations["conf"].tolist()
+    player_score = annotations["player_score"].tolist()
+    velocity = annotations["velocity"].tolist()
+    is_player = annotations["is_player"].tolist()
+    player_ids = annotations["player_ids"].tolist()
+    fps = float(annotations["fps"])
+
+    for idx, frame in enumerate(frames):
+        if idx < len(player_ids):
+            start, end = int(offsets[idx]), int(offsets[idx + 1])
+            for i in range(start, end):
+                x1, y1, x2, y2 = boxes[i]
+                draw_person(frame, idx + 1, x1, y1, x2, y2, conf[i], player_score[i],
+                            velocity[i][0], velocity[i][1], is_player[i])
+            draw_frame_info(frame, idx + 1, player_ids[idx], end - start, fps)
+        yield frame
+
+def render_annotated_video(video_filename: str, threaded: Optional[bool] = None) -> Optional[str]:
+    """
+    Render output_dir/video_filename from its stored annotations.
+    Returns the output path, or None if there are no annotations or the source video is gone.
+    decode / draw / encode run on their own threads (see pipeline.py).
+    """
+    path = tracks_path(video_filename)
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as data:
+        annotations = {key: data[key] for key in data.files}
+
+    cap = cv2.VideoCapture(str(annotations["source"]))
+    if not cap.isOpened():
+        return None
+
+    if threaded is None:
+        threaded = settings.pipeline_threaded
+    width, height = (int(v) for v in annotations["size"])
+    output_path = os.path.join(settings.output_dir, video_filename)
+    # Encode to a temporary file so a half-written video is never served
+    tmp_path = os.path.join(settings.output_dir, f".{uuid.uuid4().hex}_{video_filename}")
+    out = cv2.VideoWriter(tmp_path, cv2.VideoWriter_fourcc(*"mp4v"), float(annotations["fps"]), (width, height))
+
+    pipe = FramePipeline(settings.pipeline_queue_size, threaded)
+    decoded = pipe.source("decode", read_frames(cap))
+    drawn = pipe.stage("draw", lambda frames: iter_annotated_frames(frames, annotations), decoded)
+    encoded = False
+    try:
+        for frame in pipe.consume("encode", drawn):
+            out.write(frame)
+        encoded = True
+    finally:
+        pipe.close()
+        cap.release()
+        out.release()
+        if not encoded and os.path.exists(tmp_path):
+            os.remove(tmp_path)  # Do not leave a partial video in the output directory
+
+    os.replace(tmp_path, output_path)
+    return output_path
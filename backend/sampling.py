@@ -0,0 +1,203 @@
+"""
+Frame-stride / adaptive sampling for person detection.
+
+Instead of running YOLO on every frame, the sampler detects every k-th
+frame and switches to every frame:
+- for a short window after a motion spike (cv2.absdiff between frames)
+- between two detected frames whose person count differs, so encounter and
+  elimination frames are still exact
+
+Boxes for the frames in between are linearly interpolated, so the tracker,
+timeline and annotated video still get one set of boxes per frame.
+"""
+import cv2
+import numpy as np
+
+from config import settings
+from detection import detect_persons_batch, iter_batched_detections
+
+SAMPLING_MODES = ("full", "adaptive")
+
+def interpolate_boxes(boxes_a, boxes_b, t):
+    """
+    Interpolate between two (n, 5) box arrays at fraction t (0 = a, 1 = b).
+    Boxes are paired greedily by nearest center; unpaired boxes from a are
+    kept for the first half of the gap and unpaired boxes from b appear in
+    the second half.
+    """
+    if len(boxes_a) == 0 or len(boxes_b) == 0:
+        return boxes_a if t < 0.5 else boxes_b
+
+    centers_a = (boxes_a[:, :2] + boxes_a[:, 2:4]) / 2
+    centers_b = (boxes_b[:, :2] + boxes_b[:, 2:4]) / 2
+    dist = np.linalg.norm(centers_a[:, None, :] - centers_b[None, :, :], axis=2)
+    # Only pair boxes that moved less than their own size
+    max_dist = np.maximum(boxes_a[:, 2] - boxes_a[:, 0], boxes_a[:, 3] - boxes_a[:, 1])[:, None]
+    dist[dist > np.maximum(max_dist, 50)] = np.inf
+
+    pairs = []
+    used_a, used_b = set(), set()
+    for flat_idx in np.argsort(dist, axis=None):
+        i, j = np.unravel_index(flat_idx, dist.shape)
+        if not np.isfinite(dist[i, j]):
+            break
+        if i in used_a or j in used_b:
+            continue
+        used_a.add(i)
+        used_b.add(j)
+        pairs.append((i, j))
+
+    out = [boxes_a[i] * (1 - t) + boxes_b[j] * t for i, j in sorted(pairs)]
+    if t < 0.5:
+        out.extend(boxes_a[i] for i in range(len(boxes_a)) if i not in used_a)
+    else:
+        out.extend(boxes_b[j] for j in range(len(boxes_b)) if j not in used_b)
+
+    if not out:
+        return np.zeros((0, 5), dtype=np.float32)
+    return np.array(out, dtype=np.float32)
+
+def create_sampler(mode=None):
+    """Build the sampler for a sampling mode (defaults to the configured mode)"""
+    mode = mode or settings.detection_sampling
+    if mode not in SAMPLING_MODES:
+        raise ValueError(f"Unknown sampling mode '{mode}', expected one of {SAMPLING_MODES}")
+    if mode == "full":
+        return FullSampler()
+    return AdaptiveSampler(
+        stride=settings.sampling_stride,
+        motion_threshold=settings.sampling_motion_threshold,
+        dense_window=settings.sampling_dense_window,
+    )
+
+class BaseSampler:
+    mode = None
+    stride = 1
+
+    def __init__(self):
+        self.total_frames = 0
+        self.detected_frames = 0
+        self.cache_hit = False  # Set when detections came from detection_cache
+
+    def cache_tag(self) -> str:
+        """Identifies the sampling settings in detection cache keys"""
+        return self.mode
+
+    def stats(self) -> dict:
+        return {
+            "mode": self.mode,
+            "stride": self.stride,
+            "total_frames": self.total_frames,
+            "detected_frames": self.detected_frames,
+            "detected_ratio": round(self.detected_frames / self.total_frames, 3) if self.total_frames else 0.0,
+            "cache_hit": self.cache_hit,
+        }
+
+class FullSampler(BaseSampler):
+    """Runs detection on every frame"""
+    mode = "full"
+
+    def iter_detections(self, frames, model, batch_size=8, **predict_kwargs):
+        for frame, boxes in iter_batched_detections(frames, model, batch_size, **predict_kwargs):
+            self.total_frames += 1
+            self.detected_frames += 1
+            yield frame, boxes
+
+class AdaptiveSampler(BaseSampler):
+    """Runs detection every stride frames, densely around motion spikes and person count changes"""
+    mode = "adaptive"
+
+    def __init__(self, stride=3, motion_threshold=10.0, dense_window=15):
+        super().__init__()
+        self.stride = max(1, int(stride))
+        self.motion_threshold = motion_threshold
+        self.dense_window = dense_window
+
+    def cache_tag(self) -> str:
+        return f"adaptive-{self.stride}-{self.motion_threshold}-{self.dense_window}"
+
+    def iter_detections(self, frames, model, batch_size=8, **predict_kwargs):
+        """
+        Yield (frame, person_boxes) for an iterable of frames in frame order,
+        like detection.iter_batched_detections, but only running YOLO on
+        sampled frames.
+        """
+        batch_size = max(1, int(batch_size))
+        frames = iter(frames)
+        anchor_boxes = None  # Boxes of the last detected frame already yielded
+        prev_small = None
+        since_key = 0
+        dense_left = 0
+        eof = False
+
+        while not eof:
+            # Read frames until batch_size of them are picked for detection
+            pending = []  # [frame, boxes or None]
+            key_indexes = []
+            while len(key_indexes) < batch_size:
+                frame = next(frames, None)
+                if frame is None:
+                    eof = True
+                    break
+
+                small = cv2.cvtColor(cv2.resize(frame, (160, 90)), cv2.COLOR_BGR2GRAY)
+                if prev_small is not None:
+                    if np.mean(cv2.absdiff(small, prev_small)) > self.motion_threshold:
+                        dense_left = self.dense_window
+                prev_small = small
+
+                since_key += 1
+                is_key = (anchor_boxes is None and not key_indexes) or dense_left > 0 or since_key >= self.stride
+                if dense_left > 0:
+                    dense_left -= 1
+                if is_key:
+                    since_key = 0
+                    key_indexes.append(len(pending))
+                pending.append([frame, None])
+
+            if not pending:
+                return
+
+            # Always detect the last frame so every gap has two ends
+            if key_indexes[-1:] != [len(pending) - 1]:
+                key_indexes.append(len(pending) - 1)
+
+            self._detect(model, pending, key_indexes, batch_size, predict_kwargs)
+
+            # Person count changed between two samples - detect every frame in between
+            refine = []
+            prev_boxes, prev_idx = anchor_boxes, -1
+            for idx in key_indexes:
+                boxes = pending[idx][1]
+                if prev_boxes is not None and len(boxes) != len(prev_boxes):
+                    refine.extend(range(prev_idx + 1, idx))
+                prev_boxes, prev_idx = boxes, idx
+            if refine:
+                self._detect(model, pending, refine, batch_size, predict_kwargs)
+                key_indexes = sorted(set(key_indexes) | set(refine))
+
+            # Stay dense while the person count keeps changing
+            if len(key_indexes) > 1 and len(pending[key_indexes[-1]][1]) != len(pending[key_indexes[-2]][1]):
+                dense_left = self.dense_window
+
+            # Interpolate boxes for frames that were not detected
+            prev_boxes, prev_idx = anchor_boxes, -1
+            for idx in key_indexes:
+                boxes = pending[idx][1]
+                gap = idx - prev_idx
+                for between in range(prev_idx + 1, idx):
+                    pending[between][1] = interpolate_boxes(prev_boxes, boxes, (between - prev_idx) / gap)
+                prev_boxes, prev_idx = boxes, idx
+
+            self.total_frames += len(pending)
+            for frame, boxes in pending:
+                yield frame, boxes
+            anchor_boxes = pending[-1][1]
+
+    def _detect(self, model, pending, indexes, batch_size, predict_kwargs):
+        for start in range(0, len(indexes), batch_size):
+            chunk = indexes[start:start + batch_size]
+            results = detect_persons_batch(model, [pending[i][0] for i in chunk], **predict_kwargs)
+            for i, boxes in zip(chunk, results):
+                pending[i][1] = boxes
+            self.detected_frames += len(chunk)
@@ -0,0 +1,193 @@
+"""
+Columnar analysis timeline.
+
+One entry per analyzed frame, stored as numpy columns (frame, time,
+persons, motion) plus the detections of every frame in CSR layout: the
+detections of entry i are rows det_offsets[i]:det_offsets[i + 1] of the
+det_* columns. Analysis fills a TimelineBuilder (typed arrays, no
+per-frame dicts) and saves the full timeline as an .npz in
+settings.timeline_dir.
+
+Clients get the list-of-dicts shape ({frame, time, persons, motion,
+detections}) from to_points, usually after downsample(max_points): each
+point then stands for a run of consecutive frames and shows the busiest
+of them (its persons and detections) with the run's mean motion, so
+spikes survive any resolution.
+"""
+import io
+import math
+import os
+from array import array
+from typing import Optional
+
+import numpy as np
+
+from config import settings
+
+COLUMNS = ("frame", "time", "persons", "motion")
+DETECTION_COLUMNS = ("det_id", "det_x", "det_y", "det_conf", "det_is_player")
+
+def timeline_path(name: str) -> str:
+    return os.path.join(settings.timeline_dir, f"timeline_{name}.npz")
+
+def _column(values: array, lo: int, hi: Optional[int], dtype) -> np.ndarray:
+    """values[lo:hi] as a numpy array, copied once (memoryview slices do not copy)"""
+    return np.array(memoryview(values)[lo:hi], dtype=dtype)
+
+class TimelineBuilder:
+    """Collects a timeline frame by frame; add a frame's detections, then the frame"""
+
+    def __init__(self):
+        self.frame = array("q")
+        self.time = array("d")
+        self.persons = array("i")
+        self.motion = array("d")
+        self.det_offsets = array("q", [0])
+        self.det_id = array("i")
+        self.det_x = array("i")
+        self.det_y = array("i")
+        self.det_conf = array("f")  # Detector confidences are float32
+        self.det_is_player = array("b")
+
+    def add_detection(self, x: int, y: int, confidence: float, person_id: int = -1, is_player: bool = False):
+        self.det_id.append(person_id)
+        self.det_x.append(x)
+        self.det_y.append(y)
+        self.det_conf.append(confidence)
+        self.det_is_player.append(is_player)
+
+    def add_frame(self, frame: int, time: float, persons: int, motion: float):
+        """Close a frame; the detections added since the previous frame belong to it"""
+        self.frame.append(frame)
+        self.time.append(time)
+        self.persons.append(persons)
+        self.motion.append(motion)
+        self.det_offsets.append(len(self.det_x))
+
+    def __len__(self):
+        return len(self.frame)
+
+    def build(self, fps: float = 0.0, start: int = 0) -> "Timeline":
+        """The timeline so far, from entry start on (start > 0 for incremental chunks)"""
+        first, last = self.det_offsets[start], self.det_offsets[-1]
+        return Timeline(
+            frame=_column(self.frame, start, None, np.int64),
+            time=_column(self.time, start, None, np.float64),
+            persons=_column(self.persons, start, None, np.int32),
+            motion=_column(self.motion, start, None, np.float64),
+            det_offsets=_column(self.det_offsets, start, None, np.int64) - first,
+            det_id=_column(self.det_id, first, last, np.int32),
+            det_x=_column(self.det_x, first, last, np.int32),
+            det_y=_column(self.det_y, first, last, np.int32),
+            det_conf=_column(self.det_conf, first, last, np.float32),
+            det_is_player=_column(self.det_is_player, first, last, bool),
+            fps=fps,
+        )
+
+class Timeline:
+    def __init__(self, frame, time, persons, motion, det_offsets,
+                 det_id, det_x, det_y, det_conf, det_is_player, fps=0.0):
+        self.frame = frame
+        self.time = time
+        self.persons = persons
+        self.motion = motion
+        self.det_offsets = det_offsets
+        self.det_id = det_id
+        self.det_x = det_x
+        self.det_y = det_y
+        self.det_conf = det_conf
+        self.det_is_player = det_is_player
+        self.fps = fps
+
+    def __len__(self):
+        return len(self.frame)
+
+    def _take(self, idx, motion=None) -> "Timeline":
+        """Timeline of the entries at idx (sorted), with their detections"""
+        starts, ends = self.det_offsets[idx], self.det_offsets[idx + 1]
+        counts = ends - starts
+        offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        rows = np.repeat(starts - offsets[:-1], counts) + np.arange(offsets[-1])
+        return Timeline(
+            self.frame[idx], self.time[idx], self.persons[idx],
+            self.motion[idx] if motion is None else motion, offsets,
+            self.det_id[rows], self.det_x[rows], self.det_y[rows],
+            self.det_conf[rows], self.det_is_player[rows], self.fps
+        )
+
+    def window(self, start_frame: Optional[int] = None, end_frame: Optional[int] = None) -> "Timeline":
+        """Entries with start_frame <= frame <= end_frame"""
+        lo = 0 if start_frame is None else int(np.searchsorted(self.frame, start_frame, side="left"))
+        hi = len(self) if end_frame is None else int(np.searchsorted(self.frame, end_frame, side="right"))
+        return self._take(np.arange(lo, max(lo, hi)))
+
+    def downsample(self, max_points: Optional[int]) -> "Timeline":
+        """
+        At most max_points entries: runs of ceil(len / max_points) frames,
+        each shown as its busiest frame with the mean motion of the run.
+        """
+        n = len(self)
+        if not max_points or n <= max_points:
+            return self
+        step = math.ceil(n / max_points)
+        starts = np.arange(0, n, step)
+        padded = np.full(len(starts) * step, -1, dtype=np.int64)
+        padded[:n] = self.persons
+        busiest = starts + padded.reshape(-1, step).argmax(axis=1)
+        run_lengths = np.diff(np.append(starts, n))
+        mean_motion = np.add.reduceat(self.motion, starts) / run_lengths
+        return self._take(busiest, mean_motion)
+
+    def to_points(self) -> list:
+        """The timeline as a list of {frame, time, persons, motion, detections} dicts"""
+        offsets = self.det_offsets.tolist()
+        det_id, det_x, det_y = self.det_id.tolist(), self.det_x.tolist(), self.det_y.tolist()
+        det_conf, det_is_player = self.det_conf.tolist(), self.det_is_player.tolist()
+        points = []
+        for i, (frame, time, persons, motion) in enumerate(zip(
+            self.frame.tolist(), self.time.tolist(), self.persons.tolist(), self.motion.tolist()
+        )):
+            points.append({
+                'frame': frame,
+                'time': time,
+                'persons': persons,
+                'motion': motion,
+                'detections': [
+                    {
+                        'id': det_id[j],
+                        'x': det_x[j],
+                        'y': det_y[j],
+                        'confidence': det_conf[j],
+                        'is_player': det_is_player[j]
+                    }
+                    for j in range(offsets[i], offsets[i + 1])
+                ]
+            })
+        return points
+
+    def _arrays(self) -> dict:
+        arrays = {name: getattr(self, name) for name in COLUMNS + DETECTION_COLUMNS}
+        arrays["det_offsets"] = self.det_offsets
+        arrays["fps"] = np.float64(self.fps)
+        return arrays
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        np.savez_compressed(path, **self._arrays())
+
+    def to_bytes(self) -> bytes:
+        buffer = io.BytesIO()
+        np.savez_compressed(buffer, **self._arrays())
+        return buffer.getvalue()
+
+    @classmethod
+    def load(cls, source) -> "Timeline":
+        """Load from an .npz path or file object"""
+        with np.load(source) as data:
+            arrays = {key: data[key] for key in data.files}
+        arrays["fps"] = float(arrays["fps"])
+        return cls(**arrays)
+
+    @classmethod
+    def from_bytes(cls, blob: bytes) -> "Timeline":
+        return cls.load(io.BytesIO(blob))
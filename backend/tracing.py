@@ -0,0 +1,96 @@
+"""
+Logging and per-job tracing for the analysis pipeline.
+
+- Process-level messages go through the standard logging module
+  (logger "lagskill", level settings.log_level).
+- Per-frame debug output (tracker decisions) goes to a Tracer. The default
+  NULL_TRACER is disabled, so the hot loop only pays for one check
+  (tracer.enabled or tracer.should_record). A request can turn it on to get
+  a JSONL trace file for its job.
+
+Trace events have a level; events below the tracer's level are dropped and
+debug events are sampled (only every sample_every-th one of each kind is
+written), so a trace of a long video stays small.
+"""
+import json
+import logging
+import os
+import time
+from collections import defaultdict
+from typing import Optional
+
+from config import settings
+
+LEVELS = {"debug": logging.DEBUG, "info": logging.INFO, "warning": logging.WARNING}
+
+logger = logging.getLogger("lagskill")
+
+def configure_logging():
+    """Set up the lagskill logger (called once per process)"""
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s [%(process)d] %(message)s"))
+        logger.addHandler(handler)
+        logger.propagate = False
+    logger.setLevel(settings.log_level.upper())
+
+class Tracer:
+    def __init__(self, path: Optional[str] = None, level: str = "debug", sample_every: int = 1):
+        self.path = path
+        self.enabled = path is not None
+        self.level = LEVELS[level]
+        self.sample_every = max(1, int(sample_every))
+        self.events_written = 0
+        self._seen = defaultdict(int)  # Debug events seen per kind, for sampling
+        self._file = None
+        if self.enabled:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._file = open(path, "w", buffering=1024 * 1024)
+        self._started = time.perf_counter()
+
+    @property
+    def filename(self) -> Optional[str]:
+        return os.path.basename(self.path) if self.path else None
+
+    def should_record(self, level: str, kind: str) -> bool:
+        """
+        Whether the next event of this kind would be written (counts it for
+        sampling). Check it before building an expensive event, then call write().
+        """
+        if not self.enabled:
+            return False
+        level_no = LEVELS[level]
+        if level_no < self.level:
+            return False
+        if level_no == logging.DEBUG:
+            self._seen[kind] += 1
+            return (self._seen[kind] - 1) % self.sample_every == 0
+        return True
+
+    def event(self, level: str, kind: str, frame: int, **fields):
+        """Write one trace event, unless it is filtered out by level or sampling"""
+        if self.should_record(level, kind):
+            self.write(level, kind, frame, **fields)
+
+    def write(self, level: str, kind: str, frame: int, **fields):
+        record = {
+            "t_ms": round((time.perf_counter() - self._started) * 1000, 2),
+            "level": level,
+            "event": kind,
+            "frame": frame,
+        }
+        record.update(fields)
+        self._file.write(json.dumps(record) + "\n")
+        self.events_written += 1
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+NULL_TRACER = Tracer()
+
+def create_tracer(name: str) -> Tracer:
+    """Tracer writing to trace_{name}.jsonl in the trace directory, with the configured level and sampling"""
+    path = os.path.join(settings.trace_dir, f"trace_{name}.jsonl")
+    return Tracer(path, settings.trace_level, settings.trace_sample_every)
@@ -0,0 +1,299 @@
+"""
+Person tracker for the analysis pipeline.
+
+Each frame, the detections are matched to the active tracks in one step:
+a numpy score matrix (center distance, area ratio and IoU) over the tracks
+seen in the last max_age frames, solved with optimal (Hungarian) assignment.
+Tracks that were not seen for max_age frames expire, so the work per frame
+depends on how many people are on screen, not on how long the video is.
+
+The locked player is a track like the others, with its own rules:
+- it is matched by distance alone, and only while seen in the last player_max_age frames
+- if it is not matched, the largest box in the frame is taken as the player
+"""
+from typing import List, Optional
+
+import numpy as np
+
+from tracing import NULL_TRACER, Tracer
+
+INVALID = -1.0  # Score of detection / track pairs that must not be matched
+
+def linear_sum_assignment(cost):
+    """
+    Minimum cost assignment for a 2D cost matrix (Hungarian algorithm,
+    O(n^2 m)). Returns (row_indexes, col_indexes) like scipy's function.
+    """
+    cost = np.asarray(cost, dtype=np.float64)
+    transposed = cost.shape[0] > cost.shape[1]
+    if transposed:
+        cost = cost.T
+    n, m = cost.shape
+    if n == 0:
+        return np.zeros(0, dtype=int), np.zeros(0, dtype=int)
+
+    # Potentials method, rows 1..n assigned one at a time (column 0 is a dummy)
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    col_row = np.zeros(m + 1, dtype=int)  # Row assigned to each column (0 = none)
+    way = np.zeros(m + 1, dtype=int)
+    for i in range(1, n + 1):
+        col_row[0] = i
+        j0 = 0
+        min_v = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+        while True:
+            used[j0] = True
+            i0 = col_row[j0]
+            free = ~used[1:]
+            reduced = cost[i0 - 1] - u[i0] - v[1:]
+            better = free & (reduced < min_v[1:])
+            min_v[1:][better] = reduced[better]
+            way[1:][better] = j0
+            candidates = np.where(free, min_v[1:], np.inf)
+            j1 = int(np.argmin(candidates)) + 1
+            delta = candidates[j1 - 1]
+            u[col_row[used]] += delta
+            v[used] -= delta
+            min_v[1:][free] -= delta
+            j0 = j1
+            if col_row[j0] == 0:
+                break
+        while j0:
+            j1 = way[j0]
+            col_row[j0] = col_row[j1]
+            j0 = j1
+
+    cols = np.nonzero(col_row[1:])[0]
+    rows = col_row[1:][cols] - 1
+    order = np.argsort(rows)
+    rows, cols = rows[order], cols[order]
+    if transposed:
+        rows, cols = cols, rows
+        order = np.argsort(rows)
+        rows, cols = rows[order], cols[order]
+    return rows, cols
+
+def box_iou(boxes_a, boxes_b):
+    """Pairwise IoU of two (n, 4+) and (m, 4+) box arrays"""
+    x1 = np.maximum(boxes_a[:, None, 0], boxes_b[None, :, 0])
+    y1 = np.maximum(boxes_a[:, None, 1], boxes_b[None, :, 1])
+    x2 = np.minimum(boxes_a[:, None, 2], boxes_b[None, :, 2])
+    y2 = np.minimum(boxes_a[:, None, 3], boxes_b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (boxes_a[:, 2] - boxes_a[:, 0]) * (boxes_a[:, 3] - boxes_a[:, 1])
+    area_b = (boxes_b[:, 2] - boxes_b[:, 0]) * (boxes_b[:, 3] - boxes_b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - inter
+    return np.where(union > 0, inter / np.maximum(union, 1e-6), 0.0)
+
+class Track:
+    """
+    One tracked person. Only the last HISTORY positions are kept, in a numpy
+    ring buffer; with trajectory_stride > 0 every n-th position is also kept
+    for the whole track (for reporting).
+    """
+    __slots__ = (
+        "id", "first_seen", "last_seen", "box", "last_area", "player_score", "is_player",
+        "num_positions", "_history", "trajectory_stride", "trajectory"
+    )
+    HISTORY = 8
+
+    def __init__(self, track_id: int, frame: int, trajectory_stride: int = 0):
+        self.id = track_id
+        self.first_seen = frame
+        self.last_seen = frame
+        self.box = None  # Last x1, y1, x2, y2
+        self.last_area = 0.0
+        self.player_score = 0.0
+        self.is_player = False
+        self.num_positions = 0  # Frames the track was matched in
+        self._history = np.zeros((self.HISTORY, 3))  # x, y, frame
+        self.trajectory_stride = trajectory_stride
+        self.trajectory = [] if trajectory_stride > 0 else None  # [frame, x, y]
+
+    def update(self, box, frame: int):
+        x1, y1, x2, y2 = (int(v) for v in box[:4])
+        center_x, center_y = (x1 + x2) / 2, (y1 + y2) / 2
+        self._history[self.num_positions % self.HISTORY] = (center_x, center_y, frame)
+        if self.trajectory is not None and self.num_positions % self.trajectory_stride == 0:
+            self.trajectory.append([frame, int(center_x), int(center_y)])
+        self.num_positions += 1
+        self.box = (x1, y1, x2, y2)
+        self.last_area = (x2 - x1) * (y2 - y1)
+        self.last_seen = frame
+
+    def position(self, back: int = 0):
+        """(x, y, frame) of the back-th most recent position (0 = latest), or None"""
+        if back >= min(self.num_positions, self.HISTORY):
+            return None
+        x, y, frame = self._history[(self.num_positions - 1 - back) % self.HISTORY]
+        return float(x), float(y), int(frame)
+
+class PersonTracker:
+    def __init__(
+        self,
+        max_distance: float = 300,
+        max_age: int = 15,
+        player_max_age: int = 10,
+        min_score: float = 30,
+        trajectory_stride: int = 0,
+        tracer: Tracer = NULL_TRACER
+    ):
+        self.max_distance = max_distance  # Pixels a person can move between sightings
+        self.max_age = max_age  # Frames a track stays matchable after it was last seen
+        self.player_max_age = player_max_age
+        self.min_score = min_score  # Lowest match score (0-100) that continues a track
+        self.trajectory_stride = trajectory_stride  # Keep every n-th position per track (0 = off)
+        self.finished_trajectories = {}  # Track id -> trajectory of expired tracks
+        self.tracer = tracer  # Receives the matching decisions (see tracing.py)
+        self.active: List[Track] = []
+        self.player: Optional[Track] = None
+        self.total_tracks = 0
+
+    @property
+    def player_id(self) -> Optional[int]:
+        return self.player.id if self.player is not None else None
+
+    def _new_track(self, frame: int) -> Track:
+        self.total_tracks += 1
+        track = Track(self.total_tracks, frame, self.trajectory_stride)
+        self.active.append(track)
+        if self.tracer.enabled:
+            self.tracer.event("info", "new_track", frame, track_id=track.id)
+        return track
+
+    def _expire(self, frame: int):
+        active = []
+        for track in self.active:
+            if track.last_seen >= frame - self.max_age:
+                active.append(track)
+                continue
+            if track.trajectory is not None and track is not self.player:
+                self.finished_trajectories[track.id] = track.trajectory
+            if self.tracer.enabled:
+                self.tracer.event("info", "track_expired", frame, track_id=track.id, last_seen=track.last_seen)
+        self.active = active
+
+    def trajectories(self) -> dict:
+        """Downsampled trajectory of every track so far ({} unless trajectory_stride is set)"""
+        if not self.trajectory_stride:
+            return {}
+        result = dict(self.finished_trajectories)
+        for track in self.active + ([self.player] if self.player is not None else []):
+            result[track.id] = track.trajectory
+        return {str(track_id): result[track_id] for track_id in sorted(result)}
+
+    def match_scores(self, boxes, tracks: List[Track], frame: int):
+        """
+        (detections, tracks) match scores from 0 to 100, INVALID where the
+        pair is too far apart or the track is too old.
+        Center distance counts 60%, IoU 20% and area ratio 20%.
+        """
+        if len(boxes) == 0 or len(tracks) == 0:
+            return np.zeros((len(boxes), len(tracks)))
+        track_boxes = np.array([t.box for t in tracks], dtype=np.float64)
+        det_boxes = np.floor(boxes[:, :4]).astype(np.float64)
+
+        det_centers = (det_boxes[:, :2] + det_boxes[:, 2:4]) / 2
+        track_centers = (track_boxes[:, :2] + track_boxes[:, 2:4]) / 2
+        dist = np.hypot(*(det_centers[:, None, :] - track_centers[None, :, :]).transpose(2, 0, 1))
+        distance_score = np.maximum(0, 100 - dist / 3)
+
+        det_area = (det_boxes[:, 2] - det_boxes[:, 0]) * (det_boxes[:, 3] - det_boxes[:, 1])
+        track_area = np.array([t.last_area for t in tracks], dtype=np.float64)
+        size_diff = np.abs(det_area[:, None] - track_area[None, :]) / np.maximum(track_area[None, :], 1)
+        size_score = np.maximum(0, 100 - size_diff * 100)
+
+        iou_score = box_iou(det_boxes, track_boxes) * 100
+        scores = distance_score * 0.6 + iou_score * 0.2 + size_score * 0.2
+
+        last_seen = np.array([t.last_seen for t in tracks])
+        max_age = np.array([self.player_max_age if t is self.player else self.max_age for t in tracks])
+        valid = (dist < self.max_distance) & (last_seen >= frame - max_age)[None, :]
+        # The player is matched by distance alone
+        is_player = np.array([t is self.player for t in tracks])
+        scores[:, is_player] = distance_score[:, is_player]
+        valid &= (scores > self.min_score) | is_player[None, :]
+        return np.where(valid, scores, INVALID)
+
+    def update(self, boxes, frame: int) -> List[Track]:
+        """
+        Match an (n, 5) array of person boxes to tracks and return the track
+        of every box. Boxes that match no track start a new one.
+        """
+        self._expire(frame)
+        tracks = list(self.active)
+        if self.player is not None and self.player not in tracks:
+            tracks.append(self.player)
+        assigned: List[Optional[Track]] = [None] * len(boxes)
+        player_match = None
+
+        scores = self.match_scores(boxes, tracks, frame)
+        if scores.size:
+            # The player column wins any conflict with other tracks for the same box
+            priority = np.array([1000.0 if t is self.player else 0.0 for t in tracks])
+            gain = np.where(scores > INVALID, scores + priority[None, :], -1e6)
+            best = np.argmax(gain, axis=1)
+            matched = gain[np.arange(len(boxes)), best] > INVALID
+            if len(np.unique(best[matched])) == matched.sum():
+                # Every box prefers a different track - that is already the optimal assignment
+                pairs = zip(np.nonzero(matched)[0], best[matched])
+            else:
+                pairs = zip(*linear_sum_assignment(-gain))
+            for det_idx, track_idx in pairs:
+                if scores[det_idx, track_idx] > INVALID:
+                    assigned[det_idx] = tracks[track_idx]
+                    if tracks[track_idx] is self.player:
+                        player_match = "distance"
+
+        if self.player is not None and len(boxes) and self.player not in assigned:
+            # Player not matched by distance - the largest box is the player
+            areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+            largest = int(np.argmax(areas))
+            assigned[largest] = self.player
+            player_match = "largest_box"
+            if self.player not in self.active:
+                self.active.append(self.player)
+
+        if self.tracer.should_record("debug", "assign"):
+            track_index = {id(t): i for i, t in enumerate(tracks)}
+            self.tracer.write(
+                "debug", "assign", frame,
+                tracks=[t.id if t is not None else None for t in assigned],
+                scores=[
+                    round(float(scores[det_idx, track_index[id(t)]]), 1) if t is not None else None
+                    for det_idx, t in enumerate(assigned)
+                ],
+                player_id=self.player_id,
+                player_match=player_match,
+            )
+
+        for det_idx, track in enumerate(assigned):
+            if track is None:
+                track = assigned[det_idx] = self._new_track(frame)
+            track.update(boxes[det_idx], frame)
+        return assigned
+
+    def lock_player(self, frame: int, recent: int = 3, min_score: float = 50) -> Optional[Track]:
+        """
+        Lock the active track with the highest player score (seen in the last
+        recent frames) as the player, if it scores above min_score.
+        """
+        if self.player is not None:
+            return self.player
+        candidates = [t for t in self.active if t.last_seen >= frame - recent]
+        if not candidates:
+            return None
+        scores = np.array([t.player_score for t in candidates])
+        best = int(np.argmax(scores))
+        if scores[best] > min_score:
+            self.player = candidates[best]
+            self.player.is_player = True
+            if self.tracer.enabled:
+                self.tracer.event(
+                    "info", "player_locked", frame,
+                    track_id=self.player.id,
+                    score=round(float(scores[best]), 1),
+                    candidates={t.id: round(float(t.player_score), 1) for t in candidates},
+                )
+        return self.player
@@ -0,0 +1,512 @@
+"""
+Streaming upload ingestion for the video endpoints.
+
+The multipart body is parsed straight from request.stream() instead of
+letting Starlette spool it first, so while the client is still uploading:
+- chunks are written to a unique path in the upload directory (off the event loop)
+- the sha256 content hash is computed (used by the detection cache)
+- the container header is probed and the size limit enforced, so bad or
+  oversized files are rejected before the rest of the body is received
+
+ingest_batch_upload does the same for every file of a batch upload (several
+videos and / or zips of videos); files that fail the checks are reported
+instead of failing the whole batch.
+
+Uploads stay on disk only while something may still read them: routes
+remove_upload() them once their job is done, unless the annotated video may
+still be rendered from them (see render.py). Those are kept, and
+prune_uploads() deletes the oldest once the directory grows past
+settings.upload_retention_mb.
+"""
+import asyncio
+import hashlib
+import os
+import re
+import time
+import uuid
+import zipfile
+import zlib
+from typing import List, Optional
+
+from fastapi import HTTPException, Request
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ImportError:  # python-multipart < 0.0.13
+    from multipart.multipart import MultipartParser, parse_options_header
+
+from config import settings
+
+FLUSH_SIZE = 1024 * 1024  # Bytes buffered before each disk write
+PROBE_SIZE = 16  # Bytes needed to recognize the container
+
+# OpenAPI request body for routes that take a video via ingest_upload
+UPLOAD_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "properties": {"file": {"type": "string", "format": "binary"}},
+                    "required": ["file"],
+                }
+            }
+        },
+    }
+}
+
+class IngestedUpload:
+    def __init__(self, path: str, filename: str, content_hash: str, size: int):
+        self.path = path
+        self.filename = filename  # Original client filename (for display)
+        self.content_hash = content_hash
+        self.size = size
+
+    @property
+    def stored_name(self) -> str:
+        """Unique name on disk, safe to derive output filenames from"""
+        return os.path.basename(self.path)
+
+def probe_container(header: bytes) -> bool:
+    """Check the first bytes of a file for a video container we can decode"""
+    if len(header) >= 8 and header[4:8] == b"ftyp":  # MP4 / MOV / M4V
+        return True
+    if header[:4] == b"\x1a\x45\xdf\xa3":  # Matroska / WebM
+        return True
+    if header[:4] == b"RIFF" and header[8:12] == b"AVI ":  # AVI
+        return True
+    if header[:3] == b"FLV":
+        return True
+    return False
+
+def safe_filename(filename: str) -> str:
+    """Strip directories and unusual characters from a client filename"""
+    name = os.path.basename(filename.replace("\\", "/")) or "video"
+    return re.sub(r"[^A-Za-z0-9._-]", "_", name)
+
+def remove_upload(path: str):
+    """Delete an upload that no job or render needs anymore"""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+def prune_uploads(max_bytes: Optional[int] = None, keep_sec: Optional[float] = None):
+    """
+    Delete the oldest uploads until the upload directory fits in max_bytes.
+    Uploads younger than keep_sec (default: the job retention) are kept, their
+    job may still be queued.
+    """
+    if max_bytes is None:
+        max_bytes = settings.upload_retention_mb * 1024 * 1024
+    if keep_sec is None:
+        keep_sec = settings.job_retention_minutes * 60
+    entries = []
+    with os.scandir(settings.upload_dir) as it:
+        for entry in it:
+            if entry.name.startswith(".") or not entry.is_file():
+                continue  # .part files are uploads in progress
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+    total = sum(size for _, size, _ in entries)
+    cutoff = time.time() - keep_sec
+    for mtime, size, path in sorted(entries):
+        if total <= max_bytes or mtime > cutoff:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass
+
+def _write_chunk(f, data: bytes):
+    f.write(data)
+
+class _UploadWriter:
+    """python-multipart callbacks that capture one file field"""
+    def __init__(self, field_name: str, max_bytes: int):
+        self.field_name = field_name
+        self.max_bytes = max_bytes
+        self.digest = hashlib.sha256()
+        self.size = 0
+        self.filename = None
+        self.probed = False
+        self.finished = False
+        self.pending = bytearray()
+        self._headers = {}
+        self._header_field = b""
+        self._header_value = b""
+        self._in_file = False
+
+    def callbacks(self) -> dict:
+        return {
+            "on_part_begin": self.on_part_begin,
+            "on_header_field": self.on_header_field,
+            "on_header_value": self.on_header_value,
+            "on_header_end": self.on_header_end,
+            "on_headers_finished": self.on_headers_finished,
+            "on_part_data": self.on_part_data,
+            "on_part_end": self.on_part_end,
+        }
+
+    def on_part_begin(self):
+        self._headers = {}
+
+    def on_header_field(self, data, start, end):
+        self._header_field += data[start:end]
+
+    def on_header_value(self, data, start, end):
+        self._header_value += data[start:end]
+
+    def on_header_end(self):
+        self._headers[self._header_field.lower()] = self._header_value
+        self._header_field = b""
+        self._header_value = b""
+
+    def on_headers_finished(self):
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        name = options.get(b"name", b"").decode("utf-8", "replace")
+        self._in_file = name == self.field_name and self.filename is None and b"filename" in options
+        if self._in_file:
+            self.filename = options[b"filename"].decode("utf-8", "replace")
+
+    def on_part_data(self, data, start, end):
+        if not self._in_file:
+            return
+        chunk = data[start:end]
+        self.size += len(chunk)
+        if self.size > self.max_bytes:
+            raise HTTPException(
+                status_code=413,
+                detail=f"Video is larger than the {settings.max_upload_mb} MB limit"
+            )
+        self.digest.update(chunk)
+        self.pending += chunk
+
+    def on_part_end(self):
+        if self._in_file:
+            self._in_file = False
+            self.finished = True
+
+async def ingest_upload(request: Request, field_name: str = "file") -> IngestedUpload:
+    """
+    Stream a multipart video upload to a unique file in the upload directory.
+    Raises HTTPException 400/413/415 as soon as the upload is known to be bad.
+    """
+    max_bytes = settings.max_upload_mb * 1024 * 1024
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > max_bytes + 64 * 1024:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Video is larger than the {settings.max_upload_mb} MB limit"
+        )
+
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    boundary = params.get(b"boundary")
+    if content_type != b"multipart/form-data" or not boundary:
+        raise HTTPException(status_code=400, detail="Expected a multipart/form-data upload")
+
+    writer = _UploadWriter(field_name, max_bytes)
+    parser = MultipartParser(boundary, writer.callbacks())
+
+    os.makedirs(settings.upload_dir, exist_ok=True)
+    part_path = os.path.join(settings.upload_dir, f".{uuid.uuid4().hex}.part")
+    f = await asyncio.to_thread(open, part_path, "wb")
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+
+            if not writer.probed and (len(writer.pending) >= PROBE_SIZE or writer.finished):
+                if not probe_container(bytes(writer.pending[:PROBE_SIZE])):
+                    raise HTTPException(
+                        status_code=415,
+                        detail="Unsupported file type. Upload an MP4, MOV, MKV, WebM or AVI video."
+                    )
+                writer.probed = True
+
+            if writer.probed and len(writer.pending) >= FLUSH_SIZE:
+                data, writer.pending = bytes(writer.pending), bytearray()
+                await asyncio.to_thread(_write_chunk, f, data)
+
+        parser.finalize()
+        if writer.filename is None or writer.size == 0:
+            raise HTTPException(status_code=400, detail=f"No video uploaded in the '{field_name}' field")
+        if not writer.probed:
+            raise HTTPException(
+                status_code=415,
+                detail="Unsupported file type. Upload an MP4, MOV, MKV, WebM or AVI video."
+            )
+
+        if writer.pending:
+            await asyncio.to_thread(_write_chunk, f, bytes(writer.pending))
+        await asyncio.to_thread(f.close)
+
+        filename = safe_filename(writer.filename)
+        path = os.path.join(settings.upload_dir, f"{uuid.uuid4().hex[:12]}_{filename}")
+        await asyncio.to_thread(os.replace, part_path, path)
+    except BaseException:
+        await asyncio.to_thread(f.close)
+        if os.path.exists(part_path):
+            await asyncio.to_thread(os.remove, part_path)
+        raise
+
+    await asyncio.to_thread(prune_uploads)
+    return IngestedUpload(path, writer.filename, writer.digest.hexdigest(), writer.size)
+
+# ==================== BATCH UPLOADS ====================
+
+# OpenAPI request body for routes that take several videos / zips via ingest_batch_upload
+BATCH_UPLOAD_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "properties": {
+                        "files": {"type": "array", "items": {"type": "string", "format": "binary"}}
+                    },
+                    "required": ["files"],
+                }
+            }
+        },
+    }
+}
+
+ZIP_COPY_SIZE = 1024 * 1024  # Bytes per read when extracting a zip member
+
+def probe_zip(header: bytes) -> bool:
+    return header[:4] == b"PK\x03\x04"
+
+class _FilePart:
+    """One file of a batch upload, streamed to its own .part file"""
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.digest = hashlib.sha256()
+        self.size = 0
+        self.pending = bytearray()
+        self.probed = False
+        self.is_zip = False
+        self.finished = False
+        self.rejected: Optional[str] = None
+        self.part_path = os.path.join(settings.upload_dir, f".{uuid.uuid4().hex}.part")
+        self.file = None
+
+class _BatchUploadWriter(_UploadWriter):
+    """python-multipart callbacks that capture every file of the given fields"""
+    def __init__(self, field_names, max_bytes: int, max_files: int):
+        super().__init__(field_names[0], max_bytes)
+        self.field_names = field_names
+        self.max_files = max_files
+        self.parts: List[_FilePart] = []
+        self._part: Optional[_FilePart] = None
+
+    def on_headers_finished(self):
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        name = options.get(b"name", b"").decode("utf-8", "replace")
+        self._part = None
+        if name in self.field_names and b"filename" in options:
+            if len(self.parts) >= self.max_files:
+                raise HTTPException(status_code=413, detail=f"At most {self.max_files} videos per batch")
+            self._part = _FilePart(options[b"filename"].decode("utf-8", "replace"))
+            self.parts.append(self._part)
+
+    def on_part_data(self, data, start, end):
+        part = self._part
+        if part is None or part.rejected:
+            return
+        chunk = data[start:end]
+        part.size += len(chunk)
+        self.size += len(chunk)
+        if self.size > self.max_bytes:
+            raise HTTPException(status_code=413, detail=f"Batch is larger than the {settings.batch_max_mb} MB limit")
+        if part.size > settings.max_upload_mb * 1024 * 1024 and not part.is_zip:
+            part.rejected = f"Video is larger than the {settings.max_upload_mb} MB limit"
+            return
+        part.digest.update(chunk)
+        part.pending += chunk
+
+    def on_part_end(self):
+        if self._part is not None:
+            self._part.finished = True
+            self._part = None
+
+async def _flush_part(part: _FilePart):
+    """Probe, write and (once complete) close one batch file"""
+    if part.rejected:
+        part.pending = bytearray()
+        if part.file is not None:
+            await asyncio.to_thread(part.file.close)
+            part.file = None
+            await asyncio.to_thread(os.remove, part.part_path)
+        return
+    if not part.probed and (len(part.pending) >= PROBE_SIZE or part.finished):
+        header = bytes(part.pending[:PROBE_SIZE])
+        part.is_zip = probe_zip(header)
+        if not part.is_zip and not probe_container(header):
+            part.rejected = "Unsupported file type. Upload MP4, MOV, MKV, WebM or AVI videos, or a zip of them."
+            part.pending = bytearray()
+            return
+        part.probed = True
+    if part.probed and (len(part.pending) >= FLUSH_SIZE or (part.finished and part.pending)):
+        if part.file is None:
+            part.file = await asyncio.to_thread(open, part.part_path, "wb")
+        data, part.pending = bytes(part.pending), bytearray()
+        await asyncio.to_thread(_write_chunk, part.file, data)
+    if part.finished and part.file is not None:
+        await asyncio.to_thread(part.file.close)
+        part.file = None
+
+def _store(part_path: str, filename: str) -> str:
+    """Move a finished .part file to its unique upload path"""
+    path = os.path.join(settings.upload_dir, f"{uuid.uuid4().hex[:12]}_{safe_filename(filename)}")
+    os.replace(part_path, path)
+    return path
+
+def _copy_member(archive, member, part_path: str, max_bytes: int, budget: int):
+    """Copy a zip member to part_path, hashing it: (sha256 hex, size, error or None)"""
+    digest, size = hashlib.sha256(), 0
+    with archive.open(member) as src:  # Encrypted / unsupported members raise before the .part exists
+        chunk = src.read(PROBE_SIZE)
+        if not probe_container(chunk):
+            return None, 0, "Not a supported video"
+        with open(part_path, "wb") as dst:
+            while chunk:
+                size += len(chunk)
+                if size > max_bytes:  # file_size can lie
+                    return None, size, f"Video is larger than the {settings.max_upload_mb} MB limit"
+                if size > budget:
+                    return None, size, f"Batch is larger than the {settings.batch_max_mb} MB limit once extracted"
+                digest.update(chunk)
+                dst.write(chunk)
+                chunk = src.read(ZIP_COPY_SIZE)
+    return digest.hexdigest(), size, None
+
+def _extract_zip(zip_path: str, zip_name: str, max_files: int, max_total: int):
+    """
+    Extract the videos of a zip to unique upload paths, hashing them on the way.
+    Returns (uploads, rejected); other members are rejected, not extracted.
+    At most max_total bytes are extracted in all (a few KB of zip can inflate
+    to GBs): members that do not fit anymore are rejected. On an unexpected
+    error the videos extracted so far are deleted before it is raised.
+    """
+    max_bytes = settings.max_upload_mb * 1024 * 1024
+    extracted = 0
+    uploads, rejected = [], []
+    try:
+        archive = zipfile.ZipFile(zip_path)
+    except zipfile.BadZipFile:
+        return [], [{"filename": zip_name, "error": "Not a valid zip archive"}]
+    part_path = None
+    try:
+        with archive:
+            for member in archive.infolist():
+                name = os.path.basename(member.filename)
+                if member.is_dir() or name.startswith(".") or member.filename.startswith("__MACOSX/"):
+                    continue
+                filename = f"{zip_name}/{member.filename}"
+                if len(uploads) >= max_files:
+                    rejected.append({"filename": filename, "error": f"At most {max_files} videos per batch"})
+                    continue
+                if member.file_size > max_bytes:
+                    rejected.append({"filename": filename, "error": f"Video is larger than the {settings.max_upload_mb} MB limit"})
+                    continue
+                if extracted + member.file_size > max_total:
+                    rejected.append({
+                        "filename": filename,
+                        "error": f"Batch is larger than the {settings.batch_max_mb} MB limit once extracted",
+                    })
+                    continue
+                part_path = os.path.join(settings.upload_dir, f".{uuid.uuid4().hex}.part")
+                try:
+                    digest, size, error = _copy_member(archive, member, part_path, max_bytes, max_total - extracted)
+                except (zipfile.BadZipFile, zlib.error, EOFError, RuntimeError, NotImplementedError) as e:
+                    digest, size, error = None, 0, f"Could not extract: {e}"  # Corrupt / encrypted member
+                if error is not None:
+                    if os.path.exists(part_path):
+                        os.remove(part_path)
+                    rejected.append({"filename": filename, "error": error})
+                    continue
+                path = _store(part_path, name)
+                uploads.append(IngestedUpload(path, filename, digest, size))
+                extracted += size
+    except BaseException:
+        if part_path is not None and os.path.exists(part_path):
+            os.remove(part_path)
+        for upload in uploads:  # Not handed over to the batch yet
+            if os.path.exists(upload.path):
+                os.remove(upload.path)
+        raise
+    return uploads, rejected
+
+async def ingest_batch_upload(request: Request, field_names=("files", "file")):
+    """
+    Stream a multipart upload of several videos and / or zips of videos to the
+    upload directory. Returns (uploads, rejected): an IngestedUpload per video
+    and {"filename", "error"} for every file that was left out (wrong type,
+    too large). Raises HTTPException 400/413 for the batch as a whole.
+    """
+    max_bytes = settings.batch_max_mb * 1024 * 1024
+    max_files = settings.batch_max_videos
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > max_bytes + 64 * 1024:
+        raise HTTPException(status_code=413, detail=f"Batch is larger than the {settings.batch_max_mb} MB limit")
+
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    boundary = params.get(b"boundary")
+    if content_type != b"multipart/form-data" or not boundary:
+        raise HTTPException(status_code=400, detail="Expected a multipart/form-data upload")
+
+    writer = _BatchUploadWriter(field_names, max_bytes, max_files)
+    parser = MultipartParser(boundary, writer.callbacks())
+    os.makedirs(settings.upload_dir, exist_ok=True)
+    uploads, rejected = [], []
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+            for part in writer.parts:
+                await _flush_part(part)
+        parser.finalize()
+        for part in writer.parts:
+            await _flush_part(part)
+
+        # Videos from zips share what the uploaded videos leave of the batch limit
+        extract_budget = max_bytes - sum(
+            part.size for part in writer.parts if not part.rejected and not part.is_zip
+        )
+        for part in writer.parts:
+            if part.rejected or part.size == 0:
+                rejected.append({"filename": part.filename, "error": part.rejected or "Empty file"})
+            elif part.is_zip:
+                zip_uploads, zip_rejected = await asyncio.to_thread(
+                    _extract_zip, part.part_path, part.filename, max_files - len(uploads), extract_budget
+                )
+                extract_budget -= sum(upload.size for upload in zip_uploads)
+                uploads += zip_uploads
+                rejected += zip_rejected
+            elif len(uploads) >= max_files:  # Zips before it used up the batch
+                rejected.append({"filename": part.filename, "error": f"At most {max_files} videos per batch"})
+            else:
+                path = await asyncio.to_thread(_store, part.part_path, part.filename)
+                uploads.append(IngestedUpload(path, part.filename, part.digest.hexdigest(), part.size))
+    except BaseException:
+        for upload in uploads:
+            if os.path.exists(upload.path):
+                await asyncio.to_thread(os.remove, upload.path)
+        raise
+    finally:
+        for part in writer.parts:
+            if part.file is not None:
+                await asyncio.to_thread(part.file.close)
+            if os.path.exists(part.part_path):
+                await asyncio.to_thread(os.remove, part.part_path)
+
+    if not writer.parts:
+        raise HTTPException(status_code=400, detail=f"No videos uploaded in the '{field_names[0]}' field")
+    await asyncio.to_thread(prune_uploads)
+    return uploads, rejected
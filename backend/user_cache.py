@@ -0,0 +1,64 @@
+"""
+In-process cache of authenticated users.
+
+get_current_user used to look the user up in MongoDB on every request. The
+user documents are now cached per user id for settings.user_cache_ttl_sec
+(least recently used entries are dropped above settings.user_cache_size),
+together with the token version they were loaded for: a token is only
+served from the cache when its "ver" claim matches, so bumping
+users.token_version revokes the tokens issued before on every
+authenticated route. A user that is still cached is reloaded (and a bump or
+deactivation seen) once its entry expires, after at most the TTL, or right
+away after invalidate().
+
+Routes that change a user document (credits, Pro upgrade) call
+invalidate() so the next request reloads it. The cache is per process:
+other API processes see such a change after at most the TTL.
+"""
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from config import settings
+
+class UserCache:
+    def __init__(self, ttl_sec: Optional[float] = None, max_entries: Optional[int] = None):
+        self.ttl_sec = settings.user_cache_ttl_sec if ttl_sec is None else ttl_sec
+        self.max_entries = settings.user_cache_size if max_entries is None else max_entries
+        self._entries = OrderedDict()  # user id -> (token version, user, expires at)
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_sec > 0 and self.max_entries > 0
+
+    def get(self, user_id: str, token_version: int) -> Optional[dict]:
+        """A copy of the cached user, None if missing, expired or cached for another token version"""
+        entry = self._entries.get(user_id)
+        if entry is None or entry[0] != token_version or entry[2] < time.monotonic():
+            self.misses += 1
+            return None
+        self._entries.move_to_end(user_id)
+        self.hits += 1
+        return dict(entry[1])
+
+    def put(self, user_id: str, token_version: int, user: dict):
+        if not self.enabled:
+            return
+        self._entries[user_id] = (token_version, dict(user), time.monotonic() + self.ttl_sec)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: str):
+        """Forget a user after its document changed"""
+        self._entries.pop(user_id, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+user_cache = UserCache()
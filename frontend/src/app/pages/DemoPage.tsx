@@ -696,11 +696,64 @@ function PrecisionClickingGame({ selectedGame }: { selectedGame: typeof GAME_PRE
   );
 }
 
+// Follow a background analysis job's progress stream (Server-Sent Events) until it is done
+async function streamJobProgress(jobId: string, headers: HeadersInit, onProgress: (event: any) => void) {
+  const response = await fetch(`${API_URL}/api/jobs/${jobId}/events`, { headers });
+  if (!response.ok || !response.body) {
+    throw new Error('Progress stream unavailable');
+  }
+
+  const reader = response.body.pipeThrough(new TextDecoderStream()).getReader();
+  let buffer = '';
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) return;
+    buffer += value;
+
+    const messages = buffer.split('\n\n');
+    buffer = messages.pop() || '';
+    for (const message of messages) {
+      const lines = message.split('\n');
+      const event = lines.find((line) => line.startsWith('event: '))?.slice(7);
+      const data = lines.find((line) => line.startsWith('data: '))?.slice(6);
+      if (event === 'progress' && data) {
+        onProgress(JSON.parse(data));
+      } else if (event === 'done') {
+        return;
+      }
+    }
+  }
+}
+
+// Wait for a background analysis job (streaming its progress), then return its result
+async function waitForJob(jobId: string, headers: HeadersInit, onProgress: (event: any) => void) {
+  try {
+    await streamJobProgress(jobId, headers, onProgress);
+  } catch (err) {
+    console.warn('Falling back to polling:', err);
+  }
+
+  while (true) {
+    const response = await fetch(`${API_URL}/api/jobs/${jobId}/result`, { headers });
+    if (response.status === 202) {
+      await new Promise((resolve) => setTimeout(resolve, 2000));
+      continue;
+    }
+
+    const data = await response.json().catch(() => ({}));
+    if (!response.ok) {
+      throw new Error(data.detail || 'Failed to analyze video');
+    }
+    return data;
+  }
+}
+
 function VideoUploadDemo({ selectedGame }: { selectedGame: typeof GAME_PRESETS[0] }) {
   const [file, setFile] = useState<File | null>(null);
   const [uploading, setUploading] = useState(false);
   const [analyzing, setAnalyzing] = useState(false);
   const [results, setResults] = useState<any>(null);
+  const [progress, setProgress] = useState<any>(null);
   const [error, setError] = useState<string | null>(null);
   const fileInputRef = useRef<HTMLInputElement>(null);
   const { user, token } = useAuth();
@@ -719,6 +772,7 @@ function VideoUploadDemo({ selectedGame }: { selectedGame: typeof GAME_PRESETS[0
 
     setUploading(true);
     setAnalyzing(true);
+    setProgress(null);
     setError(null);
 
     const formData = new FormData();
@@ -754,7 +808,13 @@ function VideoUploadDemo({ selectedGame }: { selectedGame: typeof GAME_PRESETS[0
         throw new Error(errorData.detail || 'Failed to analyze video');
       }
 
-      const data = await response.json();
+      let data = await response.json();
+
+      // Authenticated analysis runs as a background job - follow its progress until it finishes
+      if (data.job_id) {
+        data = await waitForJob(data.job_id, headers, setProgress);
+      }
+
       setResults(data);
     } catch (err) {
       setError(err instanceof Error ? err.message : 'Failed to analyze video');
@@ -767,7 +827,7 @@ function VideoUploadDemo({ selectedGame }: { selectedGame: typeof GAME_PRESETS[0
 
   const handleDownloadAnnotated = () => {
     if (results?.annotated_video) {
-      window.open(`${API_URL}/download-video/${results.annotated_video}`, '_blank');
+      window.open(`${API_URL}${results.annotated_video}`, '_blank');
     }
   };
 
@@ -862,9 +922,21 @@ function VideoUploadDemo({ selectedGame }: { selectedGame: typeof GAME_PRESETS[0
             {analyzing && (
               <div>
                 <div className="w-full bg-[#21262d] rounded-full h-2 mb-2">
-                  <div className="bg-green-500 h-2 rounded-full animate-pulse" style={{ width: '100%' }} />
+                  {progress?.percent != null ? (
+                    <div className="bg-green-500 h-2 rounded-full transition-all" style={{ width: `${progress.percent}%` }} />
+                  ) : (
+                    <div className="bg-green-500 h-2 rounded-full animate-pulse" style={{ width: '100%' }} />
+                  )}
                 </div>
-                <div className="text-xs text-gray-400">Analyzing video with YOLO AI... This may take a few minutes</div>
+                {progress ? (
+                  <div className="text-xs text-gray-400">
+                    Frame {progress.frames_processed}/{progress.total_frames}
+                    {progress.eta_sec != null && ` · ~${Math.ceil(progress.eta_sec)}s left`}
+                    {` · ${progress.encounters} encounters · ${progress.eliminations} eliminations`}
+                  </div>
+                ) : (
+                  <div className="text-xs text-gray-400">Analyzing video with YOLO AI... This may take a few minutes</div>
+                )}
               </div>
             )}
           </div>
@@ -1112,7 +1184,7 @@ function VideoUploadDemo({ selectedGame }: { selectedGame: typeof GAME_PRESETS[0
                       </defs>
                     </svg>
                     <div className="absolute bottom-2 left-4 text-xs text-gray-500">Frame 0</div>
-                    <div className="absolute bottom-2 right-4 text-xs text-gray-500">Frame {results.persons_per_frame.length}</div>
+                    <div className="absolute bottom-2 right-4 text-xs text-gray-500">Frame {results.total_frames ?? results.persons_per_frame.length}</div>
                     <div className="absolute top-2 left-4 text-xs text-gray-500">{results.max_characters} max</div>
                   </div>
                 </div>